@@ -0,0 +1,351 @@
+import sys
+from array import array
+
+import ast as AST
+from ast_binary import node_kinds
+
+
+# Tags of the field slots: what slot_values[i] holds for a slot whose tag is
+#   NONE, TRUE, FALSE   nothing
+#   INTEGER             the integer itself
+#   STRING              an index into strings
+#   NODE                a node index
+#   TUPLE, LIST         a sequence index (its items are the slots seq_starts[s] ... + seq_lengths[s])
+#   OBJECT              an index into objects (integers too large for 64 bits, anything else)
+NONE, TRUE, FALSE, INTEGER, STRING, NODE, TUPLE, LIST, OBJECT = range(9)
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+# Marks the end of the subtree of a node on the conversion stack.
+_END = object()
+
+
+class Arena:
+    '''
+    Arena is a flat, struct-of-arrays representation of an AST.Program.
+
+    ...
+
+    Nodes are numbered in preorder (the root is node 0) and described by parallel arrays: their
+    kind, span, parent and the end of their subtree, so that the descendants of node i are exactly
+    the nodes i + 1 ... subtree_ends[i] - 1. The fields of node i are the slots field_starts[i]
+    onwards, one per field of its kind, in the order of the kind's __slots__; every slot is a tag
+    and a 64-bit value (a literal, a string index, a node index or a sequence index, see the tags
+    above). Sequences (Block.expression_list, Method.formal_parameters, Case.actions and the
+    action tuples, ...) are contiguous runs of slots.
+
+    Whole-tree passes can loop over the arrays with index arithmetic, or over NumPy views of them
+    (as_numpy()). NodeView objects give the same field access as the AST classes (view.body,
+    view.predicate, view.expression_list, ...) on top of the arrays.
+
+    Attributes
+    ----------
+    kind_classes : tuple
+        The AST classes; kinds[i] indexes into it.
+    kinds : array('B')
+        Kind of every node.
+    starts, ends : array('q')
+        Span of every node (-1 if the node has none).
+    parents : array('i')
+        Parent node of every node (-1 for the root).
+    subtree_ends : array('i')
+        One past the last descendant of every node.
+    field_starts : array('i')
+        First field slot of every node.
+    slot_tags : array('B'), slot_values : array('q')
+        The field and sequence item slots.
+    seq_starts, seq_lengths : array('i')
+        The first slot and the length of every sequence.
+    strings : list
+        The distinct strings (names, types and string literals).
+    objects : list
+        Values that do not fit in a slot.
+
+    Methods
+    -------
+    from_program(program)
+        Builds the arena of an AST (class method).
+    to_program()
+        Builds the AST back.
+    node(i)
+        A NodeView of node i (root is node 0).
+    slot(slot)
+        The value held by a slot.
+    children(i)
+        The node indices of the direct children of node i.
+    nodes_of_kind(kind)
+        The indices of the nodes of an AST class, in preorder.
+    kind_id(kind)
+        The kind code of an AST class.
+    nbytes()
+        The memory used by the arena.
+    as_numpy()
+        The arrays as NumPy arrays sharing the arena memory (requires NumPy).
+    '''
+
+    def __init__(self):
+        self.kind_classes = tuple(node_kinds())
+        self._kind_ids = {kind: i for i, kind in enumerate(self.kind_classes)}
+        self._field_indices = [{field: i for i, field in enumerate(kind.__slots__)}
+                               for kind in self.kind_classes]
+
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.parents = array('i')
+        self.subtree_ends = array('i')
+        self.field_starts = array('i')
+        self.slot_tags = array('B')
+        self.slot_values = array('q')
+        self.seq_starts = array('i')
+        self.seq_lengths = array('i')
+        self.strings = []
+        self.objects = []
+        self._string_ids = {}
+
+    @classmethod
+    def from_program(cls, program):
+        '''Builds the arena of program (any AST node can be the root). Iterative.'''
+        arena = cls()
+        kind_ids = arena._kind_ids
+        string_ids = arena._string_ids
+        strings = arena.strings
+        kinds = arena.kinds
+        slot_tags = arena.slot_tags
+        slot_values = arena.slot_values
+
+        # Every slot is allocated with a placeholder, then filled when its value is popped.
+        # The stack holds (value, slot, parent node); slot -1 stands for the root.
+        stack = [(program, -1, -1)]
+        while stack:
+            value, slot, parent = stack.pop()
+
+            if value is _END:
+                arena.subtree_ends[slot] = len(kinds)
+                continue
+
+            if isinstance(value, AST.AST):
+                kind = kind_ids.get(type(value))
+                if kind is None:
+                    raise TypeError(f'Cannot lower node of type {type(value).__name__}.')
+                index = len(kinds)
+                kinds.append(kind)
+                arena.starts.append(-1 if value.start is None else value.start)
+                arena.ends.append(-1 if value.end is None else value.end)
+                arena.parents.append(parent)
+                arena.subtree_ends.append(0)
+                fields = type(value).__slots__
+                first = len(slot_tags)
+                arena.field_starts.append(first)
+                slot_tags.extend([NONE] * len(fields))
+                slot_values.extend([0] * len(fields))
+                # Popped once the whole subtree has been numbered (the slot position holds the node).
+                stack.append((_END, index, parent))
+                for i in range(len(fields) - 1, -1, -1):
+                    stack.append((getattr(value, fields[i]), first + i, index))
+                tag, payload = NODE, index
+            elif isinstance(value, (tuple, list)):
+                sequence = len(arena.seq_starts)
+                first = len(slot_tags)
+                arena.seq_starts.append(first)
+                arena.seq_lengths.append(len(value))
+                slot_tags.extend([NONE] * len(value))
+                slot_values.extend([0] * len(value))
+                for i in range(len(value) - 1, -1, -1):
+                    stack.append((value[i], first + i, parent))
+                tag, payload = (TUPLE if isinstance(value, tuple) else LIST), sequence
+            elif value is None:
+                tag, payload = NONE, 0
+            elif value is True:
+                tag, payload = TRUE, 1
+            elif value is False:
+                tag, payload = FALSE, 0
+            elif isinstance(value, str):
+                payload = string_ids.get(value)
+                if payload is None:
+                    payload = string_ids[value] = len(strings)
+                    strings.append(value)
+                tag = STRING
+            elif isinstance(value, int) and _INT64_MIN <= value <= _INT64_MAX:
+                tag, payload = INTEGER, value
+            else:
+                tag, payload = OBJECT, len(arena.objects)
+                arena.objects.append(value)
+
+            if slot >= 0:
+                slot_tags[slot] = tag
+                slot_values[slot] = payload
+
+        return arena
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind_id(self, kind):
+        return self._kind_ids[kind]
+
+    def node(self, i):
+        return NodeView(self, i)
+
+    @property
+    def root(self):
+        return NodeView(self, 0)
+
+    def field_slot(self, i, field):
+        '''Returns the slot of a field of node i.'''
+        return self.field_starts[i] + self._field_indices[self.kinds[i]][field]
+
+    def slot(self, slot):
+        '''Returns the value of a slot: nodes as NodeViews, sequences as tuples (or lists).'''
+        tag = self.slot_tags[slot]
+        payload = self.slot_values[slot]
+        if tag == NODE:
+            return NodeView(self, payload)
+        if tag == STRING:
+            return self.strings[payload]
+        if tag == INTEGER:
+            return payload
+        if tag == NONE:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == TUPLE or tag == LIST:
+            first = self.seq_starts[payload]
+            items = [self.slot(item) for item in range(first, first + self.seq_lengths[payload])]
+            return tuple(items) if tag == TUPLE else items
+        return self.objects[payload]
+
+    def children(self, i):
+        '''Returns the indices of the direct children of node i, in preorder.'''
+        children = []
+        child = i + 1
+        end = self.subtree_ends[i]
+        while child < end:
+            children.append(child)
+            child = self.subtree_ends[child]
+        return children
+
+    def nodes_of_kind(self, kind):
+        code = self._kind_ids[kind]
+        return [i for i, node_kind in enumerate(self.kinds) if node_kind == code]
+
+    def to_program(self):
+        '''Builds the AST back from the arena. Iterative.'''
+        if not self.kinds:
+            return None
+        kind_classes = self.kind_classes
+        nodes = [None] * len(self.kinds)
+        # Children come after their parent in preorder, so build the nodes backwards.
+        for i in range(len(self.kinds) - 1, -1, -1):
+            kind = kind_classes[self.kinds[i]]
+            node = kind.__new__(kind)
+            start = self.starts[i]
+            node.start = None if start < 0 else start
+            node.end = None if start < 0 else self.ends[i]
+            first = self.field_starts[i]
+            for offset, field in enumerate(kind.__slots__):
+                setattr(node, field, self._materialize(first + offset, nodes))
+            nodes[i] = node
+        return nodes[0]
+
+    def _materialize(self, slot, nodes):
+        tag = self.slot_tags[slot]
+        if tag == NODE:
+            return nodes[self.slot_values[slot]]
+        if tag == TUPLE or tag == LIST:
+            payload = self.slot_values[slot]
+            first = self.seq_starts[payload]
+            items = [self._materialize(item, nodes) for item in range(first, first + self.seq_lengths[payload])]
+            return tuple(items) if tag == TUPLE else items
+        return self.slot(slot)
+
+    def nbytes(self):
+        '''Returns the memory used by the arrays and the side tables, in bytes.'''
+        columns = (self.kinds, self.starts, self.ends, self.parents, self.subtree_ends,
+                   self.field_starts, self.slot_tags, self.slot_values, self.seq_starts, self.seq_lengths)
+        size = sum(column.buffer_info()[1] * column.itemsize for column in columns)
+        size += sys.getsizeof(self.strings) + sum(sys.getsizeof(value) for value in self.strings)
+        size += sys.getsizeof(self.objects) + sum(sys.getsizeof(value) for value in self.objects)
+        return size
+
+    def as_numpy(self):
+        '''Returns the arrays as a dict of NumPy arrays sharing the memory of the arena.
+
+        The arrays become invalid if the arena grows afterwards. Requires NumPy.
+        '''
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('Arena.as_numpy() requires NumPy to be installed.') from None
+
+        return {
+            'kinds': numpy.frombuffer(self.kinds, dtype = numpy.uint8),
+            'starts': numpy.frombuffer(self.starts, dtype = numpy.int64),
+            'ends': numpy.frombuffer(self.ends, dtype = numpy.int64),
+            'parents': numpy.frombuffer(self.parents, dtype = numpy.int32),
+            'subtree_ends': numpy.frombuffer(self.subtree_ends, dtype = numpy.int32),
+            'field_starts': numpy.frombuffer(self.field_starts, dtype = numpy.int32),
+            'slot_tags': numpy.frombuffer(self.slot_tags, dtype = numpy.uint8),
+            'slot_values': numpy.frombuffer(self.slot_values, dtype = numpy.int64),
+            'seq_starts': numpy.frombuffer(self.seq_starts, dtype = numpy.int32),
+            'seq_lengths': numpy.frombuffer(self.seq_lengths, dtype = numpy.int32),
+        }
+
+
+class NodeView:
+    '''
+    A node of an Arena, accessed through the field names of its AST class: the view of an If
+    node has predicate, then_body and else_body, the view of a Block has expression_list, etc.
+    Child nodes are returned as NodeViews and sequences as tuples, so code written against the
+    AST classes can read an arena unchanged. Two views of the same node compare equal.
+    '''
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def kind(self):
+        return self.arena.kind_classes[self.arena.kinds[self.index]]
+
+    @property
+    def class_name(self):
+        return self.kind.__name__
+
+    @property
+    def start(self):
+        start = self.arena.starts[self.index]
+        return None if start < 0 else start
+
+    @property
+    def end(self):
+        return None if self.arena.starts[self.index] < 0 else self.arena.ends[self.index]
+
+    @property
+    def parent_node(self):
+        # Not 'parent', which is a field of Class.
+        parent = self.arena.parents[self.index]
+        return None if parent < 0 else NodeView(self.arena, parent)
+
+    def children(self):
+        return [NodeView(self.arena, child) for child in self.arena.children(self.index)]
+
+    def __getattr__(self, field):
+        arena = self.arena
+        offset = arena._field_indices[arena.kinds[self.index]].get(field)
+        if offset is None:
+            raise AttributeError(f'{self.class_name} node has no field {field!r}.')
+        return arena.slot(arena.field_starts[self.index] + offset)
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and other.arena is self.arena and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    def __repr__(self):
+        return f'NodeView({self.class_name}, {self.index})'
@@ -1,6 +1,26 @@
+from string import Formatter
+
+
 class AST:
+    # start and end are the source offsets of the first character of the node and of the position
+    # just past its last character (set by the parser; None for nodes built by hand).
+    __slots__ = ('start', 'end')
+
+    # The template of to_readable(): what follows the class name between parentheses, with the
+    # attributes to show as {attribute} fields, formatted with str() like in an f-string. None
+    # shows the bare class name.
+    _readable = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls._readable is not None:
+            # (literal text, attribute or None) pairs, in order.
+            cls._readable_pieces = tuple((literal, field)
+                                         for literal, field, _, _ in Formatter().parse(cls._readable))
+
     def __init__(self):
-        pass
+        self.start = None
+        self.end = None
 
     @property
     def class_name(self):
@@ -12,7 +32,44 @@ class AST:
         ])
 
     def to_readable(self):
-        return f'{self.class_name}'
+        '''
+        Returns the one-line readable form of the tree rooted at this node, e.g.
+        Object(name='x'). Built with an explicit stack of pending values and text, so deep trees
+        neither hit the recursion limit nor copy the text of every subtree at every level.
+        '''
+        chunks = []
+        # Items are text to emit, or (value, as_repr) pairs: values directly in a template are
+        # shown with str(), values inside tuples and lists with repr(), like Python does.
+        stack = [(self, False)]
+        while stack:
+            item = stack.pop()
+            if item.__class__ is str:
+                chunks.append(item)
+                continue
+
+            value, as_repr = item
+            if isinstance(value, AST):
+                if value._readable is None:
+                    chunks.append(value.class_name)
+                    continue
+                chunks.append(value.class_name + '(')
+                stack.append(')')
+                for literal, field in reversed(value._readable_pieces):
+                    if field is not None:
+                        stack.append((getattr(value, field), False))
+                    if literal:
+                        stack.append(literal)
+            elif value.__class__ in (tuple, list):
+                is_tuple = value.__class__ is tuple
+                chunks.append('(' if is_tuple else '[')
+                stack.append(',)' if is_tuple and len(value) == 1 else (')' if is_tuple else ']'))
+                for i in range(len(value) - 1, -1, -1):
+                    stack.append((value[i], True))
+                    if i:
+                        stack.append(', ')
+            else:
+                chunks.append(repr(value) if as_repr else str(value))
+        return ''.join(chunks)
 
     def __repr__(self):
         return self.__str__()
@@ -22,6 +79,9 @@ class AST:
 
 
 class Program(AST):
+    __slots__ = ('classes',)
+    _readable = 'classes={classes}'
+
     def __init__(self, classes):
         super(Program, self).__init__()
         self.classes = classes
@@ -32,11 +92,11 @@ class Program(AST):
             ('classes', self.classes)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(classes={self.classes})'
-
 
 class Class(AST):
+    __slots__ = ('name', 'parent', 'features')
+    _readable = 'name=\'{name}\', parent={parent}, features={features}'
+
     def __init__(self, name, parent, features):
         super(Class, self).__init__()
         self.name = name
@@ -51,11 +111,11 @@ class Class(AST):
             ('features', self.features)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\', parent={self.parent}, features={self.features})'
-
 
 class Method(AST):
+    __slots__ = ('name', 'formal_parameters', 'return_type', 'body')
+    _readable = 'name=\'{name}\', formal_parameters={formal_parameters}, return_type={return_type}, body={body}'
+
     def __init__(self, name, formal_parameters, return_type, body):
         super(Method, self).__init__()
         self.name = name
@@ -72,11 +132,11 @@ class Method(AST):
             ('body', self.body)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\', formal_parameters={self.formal_parameters}, return_type={self.return_type}, body={self.body})'
-
 
 class Attribute(AST):
+    __slots__ = ('name', 'attribute_type', 'expression')
+    _readable = 'name=\'{name}\', attribute_type={attribute_type}, expression={expression}'
+
     def __init__(self, name, attribute_type, expression):
         super(Attribute, self).__init__()
         self.name = name
@@ -91,10 +151,11 @@ class Attribute(AST):
             ('expression', self.expression)  
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\', attribute_type={self.attribute_type}, expression={self.expression})'
 
 class FormalParameter(AST):
+    __slots__ = ('name', 'parameter_type')
+    _readable = 'name=\'{name}\', parameter_type={parameter_type}'
+
     def __init__(self, name, parameter_type):
         super(FormalParameter, self).__init__()
         self.name = name
@@ -107,11 +168,11 @@ class FormalParameter(AST):
             ('parameter_type', self.parameter_type)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\', type={self.type})'
-
 
 class Object(AST):
+    __slots__ = ('name',)
+    _readable = 'name=\'{name}\''
+
     def __init__(self, name):
         super(Object, self).__init__()
         self.name = name
@@ -122,11 +183,11 @@ class Object(AST):
             ('name', self.name)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\')'
-
 
 class Self(AST):
+    __slots__ = ('name',)
+    _readable = 'name=\'{name}\''
+
     def __init__(self, name):
         super(Self, self).__init__()
         self.name = name
@@ -137,11 +198,11 @@ class Self(AST):
             ('name', self.name)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\')'
-
 
 class Integer(AST):
+    __slots__ = ('content',)
+    _readable = 'content={content}'
+
     def __init__(self, content):
         super(Integer, self).__init__()
         self.content = content
@@ -152,11 +213,11 @@ class Integer(AST):
             ('content', self.content)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(content={self.content})'
-
 
 class String(AST):
+    __slots__ = ('content',)
+    _readable = 'content={content}'
+
     def __init__(self, content):
         super(String, self).__init__()
         self.content = content
@@ -167,10 +228,11 @@ class String(AST):
             ('content', self.content)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(content={self.content})'
 
 class Boolean(AST):
+    __slots__ = ('content',)
+    _readable = 'content={content}'
+
     def __init__(self, content):
         super(Boolean, self).__init__()
         self.content = content
@@ -181,11 +243,11 @@ class Boolean(AST):
             ('content', self.content)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(content={self.content})'
-
 
 class NewObject(AST):
+    __slots__ = ('type',)
+    _readable = 'type={type}'
+
     def __init__(self, new_type):
         super(NewObject, self).__init__()
         self.type = new_type
@@ -196,11 +258,11 @@ class NewObject(AST):
             ('type', self.type)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(type={self.type})'
-
 
 class IsVoid(AST):
+    __slots__ = ('expression',)
+    _readable = 'expression={expression}'
+
     def __init__(self, expression):
         super(IsVoid, self).__init__()
         self.expression = expression
@@ -211,11 +273,11 @@ class IsVoid(AST):
             ('expression', self.expression)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(expression={self.expression})'
-
 
 class Assignment(AST):
+    __slots__ = ('instance', 'expression')
+    _readable = 'instance={instance}, expression={expression}'
+
     def __init__(self, instance, expression):
         super(Assignment, self).__init__()
         self.instance = instance
@@ -228,11 +290,11 @@ class Assignment(AST):
             ('expression', self.expression)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(instance={self.instance}, expression={self.expression})'
-
 
 class Block(AST):
+    __slots__ = ('expression_list',)
+    _readable = 'expression_list={expression_list}'
+
     def __init__(self, expression_list):
         super(Block, self).__init__()
         self.expression_list = expression_list
@@ -243,11 +305,11 @@ class Block(AST):
             ('expression_list', self.expression_list)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(expression_list={self.expression_list})'
-
 
 class DynamicDispatch(AST):
+    __slots__ = ('instance', 'method', 'arguments')
+    _readable = 'instance={instance}, method={method}, arguments={arguments}'
+
     def __init__(self, instance, method, arguments):
         super(DynamicDispatch, self).__init__()
         self.instance = instance
@@ -262,11 +324,11 @@ class DynamicDispatch(AST):
             ('arguments', self.arguments)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(instance={self.instance}, method={self.method}, arguments={self.arguments})'
-
 
 class StaticDispatch(AST):
+    __slots__ = ('instance', 'dispatch_type', 'method', 'arguments')
+    _readable = 'instance={instance}, dispatch_type={dispatch_type}, method={method}, arguments={arguments}'
+
     def __init__(self, instance, dispatch_type, method, arguments):
         super(StaticDispatch, self).__init__()
         self.instance = instance
@@ -283,11 +345,11 @@ class StaticDispatch(AST):
             ('arguments', self.arguments)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(instance={self.instance}, dispatch_type={self.dispatch_type}, method={self.method}, arguments={self.arguments})'
-
 
 class Let(AST):
+    __slots__ = ('instance', 'return_type', 'expression', 'body')
+    _readable = 'instance={instance}, return_type={return_type}, expression={expression}, body={body}'
+
     def __init__(self, instance, return_type, expression, body):
         super(Let, self).__init__()
         self.instance = instance
@@ -304,11 +366,11 @@ class Let(AST):
             ('body', self.body)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(instance={self.instance}, return_type={self.return_type}, expression={self.expression}, body={self.body})'
-
 
 class If(AST):
+    __slots__ = ('predicate', 'then_body', 'else_body')
+    _readable = 'predicate={predicate}, then_body={then_body}, else_body={else_body}'
+
     def __init__(self, predicate, then_body, else_body):
         super(If, self).__init__()
         self.predicate = predicate
@@ -323,11 +385,11 @@ class If(AST):
             ('else_body', self.else_body)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(predicate={self.predicate}, then_body={self.then_body}, else_body={self.else_body})'
-
 
 class WhileLoop(AST):
+    __slots__ = ('predicate', 'body')
+    _readable = 'predicate={predicate}, body={body}'
+
     def __init__(self, predicate, body):
         super(WhileLoop, self).__init__()
         self.predicate = predicate
@@ -340,11 +402,11 @@ class WhileLoop(AST):
             ('body', self.body)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(predicate={self.predicate}, body={self.body})'
-
 
 class Case(AST):
+    __slots__ = ('expression', 'actions')
+    _readable = 'expression={expression}, actions={actions}'
+
     def __init__(self, expression, actions):
         super(Case, self).__init__()
         self.expression = expression
@@ -357,11 +419,11 @@ class Case(AST):
             ('actions', self.actions)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(expression={self.expression}, actions={self.actions})'
-
 
 class Action(AST):
+    __slots__ = ('name', 'action_type', 'body')
+    _readable = 'name=\'{name}\', action_type={action_type}, body={body}'
+
     def __init__(self, name, action_type, body):
         super(Action, self).__init__()
         self.name = name
@@ -376,14 +438,14 @@ class Action(AST):
             ('body', self.body)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(name=\'{self.name}\', action_type={self.action_type}, body={self.body})'
-
 
 class IntegerComplement(AST):
+    __slots__ = ('integer_expression',)
+    symbol = '~'
+    _readable = 'expression={integer_expression}'
+
     def __init__(self, integer_expression):
         super(IntegerComplement, self).__init__()
-        self.symbol = '~'
         self.integer_expression = integer_expression
 
     def to_tuple(self):
@@ -392,14 +454,14 @@ class IntegerComplement(AST):
             ('integer_expression', self.integer_expression)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(expression={self.integer_expression})'
-
 
 class BooleanComplement(AST):
+    __slots__ = ('boolean_expression',)
+    symbol = '!'
+    _readable = 'expression={boolean_expression}'
+
     def __init__(self, boolean_expression):
         super(BooleanComplement, self).__init__()
-        self.symbol = '!'
         self.boolean_expression = boolean_expression
 
     def to_tuple(self):
@@ -408,14 +470,14 @@ class BooleanComplement(AST):
             ('boolean_expression', self.boolean_expression)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(expression={self.boolean_expression})'
-
 
 class Addition(AST):
+    __slots__ = ('first', 'second')
+    symbol = '+'
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(Addition, self).__init__()
-        self.symbol = '+'
         self.first = first
         self.second = second
 
@@ -426,14 +488,14 @@ class Addition(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class Subtraction(AST):
+    __slots__ = ('first', 'second')
+    symbol = '-'
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(Subtraction, self).__init__()
-        self.symbol = '-'
         self.first = first
         self.second = second
 
@@ -444,14 +506,14 @@ class Subtraction(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class Multiplication(AST):
+    __slots__ = ('first', 'second')
+    symbol = '*'
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(Multiplication, self).__init__()
-        self.symbol = '*'
         self.first = first
         self.second = second
 
@@ -462,14 +524,14 @@ class Multiplication(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class Division(AST):
+    __slots__ = ('first', 'second')
+    symbol = '/'
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(Division, self).__init__()
-        self.symbol = '/'
         self.first = first
         self.second = second
 
@@ -480,14 +542,14 @@ class Division(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class Equal(AST):
+    __slots__ = ('first', 'second')
+    symbol = '='
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(Equal, self).__init__()
-        self.symbol = '='
         self.first = first
         self.second = second
 
@@ -498,14 +560,14 @@ class Equal(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class LessThan(AST):
+    __slots__ = ('first', 'second')
+    symbol = '<'
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(LessThan, self).__init__()
-        self.symbol = '<'
         self.first = first
         self.second = second
 
@@ -516,14 +578,14 @@ class LessThan(AST):
             ('second', self.second)
         ])
 
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
-
 
 class LessThanOrEqual(AST):
+    __slots__ = ('first', 'second')
+    symbol = '<='
+    _readable = 'first={first}, second={second}'
+
     def __init__(self, first, second):
         super(LessThanOrEqual, self).__init__()
-        self.symbol = '<='
         self.first = first
         self.second = second
 
@@ -533,6 +595,3 @@ class LessThanOrEqual(AST):
             ('first', self.first),
             ('second', self.second)
         ])
-
-    def to_readable(self):
-        return f'{self.class_name}(first={self.first}, second={self.second})'
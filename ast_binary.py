@@ -0,0 +1,363 @@
+import struct
+
+import ast as AST
+
+
+# File layout (all offsets are absolute, all fixed-width integers little-endian):
+#
+#   header          MAGIC, then the uint32 fields of _HEADER
+#   string offsets  string_count + 1 uint32: string i is data[offsets[i]:offsets[i + 1]] (UTF-8)
+#   string data
+#   kind table      varint kind count; per kind: varint name, varint field count, varint field names
+#                   (all string ids). Only the kinds used by the program are listed, in order of
+#                   first use.
+#   nodes           the tagged value of the Program, in preorder
+#   class index     class_count uint32: the offset of the node of every top-level Class
+#
+# A tagged value is one tag byte followed by:
+#
+#   _NONE, _TRUE, _FALSE    nothing
+#   _INTEGER                a zigzag varint
+#   _STRING                 a varint string id
+#   _TUPLE, _LIST           a varint count, then the tagged items
+#   _NODE                   a varint kind, the span, then the tagged values of the fields of the
+#                           kind, in the order of the kind table
+#
+# The span is a varint holding zigzag(start - previous start) + 1, where the previous start is that
+# of the previous node in preorder (0 for the first node and for every Class, so that a Class can
+# be decoded on its own), or 0 if the node has no span; then, if it has one, a varint end - start.
+
+MAGIC = b'COOLAST\x01'
+
+_HEADER = struct.Struct('<7I')
+_UINT32 = struct.Struct('<I')
+
+_NONE, _TRUE, _FALSE, _INTEGER, _STRING, _TUPLE, _LIST, _NODE = range(8)
+
+
+def node_kinds():
+    '''Returns the AST node classes of ast.py, in definition order.'''
+    return [value for value in vars(AST).values()
+            if isinstance(value, type) and issubclass(value, AST.AST) and value is not AST.AST]
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def dumps(program) -> bytes:
+    '''Encodes an AST.Program (or any AST node) into the binary format. Iterative, so the depth
+    of the tree is not limited by the recursion limit.
+    '''
+    known_kinds = set(node_kinds())
+    kinds = []
+    kind_ids = {}
+    strings = {}
+    body = bytearray()
+    class_offsets = []
+    previous = 0
+
+    def string_id(value):
+        i = strings.get(value)
+        if i is None:
+            i = strings[value] = len(strings)
+        return i
+
+    stack = [program]
+    while stack:
+        value = stack.pop()
+        if value is None:
+            body.append(_NONE)
+        elif value is True:
+            body.append(_TRUE)
+        elif value is False:
+            body.append(_FALSE)
+        elif isinstance(value, str):
+            body.append(_STRING)
+            _write_varint(body, string_id(value))
+        elif isinstance(value, int):
+            body.append(_INTEGER)
+            _write_varint(body, value << 1 if value >= 0 else ((-value) << 1) - 1)
+        elif isinstance(value, (tuple, list)):
+            body.append(_TUPLE if isinstance(value, tuple) else _LIST)
+            _write_varint(body, len(value))
+            stack.extend(reversed(value))
+        elif isinstance(value, AST.AST):
+            kind = kind_ids.get(type(value))
+            if kind is None:
+                if type(value) not in known_kinds:
+                    raise TypeError(f'Cannot encode node of type {type(value).__name__}.')
+                kind = kind_ids[type(value)] = len(kinds)
+                kinds.append(type(value))
+            if type(value) is AST.Class:
+                class_offsets.append(len(body))
+                previous = 0
+            body.append(_NODE)
+            _write_varint(body, kind)
+            if value.start is None:
+                body.append(0)
+            else:
+                delta = value.start - previous
+                _write_varint(body, (delta << 1 if delta >= 0 else ((-delta) << 1) - 1) + 1)
+                _write_varint(body, value.end - value.start)
+                previous = value.start
+            stack.extend(getattr(value, field) for field in reversed(type(value).__slots__))
+        else:
+            raise TypeError(f'Cannot encode value of type {type(value).__name__}.')
+
+    kind_table = bytearray()
+    _write_varint(kind_table, len(kinds))
+    for kind in kinds:
+        _write_varint(kind_table, string_id(kind.__name__))
+        _write_varint(kind_table, len(kind.__slots__))
+        for field in kind.__slots__:
+            _write_varint(kind_table, string_id(field))
+
+    string_data = bytearray()
+    string_offsets = bytearray()
+    encoded = [value.encode('utf-8', 'surrogatepass') for value in strings]
+    string_table_offset = len(MAGIC) + _HEADER.size
+    string_data_offset = string_table_offset + _UINT32.size * (len(encoded) + 1)
+    position = string_data_offset
+    for data in encoded:
+        string_offsets += _UINT32.pack(position)
+        string_data += data
+        position += len(data)
+    string_offsets += _UINT32.pack(position)
+
+    kinds_offset = position
+    root_offset = kinds_offset + len(kind_table)
+    class_index_offset = root_offset + len(body)
+
+    return b''.join((
+        MAGIC,
+        _HEADER.pack(len(encoded), string_table_offset, string_data_offset, kinds_offset,
+                     root_offset, class_index_offset, len(class_offsets)),
+        string_offsets,
+        string_data,
+        kind_table,
+        body,
+        b''.join(_UINT32.pack(root_offset + offset) for offset in class_offsets),
+    ))
+
+
+def loads(data):
+    '''Decodes a whole program from data (bytes, bytearray, memoryview or mmap).'''
+    return ProgramView(data).program()
+
+
+class ProgramView:
+    '''
+    ProgramView gives access to a program encoded by dumps() without decoding all of it.
+
+    ...
+
+    The buffer is only wrapped in a memoryview, never copied: opening a view reads the header
+    and the kind table, strings are decoded the first time they are used, and nodes are decoded
+    on request, starting from the offset of the requested class in the class index. A view over
+    an mmap therefore only touches the pages of the classes it is asked for.
+
+    Attributes
+    ----------
+    data : memoryview
+        The encoded program.
+    kinds : list
+        The node class of every kind id of the file.
+
+    Methods
+    -------
+    program()
+        Decodes the whole AST.Program.
+    class_at(i)
+        Decodes the i-th class of the program only.
+    class_name(i)
+        The name of the i-th class, without decoding it.
+    find_class(name)
+        Decodes the first class with the given name, or returns None.
+    string(i)
+        The i-th entry of the string table.
+    release()
+        Releases the buffer (required before closing an mmap). Also done on leaving a with block.
+    '''
+
+    def __init__(self, data):
+        self.data = memoryview(data).cast('B')
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not an encoded Cool AST (bad magic number).')
+
+        (self._string_count, self._string_table, self._string_data, kinds_offset,
+         self._root, self._class_index, self._class_count) = _HEADER.unpack_from(self.data, len(MAGIC))
+        self._strings = [None] * self._string_count
+
+        classes = {kind.__name__: kind for kind in node_kinds()}
+        self.kinds = []
+        self._fields = []
+        position = kinds_offset
+        kind_count, position = self._varint(position)
+        for _ in range(kind_count):
+            name, position = self._varint(position)
+            field_count, position = self._varint(position)
+            fields = []
+            for _ in range(field_count):
+                field, position = self._varint(position)
+                fields.append(self.string(field))
+            kind = classes.get(self.string(name))
+            if kind is None or tuple(fields) != kind.__slots__:
+                raise ValueError(f'Node kind {self.string(name)}{tuple(fields)} does not match ast.py.')
+            self.kinds.append(kind)
+            self._fields.append(tuple(fields))
+        self._class_kind = self.kinds.index(AST.Class) if AST.Class in self.kinds else None
+
+    def __len__(self):
+        return self._class_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        self.data.release()
+
+    def string(self, i):
+        value = self._strings[i]
+        if value is None:
+            start, end = struct.unpack_from('<2I', self.data, self._string_table + 4 * i)
+            value = self._strings[i] = str(self.data[start:end], 'utf-8', 'surrogatepass')
+        return value
+
+    def program(self):
+        return self._decode(self._root)
+
+    def class_at(self, i):
+        return self._decode(self._class_offset(i))
+
+    def class_name(self, i):
+        # A Class node: tag, kind, span, then its first field, the name.
+        position = self._class_offset(i) + 1
+        _, position = self._varint(position)
+        span, position = self._varint(position)
+        if span:
+            _, position = self._varint(position)
+        if self.data[position] != _STRING:
+            return None
+        return self.string(self._varint(position + 1)[0])
+
+    def find_class(self, name):
+        for i in range(self._class_count):
+            if self.class_name(i) == name:
+                return self.class_at(i)
+        return None
+
+    def _class_offset(self, i):
+        if not 0 <= i < self._class_count:
+            raise IndexError(f'Class index {i} is out of range (0-{self._class_count - 1}).')
+        return _UINT32.unpack_from(self.data, self._class_index + 4 * i)[0]
+
+    def _varint(self, position):
+        data = self.data
+        byte = data[position]
+        position += 1
+        value = byte & 0x7f
+        shift = 7
+        while byte & 0x80:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        return value, position
+
+    def _decode(self, position):
+        '''Decodes the tagged value at position. Iterative: a stack holds the nodes and sequences
+        whose children are being decoded, as [kind or sequence type, child count, children].
+        '''
+        data = self.data
+        read_varint = self._varint
+        string = self.string
+        strings = self._strings
+        kinds = self.kinds
+        fields = self._fields
+        class_kind = self._class_kind
+        previous = 0
+        stack = []
+
+        while True:
+            tag = data[position]
+            position += 1
+
+            # Varints below 128 (almost all of them) are read inline.
+            if tag == _NODE:
+                kind = data[position]
+                position += 1
+                if kind & 0x80:
+                    kind, position = read_varint(position - 1)
+                span = data[position]
+                position += 1
+                if span & 0x80:
+                    span, position = read_varint(position - 1)
+                node = kinds[kind].__new__(kinds[kind])
+                if kind == class_kind:
+                    previous = 0
+                if span:
+                    span -= 1
+                    previous += (span >> 1) if not span & 1 else -((span + 1) >> 1)
+                    length = data[position]
+                    position += 1
+                    if length & 0x80:
+                        length, position = read_varint(position - 1)
+                    node.start = previous
+                    node.end = previous + length
+                else:
+                    node.start = None
+                    node.end = None
+                if fields[kind]:
+                    stack.append([node, len(fields[kind]), []])
+                    continue
+                value = node
+            elif tag == _STRING:
+                i = data[position]
+                position += 1
+                if i & 0x80:
+                    i, position = read_varint(position - 1)
+                value = strings[i]
+                if value is None:
+                    value = string(i)
+            elif tag == _INTEGER:
+                value, position = read_varint(position)
+                value = (value >> 1) if not value & 1 else -((value + 1) >> 1)
+            elif tag == _NONE:
+                value = None
+            elif tag == _TRUE:
+                value = True
+            elif tag == _FALSE:
+                value = False
+            elif tag == _TUPLE or tag == _LIST:
+                count, position = read_varint(position)
+                if count:
+                    stack.append([tuple if tag == _TUPLE else list, count, []])
+                    continue
+                value = () if tag == _TUPLE else []
+            else:
+                raise ValueError(f'Corrupted encoded AST: unknown tag {tag} at offset {position - 1}.')
+
+            # Hand the value to its parent, completing every parent whose last child it is.
+            while stack:
+                frame = stack[-1]
+                children = frame[2]
+                children.append(value)
+                if len(children) < frame[1]:
+                    break
+                stack.pop()
+                target = frame[0]
+                if isinstance(target, AST.AST):
+                    for field, child in zip(type(target).__slots__, children):
+                        setattr(target, field, child)
+                    value = target
+                else:
+                    value = target(children)
+            else:
+                return value
@@ -0,0 +1,279 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from collections import namedtuple
+
+import ast as AST
+from lexer import CoolPyLexer
+from parser import CoolPyParser
+from pool import ParseResult
+from tables import default_cache_dir
+from tables import lexer_signature
+from tables import parser_signature
+
+
+# Bumped whenever the layout of the cache entries changes.
+CACHE_FORMAT = 1
+
+# Counters of a ParseCache.
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions'])
+
+# Temporary files older than this (in seconds) were left by an interrupted writer.
+_STALE_TEMPORARY_AGE = 3600
+
+_grammar_signature = None
+
+
+def _code_signature(code):
+    '''Returns a stable description of a code object (nested code objects included).'''
+    constants = tuple(_code_signature(constant) if hasattr(constant, 'co_code') else constant
+                      for constant in code.co_consts)
+    return (code.co_code, constants, code.co_names)
+
+
+def grammar_signature():
+    '''Returns a hex digest identifying everything a cached AST depends on: the lexer and grammar
+    specifications (see tables.lexer_signature() and tables.parser_signature()), the code of the
+    lexer and grammar actions that build the tokens and nodes, and the slot layout of the AST
+    classes.
+    '''
+    global _grammar_signature
+    if _grammar_signature is not None:
+        return _grammar_signature
+
+    lexer = CoolPyLexer(build_lexer = False)
+    parser = CoolPyParser(build_parser = False)
+    parser.tokens = lexer.tokens
+
+    digest = hashlib.sha256()
+    digest.update(repr((CACHE_FORMAT, pickle.HIGHEST_PROTOCOL)).encode())
+    digest.update(lexer_signature(lexer).encode())
+    digest.update(parser_signature(parser).encode())
+    for klass in (CoolPyLexer, CoolPyParser):
+        for name, function in sorted(vars(klass).items()):
+            if hasattr(function, '__code__'):
+                digest.update(repr((klass.__name__, name, _code_signature(function.__code__))).encode())
+    for name, node_class in sorted(vars(AST).items()):
+        if isinstance(node_class, type) and issubclass(node_class, AST.AST):
+            digest.update(repr((name, node_class.__slots__)).encode())
+
+    _grammar_signature = digest.hexdigest()
+    return _grammar_signature
+
+
+class ParseCache:
+    '''
+    ParseCache keeps the parse results (AST.Program and lexical and syntax errors) of Cool
+    programs on disk, keyed by a hash of the source text and of the grammar, so that unchanged
+    sources are never lexed or parsed twice.
+
+    ...
+
+    Every entry is a pickle file named after the SHA-256 of grammar_signature() and the source, so
+    a changed source or grammar simply misses, and entries are never invalidated in place.
+    Entries are written to a temporary file in the cache directory and moved into place with
+    os.replace(), so concurrent readers (threads or processes) see either no entry or a complete
+    one, and concurrent writers of the same entry write identical content. An unreadable entry
+    is treated as a miss and removed.
+
+    The size of the directory is bounded by max_bytes: a hit refreshes the modification time of
+    its entry, and when a store pushes the size over the bound, the least recently used entries
+    are removed until it is back under 90% of it. Sizes are tracked per process and re-measured
+    from the directory before evicting, so processes sharing a directory keep it bounded.
+
+    A cached result includes the lexical and syntax diagnostics of the parse, so a hit reports
+    the same errors as parsing the source again.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory holding the entries.
+    max_bytes : int
+        The bound on the total size of the entries.
+    hits, misses, evictions : int
+        Counters of this instance: lookups answered from the cache, lookups that had to parse,
+        and entries removed to honour max_bytes.
+
+    Methods
+    -------
+    parse(source_code)
+        Returns the ParseResult of source_code, from the cache if possible.
+    parse_file(path)
+        Same as parse(), for the contents of a file.
+    get(source_code)
+        Returns the cached ParseResult of source_code, or None.
+    put(source_code, result)
+        Stores the ParseResult of source_code.
+    stats()
+        The counters, as a CacheStats.
+    clear()
+        Removes every entry.
+    '''
+
+    def __init__(self, cache_dir = None, max_bytes = 256 * 1024 * 1024, parser = None, **parser_options):
+        '''
+        Parameters
+        ----------
+        cache_dir : str, optional
+            The directory holding the entries. Defaults to the 'ast' subdirectory of
+            tables.default_cache_dir().
+        max_bytes : int, optional
+            The bound on the total size of the entries (256 MiB by default).
+        parser : CoolPyParser, optional
+            The parser used on misses. Built on the first miss with parser_options if omitted.
+        '''
+        self.cache_dir = cache_dir if cache_dir else os.path.join(default_cache_dir(), 'ast')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._parser = parser
+        self._parser_options = parser_options
+        self._size = None
+
+    def key(self, source_code: str) -> str:
+        digest = hashlib.sha256(grammar_signature().encode())
+        digest.update(source_code.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def parse(self, source_code: str) -> ParseResult:
+        '''Returns the ParseResult of source_code, parsing it only if it is not cached.'''
+        key = self.key(source_code)
+        result = self._read(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        if self._parser is None:
+            self._parser = CoolPyParser(**self._parser_options)
+        program = self._parser.parse(source_code)
+        result = ParseResult(program, list(self._parser.error_list))
+        self._write(key, result)
+        return result
+
+    def parse_file(self, path) -> ParseResult:
+        with open(path, 'r') as file:
+            return self.parse(file.read())
+
+    def get(self, source_code: str):
+        '''Returns the cached ParseResult of source_code, or None (counted as a hit or a miss).'''
+        result = self._read(self.key(source_code))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, source_code: str, result: ParseResult):
+        self._write(self.key(source_code), ParseResult(*result))
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions)
+
+    def clear(self):
+        '''Removes every entry of the cache directory.'''
+        for entry in self._entries():
+            if entry.name.endswith('.pickle'):
+                self._remove(entry.path)
+        self._size = None
+
+    def _read(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                result = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Written by an incompatible version or damaged; parse again and overwrite it.
+            self._remove(path)
+            return None
+
+        try:
+            # The entry was just used: move it to the end of the LRU order.
+            os.utime(path)
+        except OSError:
+            pass
+        return ParseResult(*result)
+
+    def _write(self, key, result):
+        try:
+            data = pickle.dumps(tuple(result), protocol = pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # Too deeply nested for pickle; such programs are simply not cached.
+            return
+
+        os.makedirs(self.cache_dir, exist_ok = True)
+        handle, temporary = tempfile.mkstemp(prefix = '.tmp-', dir = self.cache_dir)
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, self.entry_path(key))
+        except BaseException:
+            self._remove(temporary)
+            raise
+
+        if self._size is None:
+            self._size = self._measure()
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        try:
+            return [entry for entry in os.scandir(self.cache_dir)
+                    if entry.name.endswith('.pickle') or entry.name.startswith('.tmp-')]
+        except FileNotFoundError:
+            return []
+
+    def _measure(self):
+        size = 0
+        for entry in self._entries():
+            try:
+                size += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _evict(self):
+        '''Removes the least recently used entries until the cache is under 90% of max_bytes.'''
+        now = time.time()
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith('.tmp-'):
+                # Temporary files belong to writers in progress, unless they are old.
+                if now - stat.st_mtime > _STALE_TEMPORARY_AGE:
+                    self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * 0.9
+        entries.sort()
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            if self._remove(path):
+                self.evictions += 1
+            size -= entry_size
+        self._size = size
+
+    def _remove(self, path):
+        '''Removes a file, returning False if another process already did.'''
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,152 @@
+import glob
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+import pool
+from ast_cache import ParseCache
+from diagnostics import Diagnostic
+
+
+# The outcome of compiling one file: its path, the AST.Program (None if the file could not be
+# read or parsed), the list of diagnostics.Diagnostic (phase 'input' if the file could not be
+# read) and the time spent on it by the worker (in seconds).
+BatchResult = namedtuple('BatchResult', ['path', 'program', 'errors', 'latency'])
+
+
+def collect_sources(patterns):
+    '''Expands files, directories (searched recursively) and glob patterns into a sorted list
+    of unique .cl paths.
+    '''
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '**', '*.cl'), recursive = True))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive = True) if path.endswith('.cl'))
+    return sorted(paths)
+
+
+# The parse cache of the current worker process, created on its first file (see compile_batch).
+_worker_cache = None
+
+
+def _compile_in_worker(path, keep_ast, cache_dir):
+    global _worker_cache
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as file:
+            source_code = file.read()
+    except (OSError, UnicodeDecodeError) as error:
+        return BatchResult(path, None, [Diagnostic('input', f'Cannot read file: {error}', None, None, None)],
+                           time.perf_counter() - start)
+
+    if cache_dir is None:
+        result = pool.parse_in_worker(source_code)
+    else:
+        if _worker_cache is None:
+            _worker_cache = ParseCache(cache_dir, parser = pool.worker_parser())
+        result = _worker_cache.parse(source_code)
+    program = result.program if keep_ast else None
+    return BatchResult(path, program, result.errors, time.perf_counter() - start)
+
+
+def compile_batch(patterns, workers = None, keep_ast = True, cache_dir = None, **parser_options):
+    '''Compiles every .cl file matched by patterns on a pool of worker processes.
+
+    Each worker builds one CoolPyParser at startup and reuses it for all the files it receives,
+    so the process start-up and table loading are paid once per worker, not once per file.
+
+    Parameters
+    ----------
+    patterns : iterable of str
+        Files, directories or glob patterns.
+    workers : int, optional
+        Number of worker processes. Defaults to os.cpu_count().
+    keep_ast : bool, optional
+        Whether the ASTs should be sent back to the caller. Turning it off saves the cost of
+        pickling the trees when only the diagnostics are needed.
+    cache_dir : str, optional
+        If given, the workers share an ast_cache.ParseCache in this directory, so unchanged files
+        are not parsed again by later batches.
+    parser_options : dict
+        Keyword arguments forwarded to CoolPyParser().
+
+    Yields
+    ------
+    BatchResult
+        One result per file, in completion order.
+    '''
+    paths = collect_sources(patterns)
+    if not paths:
+        return
+
+    with ProcessPoolExecutor(max_workers = workers,
+                             initializer = pool.init_worker,
+                             initargs = (parser_options,)) as executor:
+        futures = [executor.submit(_compile_in_worker, path, keep_ast, cache_dir) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv = None):
+    import argparse
+
+    from helpers import print_readable_ast
+
+    arguments = argparse.ArgumentParser(description = 'Parse many Cool programs in parallel.')
+    arguments.add_argument('patterns', nargs = '+', help = '.cl files, directories or glob patterns')
+    arguments.add_argument('-j', '--workers', type = int, default = None,
+                           help = 'number of worker processes (default: number of CPUs)')
+    arguments.add_argument('--ast', action = 'store_true', help = 'print the AST of every file')
+    arguments.add_argument('-q', '--quiet', action = 'store_true', help = 'only print the summary')
+    arguments.add_argument('--cache', metavar = 'DIR', nargs = '?', const = '', default = None,
+                           help = 'reuse the ASTs of unchanged files from a parse cache in DIR '
+                                  '(default: the coolpy cache directory)')
+    options = arguments.parse_args(argv)
+
+    latencies = []
+    failed = 0
+    start = time.perf_counter()
+
+    cache_dir = None
+    if options.cache is not None:
+        cache_dir = options.cache if options.cache else ParseCache().cache_dir
+
+    for result in compile_batch(options.patterns, workers = options.workers, keep_ast = options.ast,
+                                cache_dir = cache_dir):
+        latencies.append(result.latency)
+        if result.errors:
+            failed += 1
+
+        if not options.quiet:
+            status = 'ok' if not result.errors else f'{len(result.errors)} error(s)'
+            print(f'{result.path}: {status} ({result.latency * 1e3:.2f} ms)')
+            for error in result.errors:
+                print(f'    {error}')
+        if options.ast and result.program is not None:
+            print_readable_ast(result.program)
+
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print('No .cl files found.')
+        return 1
+
+    latencies.sort()
+    print(f'{len(latencies)} files, {failed} with errors, {elapsed:.2f} s '
+          f'({len(latencies) / elapsed:.1f} files/s)')
+    print(f'latency: mean {sum(latencies) / len(latencies) * 1e3:.2f} ms, '
+          f'p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms, '
+          f'p95 {latencies[int(len(latencies) * 0.95)] * 1e3:.2f} ms, '
+          f'max {latencies[-1] * 1e3:.2f} ms')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
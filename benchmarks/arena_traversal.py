@@ -0,0 +1,132 @@
+'''
+Full-tree traversal benchmark of the object AST against the flat Arena representation.
+
+Parses examples/ replicated to the requested number of lines, lowers the program to an Arena,
+then runs the same two whole-tree passes on both representations and checks they agree:
+
+    kinds       count the nodes of every kind,
+    literals    sum the Integer literals and count the dispatches to each method name
+                (reading node fields).
+
+On the object tree the passes walk the nodes with an explicit stack; on the arena they are loops
+over the kind and slot arrays. Also reports the conversion time and the memory of each form,
+and, when NumPy is installed, the kinds pass vectorized with numpy.bincount.
+
+Usage: python -m benchmarks.arena_traversal [lines]
+'''
+
+import collections
+import glob
+import os
+import sys
+import time
+
+import ast as AST
+from arena import Arena
+from benchmarks.ast_memory import measure
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def best_time(function, repeat = 5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def tree_kinds(program):
+    counts = collections.Counter()
+    stack = [program]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, AST.AST):
+            counts[value.class_name] += 1
+            stack.extend(getattr(value, field) for field in value.__slots__)
+        elif isinstance(value, tuple):
+            stack.extend(value)
+    return counts
+
+
+def tree_literals(program):
+    total = 0
+    methods = collections.Counter()
+    stack = [program]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, AST.AST):
+            if isinstance(value, AST.Integer):
+                total += value.content
+            elif isinstance(value, (AST.DynamicDispatch, AST.StaticDispatch)):
+                methods[value.method] += 1
+            stack.extend(getattr(value, field) for field in value.__slots__)
+        elif isinstance(value, tuple):
+            stack.extend(value)
+    return total, methods
+
+
+def arena_kinds(arena):
+    counts = collections.Counter(arena.kinds)
+    return collections.Counter({arena.kind_classes[kind].__name__: count for kind, count in counts.items()})
+
+
+def arena_literals(arena):
+    integer = arena.kind_id(AST.Integer)
+    # Kind code -> position of the method field among the fields of the kind.
+    dispatches = {arena.kind_id(kind): kind.__slots__.index('method')
+                  for kind in (AST.DynamicDispatch, AST.StaticDispatch)}
+    kinds = arena.kinds
+    field_starts = arena.field_starts
+    slot_values = arena.slot_values
+    strings = arena.strings
+    total = 0
+    methods = collections.Counter()
+    for i in range(len(kinds)):
+        kind = kinds[i]
+        if kind == integer:
+            total += slot_values[field_starts[i]]
+        elif kind in dispatches:
+            methods[strings[slot_values[field_starts[i] + dispatches[kind]]]] += 1
+    return total, methods
+
+
+def main(target_lines = 50000):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    program = CoolPyParser(lexer_backend = 'fast').parse(source_code)
+    arena, lowering = best_time(lambda: Arena.from_program(program), repeat = 3)
+    nodes, _, retained = measure(program)
+    print(f'{nodes} nodes; lowering {lowering * 1000:.1f} ms; '
+          f'memory: objects {retained / nodes:.1f} B/node, arena {arena.nbytes() / nodes:.1f} B/node')
+
+    print(f'{"pass":<10} {"objects (ms)":>13} {"arena (ms)":>11} {"speedup":>8}')
+    for name, on_tree, on_arena in (('kinds', tree_kinds, arena_kinds),
+                                    ('literals', tree_literals, arena_literals)):
+        expected, tree_time = best_time(lambda: on_tree(program))
+        actual, arena_time = best_time(lambda: on_arena(arena))
+        assert expected == actual
+        print(f'{name:<10} {tree_time * 1000:>13.1f} {arena_time * 1000:>11.1f} {tree_time / arena_time:>7.1f}x')
+
+    try:
+        import numpy
+    except ImportError:
+        print('NumPy is not installed; skipping the vectorized pass.')
+        return
+
+    columns = arena.as_numpy()
+    counts, numpy_time = best_time(lambda: numpy.bincount(columns['kinds'], minlength = len(arena.kind_classes)))
+    assert {arena.kind_classes[kind].__name__: int(count) for kind, count in enumerate(counts) if count} \
+        == dict(arena_kinds(arena))
+    print(f'{"kinds (numpy.bincount)":<24} {numpy_time * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,85 @@
+'''
+Size and speed of the binary AST format (ast_binary) against pickle.
+
+Parses examples/ replicated to the requested number of lines, then encodes and decodes the
+program with ast_binary and with pickle (highest protocol), checks that both round-trip, and
+reports the encoded sizes and the best time of several runs. Also times decoding a single class
+through a ProgramView over an mmap of the encoded file, which is what a consumer interested in
+one class pays.
+
+Usage: python -m benchmarks.ast_binary [lines]
+'''
+
+import glob
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import ast_binary
+from helpers import iter_nodes
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def tree(program):
+    return [(node.class_name, node.start, node.end) for node in iter_nodes(program)]
+
+
+def best_time(function, repeat = 5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(target_lines = 20000):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    program = CoolPyParser(lexer_backend = 'fast').parse(source_code)
+    expected = tree(program)
+    print(f'source: {len(source_code)} characters, {len(expected)} nodes, {len(program.classes)} classes')
+
+    encoded, binary_encode = best_time(lambda: ast_binary.dumps(program))
+    decoded, binary_decode = best_time(lambda: ast_binary.loads(encoded))
+    assert tree(decoded) == expected
+
+    pickled, pickle_encode = best_time(lambda: pickle.dumps(program, protocol = pickle.HIGHEST_PROTOCOL))
+    unpickled, pickle_decode = best_time(lambda: pickle.loads(pickled))
+    assert tree(unpickled) == expected
+
+    print(f'{"format":<8} {"bytes":>10} {"bytes/node":>11} {"encode (ms)":>12} {"decode (ms)":>12}')
+    for name, data, encode, decode in (('binary', encoded, binary_encode, binary_decode),
+                                       ('pickle', pickled, pickle_encode, pickle_decode)):
+        print(f'{name:<8} {len(data):>10} {len(data) / len(expected):>11.1f} '
+              f'{encode * 1000:>12.1f} {decode * 1000:>12.1f}')
+
+    handle, path = tempfile.mkstemp(suffix = '.coolast')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(encoded)
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                start = time.perf_counter()
+                with ast_binary.ProgramView(data) as view:
+                    middle = len(view) // 2
+                    one_class = view.class_at(middle)
+                lazy = time.perf_counter() - start
+        assert tree(one_class) == tree(program.classes[middle])
+        print(f'one class from an mmap (open + decode): {lazy * 1000:.3f} ms')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,77 @@
+'''
+Cold-cache versus warm-cache benchmark of ast_cache.ParseCache over examples/.
+
+Parses every program of examples/ through a ParseCache in an empty temporary directory (cold:
+every lookup misses, parses and stores), then again through a new ParseCache on the same
+directory (warm: every lookup hits and only unpickles), repeating the warm pass to get stable
+timings. Checks that the cached trees are identical to freshly parsed ones, then shows eviction
+with a size bound smaller than the cached entries.
+
+Usage: python -m benchmarks.ast_cache [rounds]
+'''
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from ast_cache import ParseCache
+from helpers import iter_nodes
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def tree(program):
+    return [(node.class_name, node.start, node.end) for node in iter_nodes(program)]
+
+
+def run(cache, sources):
+    start = time.perf_counter()
+    results = [cache.parse(source_code) for source_code in sources]
+    return results, time.perf_counter() - start
+
+
+def main(rounds = 20):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+
+    parser = CoolPyParser()
+    cache_dir = tempfile.mkdtemp(prefix = 'coolpy-ast-cache-')
+    try:
+        cold = ParseCache(cache_dir, parser = parser)
+        cold_results, cold_time = run(cold, sources)
+
+        warm = ParseCache(cache_dir, parser = parser)
+        warm_time = float('inf')
+        for _ in range(rounds):
+            warm_results, elapsed = run(warm, sources)
+            warm_time = min(warm_time, elapsed)
+
+        for cold_result, warm_result in zip(cold_results, warm_results):
+            assert tree(cold_result.program) == tree(warm_result.program)
+            assert cold_result.errors == warm_result.errors
+
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(cache_dir, '*.pickle')))
+        print(f'{len(sources)} programs, {size} bytes cached')
+        print(f'{"run":<6} {"total (ms)":>11} {"ms/file":>9} {"hits":>6} {"misses":>7}')
+        for name, elapsed, cache in (('cold', cold_time, cold), ('warm', warm_time, warm)):
+            print(f'{name:<6} {elapsed * 1000:>11.2f} {elapsed * 1000 / len(sources):>9.3f} '
+                  f'{cache.hits:>6} {cache.misses:>7}')
+        print(f'speedup: {cold_time / warm_time:.1f}x')
+
+        bounded = ParseCache(cache_dir, max_bytes = size // 2, parser = parser)
+        bounded.clear()
+        run(bounded, sources)
+        remaining = sum(os.path.getsize(path) for path in glob.glob(os.path.join(cache_dir, '*.pickle')))
+        print(f'bounded to {size // 2} bytes: {bounded.evictions} evictions, {remaining} bytes left')
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors = True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,78 @@
+'''
+Memory benchmark for the AST node hierarchy.
+
+Replicates the programs in examples/ up to roughly the requested number of lines, parses the
+result once and reports the number of AST nodes, the bytes retained per node (the deep size of
+the tree: nodes, tuples and leaf values, each object counted once) and the peak resident set
+size of the process.
+
+Usage: python -m benchmarks.ast_memory [lines]
+'''
+
+import glob
+import os
+import resource
+import sys
+import time
+
+import ast as AST
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def replicated_source(target_lines):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    copies = max(1, target_lines // chunk.count('\n'))
+    return '\n'.join([chunk] * copies)
+
+
+def measure(tree):
+    nodes = 0
+    shallow = 0
+    retained = 0
+    seen = set()
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size = sys.getsizeof(value)
+        retained += size
+        if isinstance(value, AST.AST):
+            nodes += 1
+            shallow += size
+            stack.extend(value for _, value in value.to_tuple()[1:])
+        elif isinstance(value, (tuple, list)):
+            stack.extend(value)
+    return nodes, shallow, retained
+
+
+def main(target_lines = 100000):
+    parser = CoolPyParser()
+    source_code = replicated_source(target_lines)
+
+    start = time.perf_counter()
+    program = parser.parse(source_code)
+    elapsed = time.perf_counter() - start
+
+    nodes, shallow, retained = measure(program)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+
+    print(f'lines:                {source_code.count(chr(10)) + 1}')
+    print(f'AST nodes:            {nodes}')
+    print(f'parse time:           {elapsed:.2f} s')
+    print(f'retained bytes/node:  {retained / nodes:.1f}')
+    print(f'shallow bytes/node:   {shallow / nodes:.1f}')
+    print(f'peak RSS:             {peak_rss / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
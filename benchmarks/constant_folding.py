@@ -0,0 +1,67 @@
+'''
+Benchmark of the constant folding pass (optimizer.ConstantFolder).
+
+Folds the workloads of benchmarks.interpreter (primes, fib, shapes) and a program with spelled-out
+constants (constants: literal arithmetic, if true/if false, while false loops, nested blocks and
+unused lets in a hot loop), checks the folded program prints the same output, and reports the number of AST nodes before and after folding, the time to fold, and
+the best of three interpreter runs of each version.
+
+Usage: python -m benchmarks.constant_folding [scale]
+'''
+
+import sys
+import time
+
+from benchmarks.interpreter import run_program
+from benchmarks.interpreter import workloads
+from optimizer import count_nodes
+from optimizer import fold_constants
+from parser import CoolPyParser
+from semant import analyze
+
+CONSTANTS = '''
+class Main inherits IO {
+    main() : Object {
+        let total : Int in let i : Int in {
+            while i < %(n)d loop {
+                {
+                    let seconds : Int <- 60 * 60 * 24 in let unused : Int <- 0 in {
+                        total <- total + (i - i / 7 * 7) * (seconds / (60 * 60)) + 0 - ~(~1);
+                        if 1 < 2 then total <- total * 1 else total <- 0 fi;
+                    };
+                    if not false then { 0; } else out_string("unreachable") fi;
+                    while false loop out_string("never") pool;
+                };
+                i <- i + (2 - 1);
+            } pool;
+            out_int(total);
+        }
+    };
+};
+'''
+
+
+def main(scale = 1):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    print(f'{"workload":<10} {"nodes":>7} {"folded":>7} {"fold ms":>8} {"run s":>8} {"folded run s":>13} '
+          f'{"speedup":>8}')
+    for name, source_code in workloads(scale) + [('constants', CONSTANTS % {'n': 100000 * scale})]:
+        program = parser.parse(source_code)
+        result = analyze(program, source_code)
+        assert not result.diagnostics, result.diagnostics
+        _, run_time, expected = run_program(program, result.environment)
+
+        start = time.perf_counter()
+        folded = fold_constants(program)
+        fold_time = time.perf_counter() - start
+        folded_result = analyze(folded, source_code)
+        assert not folded_result.diagnostics, folded_result.diagnostics
+        _, folded_time, output = run_program(folded, folded_result.environment)
+        assert output == expected, f'{name}: the outputs differ'
+
+        print(f'{name:<10} {count_nodes(program):>7} {count_nodes(folded):>7} {fold_time * 1000:>8.2f} '
+              f'{run_time:>8.3f} {folded_time:>13.3f} {run_time / folded_time:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,87 @@
+'''
+Parse-time scaling benchmark of the syntax error recovery of CoolPyParser.
+
+Generates Cool programs in which every other class header, feature, block expression or method
+body has a syntax error, and a program of N stray tokens, and reports the parse time per element
+and the number of diagnostics. Every error must be reported, and the partial program must keep
+the well-formed classes and features. With linear-time recovery the per-element time stays flat
+as N doubles.
+
+Usage: python -m benchmarks.error_recovery [max_size]
+'''
+
+import sys
+import time
+
+from parser import CoolPyParser
+
+
+def broken_classes(size):
+    return ''.join(f'class C{i} inherits {{ a : Int; }};\n' if i % 2 else f'class C{i} {{ a : Int; }};\n'
+                   for i in range(size))
+
+
+def broken_features(size):
+    features = ''.join(f'    a{i} : Int <- ;\n' if i % 2 else f'    a{i} : Int <- {i};\n'
+                       for i in range(size))
+    return f'class Main {{\n{features}}};\n'
+
+
+def broken_block(size):
+    expressions = ''.join(f'        x <- x + ;\n' if i % 2 else f'        x <- x + {i};\n'
+                          for i in range(size))
+    return f'class Main {{\n    x : Int;\n    main() : Int {{ {{\n{expressions}    }} }};\n}};\n'
+
+
+def broken_methods(size):
+    methods = ''.join(f'    m{i}() : Int {{ {i} + }};\n' if i % 2 else f'    m{i}() : Int {{ {i} }};\n'
+                      for i in range(size))
+    return f'class Main {{\n{methods}}};\n'
+
+
+def stray_tokens(size):
+    return 'class Main { };\n' + ') ' * size + ';\nclass Last { };\n'
+
+
+def time_parse(parser, source_code, repeat = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        program = parser.parse(source_code)
+        best = min(best, time.perf_counter() - start)
+    return best, program, parser.error_list
+
+
+def main(max_size = 32000):
+    parser = CoolPyParser()
+    # name, generator, expected number of diagnostics, expected (classes, features) kept.
+    generators = (
+        ('classes', broken_classes, lambda size: size // 2, lambda size: ((size + 1) // 2, (size + 1) // 2)),
+        ('features', broken_features, lambda size: size // 2, lambda size: (1, (size + 1) // 2)),
+        ('block', broken_block, lambda size: size // 2, lambda size: (1, 2)),
+        ('methods', broken_methods, lambda size: size // 2, lambda size: (1, (size + 1) // 2)),
+        ('stray', stray_tokens, lambda size: 1, lambda size: (2, 0)),
+    )
+
+    sizes = []
+    size = 1000
+    while size <= max_size:
+        sizes.append(size)
+        size *= 2
+
+    print(f'{"errors in":<10} {"N":>8} {"diagnostics":>12} {"total (ms)":>12} {"per item (us)":>14} {"ratio":>7}')
+    for name, generate, expected_errors, expected_kept in generators:
+        previous = None
+        for size in sizes:
+            elapsed, program, errors = time_parse(parser, generate(size))
+            kept = (len(program.classes), sum(len(node.features) for node in program.classes))
+            assert len(errors) == expected_errors(size), f'{name}: {len(errors)} diagnostics'
+            assert kept == expected_kept(size), f'{name}: kept {kept}'
+            ratio = f'{elapsed / previous:.2f}' if previous else '-'
+            print(f'{name:<10} {size:>8} {len(errors):>12} {elapsed * 1e3:>12.2f} '
+                  f'{elapsed / size * 1e6:>14.2f} {ratio:>7}')
+            previous = elapsed
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32000)
@@ -0,0 +1,76 @@
+'''
+Benchmark of IncrementalParser.reparse() against a full parse.
+
+Builds a program of the requested number of lines from examples/, then applies random edits that
+keep the program valid (an extra space or newline inserted in front of a class, a feature or an
+expression) and times reparse() and CoolPyParser.parse() on every edit. Checks that both give
+the same classes with the same spans.
+
+Usage: python -m benchmarks.incremental_reparse [lines] [edits]
+'''
+
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+
+from helpers import iter_nodes
+from incremental import IncrementalParser, TextEdit
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def spans(program):
+    return [(node.class_name, node.start, node.end) for node in iter_nodes(program)]
+
+
+def main(target_lines = 5000, edits = 50):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    parser = CoolPyParser(lexer_backend = 'fast')
+    incremental = IncrementalParser(parser)
+    program = parser.parse(source_code)
+    print(f'source: {source_code.count(chr(10)) + 1} lines, {len(program.classes)} classes')
+
+    generator = random.Random(1234)
+    full_times = []
+    incremental_times = []
+    fallbacks = 0
+    for _ in range(edits):
+        # Node starts are token starts, where whitespace can always be inserted.
+        nodes = list(iter_nodes(generator.choice(program.classes)))
+        position = generator.choice(nodes).start
+        edit = TextEdit(position, position, generator.choice((' ', '\n')))
+
+        start = time.perf_counter()
+        result = incremental.reparse(program, source_code, edit)
+        incremental_times.append(time.perf_counter() - start)
+        fallbacks += result.full
+
+        start = time.perf_counter()
+        expected = parser.parse(result.source)
+        full_times.append(time.perf_counter() - start)
+
+        assert spans(expected) == spans(result.program)
+        program, source_code = result.program, result.source
+
+    full = statistics.median(full_times)
+    partial = statistics.median(incremental_times)
+    print(f'{edits} edits, {fallbacks} full reparses')
+    print(f'{"parse":<12} {"median (ms)":>12} {"max (ms)":>10}')
+    print(f'{"full":<12} {full * 1000:>12.2f} {max(full_times) * 1000:>10.2f}')
+    print(f'{"incremental":<12} {partial * 1000:>12.2f} {max(incremental_times) * 1000:>10.2f}')
+    print(f'speedup: {full / partial:.0f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 50)
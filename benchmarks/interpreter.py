@@ -0,0 +1,108 @@
+'''
+Benchmark of the tree-walking interpreter (interpreter.CoolInterpreter) on CPU-bound programs.
+
+Runs a few Cool workloads (the other execution benchmarks reuse them through workloads()):
+
+    primes      examples/primes.cl with a larger bound (attribute initializers, while loops)
+    fib         naive recursive Fibonacci (self dispatch, arithmetic)
+    shapes      a loop dispatching a method of a class hierarchy on alternating receivers
+                (polymorphic DynamicDispatch sites, case, let)
+
+and reports the best of three runs of each, and the time spent before the program starts
+(building the vtables, resolving the variables and creating the inline caches).
+
+Usage: python -m benchmarks.interpreter [scale]
+'''
+
+import io
+import os
+import sys
+import time
+
+from interpreter import CoolInterpreter
+from parser import CoolPyParser
+from semant import analyze
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+FIB = '''
+class Main inherits IO {
+    fib(n : Int) : Int { if n < 2 then n else fib(n - 1) + fib(n - 2) fi };
+    main() : Object { out_int(fib(%(n)d)) };
+};
+'''
+
+SHAPES = '''
+class Shape { area() : Int { 0 }; scale(k : Int) : Shape { self }; };
+class Square inherits Shape {
+    side : Int <- 3;
+    area() : Int { side * side };
+    scale(k : Int) : Shape { { side <- side * k / k; self; } };
+};
+class Rectangle inherits Shape {
+    width : Int <- 2; height : Int <- 5;
+    area() : Int { width * height };
+};
+class Triangle inherits Rectangle { area() : Int { width * height / 2 }; };
+class Main inherits IO {
+    main() : Object {
+        let shapes : Shape in let total : Int in let i : Int in
+        let square : Shape <- new Square in let rectangle : Shape <- new Rectangle in
+        let triangle : Shape <- new Triangle in {
+            while i < %(n)d loop {
+                shapes <- case i - i / 3 * 3 of
+                    zero : Int => if zero = 0 then square else rectangle fi;
+                    other : Object => triangle;
+                esac;
+                total <- total + shapes.scale(2).area();
+                i <- i + 1;
+            } pool;
+            out_int(total);
+        }
+    };
+};
+'''
+
+
+def primes_source(stop):
+    with open(os.path.join(EXAMPLES, 'primes.cl'), 'r') as file:
+        return file.read().replace('stop : Int <- 500;', f'stop : Int <- {stop};')
+
+
+def workloads(scale = 1):
+    '''Returns the (name, source) pairs of the workloads, their size multiplied by scale.'''
+    return [
+        ('primes', primes_source(10000 * scale)),
+        ('fib', FIB % {'n': 21 + (scale - 1).bit_length()}),
+        ('shapes', SHAPES % {'n': 50000 * scale}),
+    ]
+
+
+def run_program(program, environment, repeat = 3):
+    '''Returns the best setup and run times of the program, and its output.'''
+    best_setup = best_run = float('inf')
+    for _ in range(repeat):
+        output = io.StringIO()
+        start = time.perf_counter()
+        interpreter = CoolInterpreter(program, environment, stdin = io.StringIO(), stdout = output)
+        setup = time.perf_counter()
+        interpreter.run()
+        best_setup = min(best_setup, setup - start)
+        best_run = min(best_run, time.perf_counter() - setup)
+    return best_setup, best_run, output.getvalue()
+
+
+def main(scale = 1):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    print(f'{"workload":<10} {"setup ms":>10} {"run s":>10}')
+    for name, source_code in workloads(scale):
+        program = parser.parse(source_code)
+        result = analyze(program, source_code)
+        assert not result.diagnostics, result.diagnostics
+
+        setup, run, _ = run_program(program, result.environment)
+        print(f'{name:<10} {setup * 1000:>10.2f} {run:>10.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
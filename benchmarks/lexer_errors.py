@@ -0,0 +1,85 @@
+'''
+Throughput benchmark of the 'ply' and 'fast' lexer backends on adversarial inputs.
+
+Generates inputs of the requested size (50 MB by default) that are mostly lexical errors: random
+bytes (a binary file read as text), illegal characters alternating with identifiers, a single run
+of illegal characters, and a comment and a string left open until the end of the input. Tokenizes
+each one from a string with both backends and from a stream with the 'fast' scanner, and reports
+the throughput, the number of tokens and of errors found, and the number of errors kept (the
+lexers keep at most 100 of them).
+
+Usage: python -m benchmarks.lexer_errors [megabytes]
+'''
+
+import io
+import random
+import sys
+import time
+
+from lexer import CoolPyLexer
+
+MAX_ERRORS = 100
+
+
+def random_bytes(size):
+    return random.Random(1234).randbytes(size).decode('latin-1')
+
+
+def alternating(size):
+    return '#a' * (size // 2)
+
+
+def illegal_run(size):
+    return '\x00' * size
+
+
+def open_comment(size):
+    return 'class Main { }; (* ' + 'a (b) * c\n' * (size // 10)
+
+
+def open_string(size):
+    return 'class Main { }; "' + 'a b c d e\n' * (size // 10)
+
+
+def tokenize(lexer, source_code, stream):
+    start = time.perf_counter()
+    lexer.reset()
+    if stream:
+        tokens = lexer.tokenize_stream(io.StringIO(source_code))
+    else:
+        lexer.input(source_code)
+        tokens = lexer
+    count = sum(1 for _ in tokens)
+    return count, time.perf_counter() - start
+
+
+def main(megabytes = 50):
+    size = megabytes * 1000000
+    lexers = (
+        ('ply', CoolPyLexer(max_errors = MAX_ERRORS), False),
+        ('fast', CoolPyLexer(backend = 'fast', max_errors = MAX_ERRORS), False),
+        ('stream', CoolPyLexer(backend = 'fast', max_errors = MAX_ERRORS), True),
+    )
+    inputs = (
+        ('random', random_bytes),
+        ('alternate', alternating),
+        ('run', illegal_run),
+        ('comment', open_comment),
+        ('string', open_string),
+    )
+
+    print(f'{"input":<10} {"backend":<8} {"tokens":>10} {"errors":>10} {"kept":>5} {"time (s)":>9} {"MB/s":>7}')
+    for name, generate in inputs:
+        source_code = generate(size)
+        expected = None
+        for backend, lexer, stream in lexers:
+            count, elapsed = tokenize(lexer, source_code, stream)
+            result = (count, lexer.error_count, lexer.error_list)
+            assert expected is None or result == expected, f'{name}: the backends disagree'
+            expected = result
+            print(f'{name:<10} {backend:<8} {count:>10} {lexer.error_count:>10} {len(lexer.error_list):>5} '
+                  f'{elapsed:>9.2f} {len(source_code) / elapsed / 1e6:>7.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
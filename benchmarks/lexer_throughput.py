@@ -0,0 +1,98 @@
+'''
+Differential check and token-throughput benchmark of the 'ply' and 'fast' lexer backends.
+
+First checks that both backends produce identical tokens (type, value, line number and position)
+and identical error reports over every program in examples/ and over randomly generated inputs,
+then reports the tokens per second of each backend on examples/ replicated to the requested
+number of lines.
+
+Usage: python -m benchmarks.lexer_throughput [lines] [fuzz_cases]
+'''
+
+import glob
+import os
+import random
+import sys
+import time
+
+from lexer import CoolPyLexer
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+# Fragments the fuzzer glues together: keywords in mixed case, identifiers, literals, operators,
+# comment and string delimiters, whitespace and a few illegal characters.
+FRAGMENTS = [
+    'class', 'Class', 'CLASS', 'inherits', 'if', 'then', 'else', 'fi', 'while', 'loop', 'pool',
+    'let', 'in', 'case', 'of', 'esac', 'new', 'isvoid', 'self', 'SELF_TYPE', 'not', 'NoT',
+    'nothing', 'true', 'false', 'trueish', 'True', 'x', 'y1', 'a_B', 'iNhErItS', 'Main', 'IO',
+    '0', '42', '007', '"str"', '"multi\nline"', '"esc\\"aped"', '"tab\\t"', '\\', '\\\n', '"', '(*', '*)', '--', '-- comment\n',
+    '(', ')', '{', '}', ':', ',', '.', ';', '@', '+', '-', '*', '/', '~', '<', '<=', '<-', '=', '=>',
+    ' ', '  ', '\t', '\n', '\n\n', '\r', '!', '#', '$', "'", '[', ']', '\x00', 'é',
+]
+
+
+def fuzz_inputs(count, seed = 1234):
+    generator = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(generator.choice(FRAGMENTS) for _ in range(generator.randint(1, 200)))
+
+
+def tokenize(lexer, source_code):
+    lexer.reset()
+    lexer.input(source_code)
+    tokens = [(token.type, token.value, token.lineno, token.lexpos) for token in lexer]
+    return tokens, lexer.error_list
+
+
+def differential_check(ply_lexer, fast_lexer, sources):
+    checked = 0
+    for name, source_code in sources:
+        expected = tokenize(ply_lexer, source_code)
+        actual = tokenize(fast_lexer, source_code)
+        if expected != actual:
+            raise AssertionError(f'Lexer backends disagree on {name}:\n{expected}\n{actual}')
+        checked += 1
+    return checked
+
+
+def throughput(lexer, source_code, repeat = 3):
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        lexer.reset()
+        start = time.perf_counter()
+        lexer.input(source_code)
+        count = sum(1 for _ in lexer)
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+
+def main(target_lines = 50000, fuzz_cases = 2000):
+    ply_lexer = CoolPyLexer()
+    fast_lexer = CoolPyLexer(backend = 'fast')
+
+    examples = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            examples.append((path, file.read()))
+
+    checked = differential_check(ply_lexer, fast_lexer, examples)
+    checked += differential_check(ply_lexer, fast_lexer,
+                                  ((f'fuzz case {i}', source) for i, source in enumerate(fuzz_inputs(fuzz_cases))))
+    print(f'differential check: {checked} inputs, identical tokens and errors')
+
+    chunk = '\n'.join(source for _, source in examples)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    print(f'{"backend":<8} {"tokens":>9} {"time (s)":>9} {"tokens/s":>12}')
+    results = {}
+    for backend, lexer in (('ply', ply_lexer), ('fast', fast_lexer)):
+        count, elapsed = throughput(lexer, source_code)
+        results[backend] = elapsed
+        print(f'{backend:<8} {count:>9} {elapsed:>9.3f} {count / elapsed:>12.0f}')
+    print(f'speedup: {results["ply"] / results["fast"]:.2f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,63 @@
+'''
+Benchmark of the peephole optimizer of the MIPS backend (mips).
+
+Compiles the workloads of benchmarks.interpreter (primes, fib, shapes) to MIPS assembly with and
+without the peephole pass, runs both on the bundled simulator (spim), checks they print what the
+interpreter prints, and reports the number of instructions of the generated code (the runtime
+excluded), the number of instructions executed and the simulation time. The workloads are scaled
+down by default: the simulator runs a few million instructions per second.
+
+Usage: python -m benchmarks.mips [scale]
+'''
+
+import io
+import sys
+import time
+
+from benchmarks.interpreter import primes_source
+from benchmarks.interpreter import run_program
+from benchmarks.interpreter import FIB
+from benchmarks.interpreter import SHAPES
+from mips import RUNTIME
+from mips import compile_program
+from parser import CoolPyParser
+from semant import analyze
+from spim import run_assembly
+
+
+def workloads(scale = 1):
+    return [
+        ('primes', primes_source(500 * scale)),
+        ('fib', FIB % {'n': 15 + (scale - 1).bit_length()}),
+        ('shapes', SHAPES % {'n': 2000 * scale}),
+    ]
+
+
+def generated_size(assembly):
+    '''The number of instructions of the text segment, the runtime excluded.'''
+    text = assembly[assembly.index('\t.text\n'):assembly.index(RUNTIME)]
+    return sum(1 for line in text.splitlines()[1:] if line.startswith('\t'))
+
+
+def main(scale = 1):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    print(f'{"workload":<10} {"peephole":>9} {"instructions":>13} {"executed":>11} {"run s":>8}')
+    for name, source_code in workloads(scale):
+        program = parser.parse(source_code)
+        result = analyze(program, source_code)
+        assert not result.diagnostics, result.diagnostics
+        _, _, expected = run_program(program, result.environment, repeat = 1)
+
+        for optimize in (False, True):
+            assembly = compile_program(program, result.environment, result.types, source_code, optimize)
+            size = generated_size(assembly)
+            output = io.StringIO()
+            start = time.perf_counter()
+            _, executed = run_assembly(assembly, io.StringIO(), output)
+            elapsed = time.perf_counter() - start
+            assert output.getvalue() == expected, f'{name}: the outputs differ'
+            print(f'{name:<10} {"on" if optimize else "off":>9} {size:>13} {executed:>11} {elapsed:>8.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,71 @@
+'''
+Parse-time scaling benchmark for the list productions of CoolPyParser.
+
+Generates Cool programs whose class_list, features_list, block_list and arguments_list grow
+to N elements and reports the parse time per element. With linear-time list productions the
+per-element time stays flat as N doubles.
+
+Usage: python -m benchmarks.parse_scaling [max_size]
+'''
+
+import sys
+import time
+
+from parser import CoolPyParser
+
+
+def many_classes(size):
+    return ''.join(f'class C{i} {{ }};\n' for i in range(size))
+
+
+def many_features(size):
+    features = ''.join(f'    a{i} : Int <- {i};\n' for i in range(size))
+    return f'class Main {{\n{features}}};\n'
+
+
+def long_block(size):
+    expressions = ''.join(f'        x <- x + {i};\n' for i in range(size))
+    return f'class Main {{\n    x : Int;\n    main() : Int {{ {{\n{expressions}    }} }};\n}};\n'
+
+
+def many_arguments(size):
+    arguments = ', '.join(str(i) for i in range(size))
+    return f'class Main {{\n    main() : Object {{ f({arguments}) }};\n}};\n'
+
+
+def time_parse(parser, source_code, repeat = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser.parse(source_code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(max_size = 32000):
+    parser = CoolPyParser()
+    generators = (
+        ('classes', many_classes),
+        ('features', many_features),
+        ('block', long_block),
+        ('arguments', many_arguments),
+    )
+
+    sizes = []
+    size = 1000
+    while size <= max_size:
+        sizes.append(size)
+        size *= 2
+
+    print(f'{"list":<10} {"N":>8} {"total (ms)":>12} {"per item (us)":>14} {"ratio":>7}')
+    for name, generate in generators:
+        previous = None
+        for size in sizes:
+            elapsed = time_parse(parser, generate(size))
+            ratio = f'{elapsed / previous:.2f}' if previous else '-'
+            print(f'{name:<10} {size:>8} {elapsed * 1e3:>12.2f} {elapsed / size * 1e6:>14.2f} {ratio:>7}')
+            previous = elapsed
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32000)
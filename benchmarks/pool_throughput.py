@@ -0,0 +1,49 @@
+'''
+Throughput benchmark for pool.ParserPool.
+
+Parses a batch of Cool files (the programs in examples/, repeated) with 1, 4 and N workers
+using both the thread and the process executor, and reports files per second.
+
+Usage: python -m benchmarks.pool_throughput [files]
+'''
+
+import glob
+import os
+import sys
+import time
+
+from pool import ParserPool
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def load_sources(count):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    return [sources[i % len(sources)] for i in range(count)]
+
+
+def main(count = 400):
+    sources = load_sources(count)
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 4, cpus})
+
+    print(f'{"executor":<10} {"workers":>8} {"files":>6} {"time (s)":>9} {"files/s":>9}')
+    for executor in ('thread', 'process'):
+        for workers in worker_counts:
+            with ParserPool(size = workers, executor = executor) as pool:
+                # Warm up: start the workers and build their parsers.
+                pool.parse_many(sources[:workers])
+
+                start = time.perf_counter()
+                results = pool.parse_many(sources, chunksize = 8)
+                elapsed = time.perf_counter() - start
+
+            assert all(not result.errors for result in results)
+            print(f'{executor:<10} {workers:>8} {count:>6} {elapsed:>9.2f} {count / elapsed:>9.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
@@ -0,0 +1,80 @@
+'''
+Benchmark of the Python backend (pycompile) against the tree-walking interpreter.
+
+Runs the workloads of benchmarks.interpreter (primes, fib, shapes) with both engines, checks
+they print the same output, and reports the best of three runs of each, the time spent compiling
+the program to Python (from the checked AST), and the time to load it from a warm
+__coolcache__ entry instead.
+
+Usage: python -m benchmarks.pycompile [scale]
+'''
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.interpreter import run_program
+from benchmarks.interpreter import workloads
+from parser import CoolPyParser
+from pycompile import compile_file
+from pycompile import compile_program
+from semant import analyze
+
+
+def run_compiled(compiled, repeat = 3):
+    '''Returns the best run time of a compiled program, and its output.'''
+    best = float('inf')
+    for _ in range(repeat):
+        output = io.StringIO()
+        start = time.perf_counter()
+        compiled.run(stdin = io.StringIO(), stdout = output)
+        best = min(best, time.perf_counter() - start)
+    return best, output.getvalue()
+
+
+def cached_load_time(source_code, repeat = 3):
+    '''Returns the best time of compile_file() on a source whose cache entry is warm.'''
+    directory = tempfile.mkdtemp(prefix = 'cool-pycompile-')
+    try:
+        path = os.path.join(directory, 'program.cl')
+        with open(path, 'w') as file:
+            file.write(source_code)
+        compile_file(path)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compiled = compile_file(path)
+            best = min(best, time.perf_counter() - start)
+        assert compiled.source is None, 'the cache entry was not used'
+        return best
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(scale = 1):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    print(f'{"workload":<10} {"interpret s":>12} {"compiled s":>12} {"speedup":>8} '
+          f'{"compile ms":>11} {"cached ms":>10}')
+    for name, source_code in workloads(scale):
+        program = parser.parse(source_code)
+        result = analyze(program, source_code)
+        assert not result.diagnostics, result.diagnostics
+
+        _, interpret_time, expected = run_program(program, result.environment)
+
+        start = time.perf_counter()
+        compiled = compile_program(program, result.environment, result.types)
+        compile_time = time.perf_counter() - start
+        run_time, output = run_compiled(compiled)
+        assert output == expected, f'{name}: the outputs differ'
+
+        load_time = cached_load_time(source_code)
+        print(f'{name:<10} {interpret_time:>12.3f} {run_time:>12.3f} {interpret_time / run_time:>7.1f}x '
+              f'{compile_time * 1000:>11.2f} {load_time * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
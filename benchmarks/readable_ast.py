@@ -0,0 +1,127 @@
+'''
+Benchmark of the AST printers on deeply nested programs.
+
+Builds a program whose methods are let chains nested the requested number of levels deep (each
+let body is a block holding an arithmetic expression and the next let), then prints it with
+helpers.print_readable_ast() and with str() (AST.to_readable()), and with the recursive printer
+they replaced, kept below as a reference, checking that the outputs are identical. Finally prints
+a much deeper program, past the recursion limit that the recursive printer ran into.
+
+Usage: python -m benchmarks.readable_ast [depth] [methods]
+'''
+
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from ast import AST
+from ast import Block
+from ast import Integer
+from helpers import print_readable_ast
+from parser import CoolPyParser
+
+
+def recursive_print_readable_ast(tree, level = 0, inline = False):
+    '''The recursive printer, as it was before helpers.iter_readable_ast().'''
+
+    def indent(source_string, level = 1, lstrip_first = False):
+        indentation = '    '
+        out = '\n'.join((level * indentation) + i for i in source_string.splitlines())
+        if lstrip_first:
+            return out.lstrip()
+        return out
+
+    if isinstance(tree, AST) and hasattr(tree, 'to_tuple'):
+        attrs = tree.to_tuple()
+        if len(attrs) <= 1:
+            print(indent(f'{tree.class_name}()', level, inline))
+        else:
+            print(indent(f'{tree.class_name}(', level, inline))
+            for key, value in attrs:
+                if key == 'class_name':
+                    continue
+                print(indent(key + '=', level + 1), end='')
+                recursive_print_readable_ast(value, level + 1, True)
+            print(indent(')', level))
+    elif isinstance(tree, (tuple, list)):
+        braces = '()' if isinstance(tree, tuple) else '[]'
+        if len(tree) == 0:
+            print(braces)
+        else:
+            print(indent(braces[0], level, inline))
+            for obj in tree:
+                recursive_print_readable_ast(obj, level + 1)
+            print(indent(braces[1], level))
+    else:
+        print(indent(repr(tree), level, inline))
+
+
+def nested_source(depth, methods):
+    def body(level):
+        if level == depth:
+            return 'x0'
+        return (f'let x{level + 1} : Int <- x{level} * 2 + {level} in '
+                f'{{ x{level + 1} - {level}; {body(level + 1)}; }}')
+
+    features = '\n'.join(f'    m{i}(x0 : Int) : Int {{ {body(0)} }};' for i in range(methods))
+    return f'class Main inherits IO {{\n{features}\n    main() : Object {{ out_int(m0(1)) }};\n}};\n'
+
+
+def best_of(function, repeat = 3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def printed(printer, program):
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        printer(program)
+    return sink.getvalue()
+
+
+def main(depth = 50, methods = 20):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    program = parser.parse(nested_source(depth, methods))
+    text = printed(print_readable_ast, program)
+    print(f'program: {methods} methods nested {depth} levels, {len(text) / 1e6:.1f} MB printed')
+
+    old_time, old_text = best_of(lambda: printed(recursive_print_readable_ast, program))
+    new_time, new_text = best_of(lambda: printed(print_readable_ast, program))
+    str_time, _ = best_of(lambda: str(program))
+    assert old_text == new_text
+
+    print(f'{"printer":<28} {"ms":>10}')
+    print(f'{"recursive print_readable_ast":<28} {old_time * 1000:>10.1f}')
+    print(f'{"print_readable_ast":<28} {new_time * 1000:>10.1f}')
+    print(f'{"str(program)":<28} {str_time * 1000:>10.1f}')
+    print(f'speedup: {old_time / new_time:.1f}x')
+
+    # Every level takes two frames of the recursive printer (the Block and its expression list).
+    deep = sys.getrecursionlimit()
+    tree = Integer(0)
+    for _ in range(deep):
+        tree = Block(expression_list = (tree,))
+    try:
+        printed(recursive_print_readable_ast, tree)
+        outcome = 'ok'
+    except RecursionError:
+        outcome = 'RecursionError'
+    start = time.perf_counter()
+    text = printed(print_readable_ast, tree)
+    print_time = time.perf_counter() - start
+    start = time.perf_counter()
+    str(tree)
+    str_time = time.perf_counter() - start
+    print(f'{deep} nested blocks: recursive printer {outcome}, '
+          f'print_readable_ast {print_time * 1000:.0f} ms ({len(text) / 1e6:.1f} MB), str() {str_time * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
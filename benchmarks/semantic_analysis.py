@@ -0,0 +1,118 @@
+'''
+Benchmark of the semantic analysis (semant.analyze()) on a program with many classes.
+
+Generates a program whose classes form a random inheritance tree of the requested size, every
+class with an attribute and methods that override, dispatch and join types with if and case
+(so the checker computes least upper bounds). Reports the time spent building the
+ClassEnvironment and type checking, serially and on a pool of worker processes (checking the two
+agree), then compares the least upper bound and conformance queries
+of the environment with walks of the parent chains (what a checker without the precomputed
+indexes does), checking both agree.
+
+Usage: python -m benchmarks.semantic_analysis [classes] [queries] [workers]
+'''
+
+import os
+import random
+import sys
+import time
+
+from parser import CoolPyParser
+from semant import analyze
+from semant import build_environment
+
+
+def generate_program(classes, seed = 1234):
+    generator = random.Random(seed)
+    names = [f'C{i}' for i in range(classes)]
+    parts = []
+    for i, name in enumerate(names):
+        # Mostly deep chains, with some branching.
+        parent = names[i - 1] if i and generator.random() < 0.7 else generator.choice(['IO'] + names[:i])
+        other = generator.choice(names[:i + 1])
+        parts.append(
+            f'class {name} inherits {parent} {{\n'
+            f'    a{i} : Int <- {i};\n'
+            f'    f(x : Int) : Object {{ if x < a{i} then new {name} else new {other} fi }};\n'
+            f'    g{i}(o : Object) : Object {{\n'
+            f'        case o of i : Int => i + a{i}; s : String => s.length(); c : {name} => c.f(a{i}); esac\n'
+            f'    }};\n'
+            f'}};\n')
+    parts.append('class Main inherits IO { main() : Object { out_int(0) }; };\n')
+    return ''.join(parts)
+
+
+def walk_lub(parents, first, second):
+    ancestors = set()
+    while first is not None:
+        ancestors.add(first)
+        first = parents[first]
+    while second not in ancestors:
+        second = parents[second]
+    return second
+
+
+def walk_conforms(parents, child, ancestor):
+    while child is not None:
+        if child == ancestor:
+            return True
+        child = parents[child]
+    return False
+
+
+def main(classes = 3000, queries = 100000, workers = None):
+    workers = workers or os.cpu_count() or 1
+    source_code = generate_program(classes)
+    parser = CoolPyParser(lexer_backend = 'fast')
+    start = time.perf_counter()
+    program = parser.parse(source_code)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    environment, _, _ = build_environment(program)
+    environment_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = analyze(program)
+    analyze_time = time.perf_counter() - start
+    assert not result.diagnostics, result.diagnostics[:5]
+
+    depth = max(environment.depths)
+    print(f'program: {classes} classes (depth up to {depth}), {len(result.types)} expressions; '
+          f'parse {parse_time:.2f} s')
+    print(f'environment {environment_time * 1000:.1f} ms, whole analysis {analyze_time * 1000:.1f} ms')
+
+    start = time.perf_counter()
+    parallel = analyze(program, workers = workers)
+    parallel_time = time.perf_counter() - start
+    assert parallel.diagnostics == result.diagnostics and parallel.types == result.types
+    print(f'whole analysis on {workers} worker processes {parallel_time * 1000:.1f} ms '
+          f'({analyze_time / parallel_time:.2f}x)')
+
+    generator = random.Random(42)
+    pairs = [(generator.choice(environment.names), generator.choice(environment.names))
+             for _ in range(queries)]
+    parents = {name: environment.parent(name) for name in environment.names}
+
+    start = time.perf_counter()
+    indexed = [environment.lub(a, b) for a, b in pairs]
+    indexed_conforms = [environment.conforms(a, b) for a, b in pairs]
+    index_time = (time.perf_counter() - start) / (2 * queries)
+
+    start = time.perf_counter()
+    walked = [walk_lub(parents, a, b) for a, b in pairs]
+    walked_conforms = [walk_conforms(parents, a, b) for a, b in pairs]
+    walk_time = (time.perf_counter() - start) / (2 * queries)
+
+    assert indexed == walked and indexed_conforms == walked_conforms
+
+    print(f'{"query":<14} {"us/query":>10}')
+    print(f'{"indexes":<14} {index_time * 1e6:>10.2f}')
+    print(f'{"parent walks":<14} {walk_time * 1e6:>10.2f}')
+    print(f'speedup: {walk_time / index_time:.0f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100000,
+         int(sys.argv[3]) if len(sys.argv) > 3 else None)
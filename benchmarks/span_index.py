@@ -0,0 +1,83 @@
+'''
+Benchmark of position queries with spans.SpanIndex.
+
+Parses examples/ replicated to the requested number of lines, builds the SpanIndex, then answers
+random "node at offset" and "nodes on line" queries with the index and with a walk of the whole
+tree (what editor tooling had to do before nodes carried spans), and checks both agree.
+
+Usage: python -m benchmarks.span_index [lines] [queries]
+'''
+
+import glob
+import os
+import random
+import sys
+import time
+
+from helpers import iter_nodes
+from parser import CoolPyParser
+from spans import SpanIndex
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def walk_node_at(program, offset):
+    innermost = None
+    for node in iter_nodes(program):
+        if node.start <= offset < node.end:
+            if innermost is None or node.end - node.start <= innermost.end - innermost.start:
+                innermost = node
+    return innermost
+
+
+def walk_nodes_on_line(program, start, end):
+    return [node for node in iter_nodes(program) if start <= node.start < end]
+
+
+def main(target_lines = 20000, queries = 200):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    parser = CoolPyParser(lexer_backend = 'fast')
+    start = time.perf_counter()
+    program = parser.parse(source_code)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SpanIndex(program, source_code)
+    index_time = time.perf_counter() - start
+    print(f'source: {source_code.count(chr(10)) + 1} lines, {len(index)} nodes; '
+          f'parse {parse_time:.3f} s, index build {index_time * 1000:.1f} ms')
+
+    generator = random.Random(1234)
+    offsets = [generator.randrange(len(source_code)) for _ in range(queries)]
+    lines = [generator.randint(1, len(index.lines)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    indexed = [index.node_at(offset) for offset in offsets]
+    indexed_lines = [index.nodes_on_line(line) for line in lines]
+    index_query = (time.perf_counter() - start) / (2 * queries)
+
+    start = time.perf_counter()
+    walked = [walk_node_at(program, offset) for offset in offsets]
+    walked_lines = [walk_nodes_on_line(program, *index.lines.line_span(line)) for line in lines]
+    walk_query = (time.perf_counter() - start) / (2 * queries)
+
+    for a, b in zip(indexed, walked):
+        assert (a is None) == (b is None) and (a is None or (a.start, a.end) == (b.start, b.end))
+    for a, b in zip(indexed_lines, walked_lines):
+        assert sorted(map(id, a)) == sorted(map(id, b))
+
+    print(f'{"lookup":<10} {"us/query":>12}')
+    print(f'{"SpanIndex":<10} {index_query * 1e6:>12.2f}')
+    print(f'{"tree walk":<10} {walk_query * 1e6:>12.2f}')
+    print(f'speedup: {walk_query / index_query:.0f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -0,0 +1,63 @@
+'''
+Startup benchmark for CoolPyParser.build().
+
+Reports the time to build a parser (lexer and LALR tables included) when:
+  - the table cache is disabled and tables are regenerated in a fresh directory (previous behaviour),
+  - the table cache directory is empty (first worker on a machine),
+  - the table cache is populated but not yet loaded by the process (every later worker),
+  - the tables are already loaded by the process (every further parser in the same worker).
+
+Usage: python -m benchmarks.startup [repeat]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from parser import CoolPyParser
+from tables import TableCache
+
+
+def time_build(repeat, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        CoolPyParser(**kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(repeat = 5):
+    workdir = tempfile.mkdtemp(prefix = 'coolpy-startup-')
+    try:
+        legacy_dir = os.path.join(workdir, 'legacy')
+        cache_dir = os.path.join(workdir, 'cache')
+        os.makedirs(legacy_dir)
+
+        uncached = time_build(repeat, cache_tables = False, outputdir = legacy_dir)
+
+        cold = float('inf')
+        for _ in range(repeat):
+            TableCache(cache_dir).clear()
+            cold = min(cold, time_build(1, cache_dir = cache_dir))
+
+        warm = float('inf')
+        for _ in range(repeat):
+            TableCache._loaded.clear()
+            warm = min(warm, time_build(1, cache_dir = cache_dir))
+
+        loaded = time_build(repeat, cache_dir = cache_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors = True)
+
+    print(f'{"build":<28} {"time (ms)":>10}')
+    print(f'{"no table cache":<28} {uncached * 1e3:>10.2f}')
+    print(f'{"cold cache":<28} {cold * 1e3:>10.2f}')
+    print(f'{"warm cache":<28} {warm * 1e3:>10.2f}')
+    print(f'{"tables loaded in process":<28} {loaded * 1e3:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,86 @@
+'''
+Memory benchmark for streaming lexing.
+
+Writes a generated Cool source of the requested size (in MiB) to a temporary file, tokenizes it
+with CoolPyLexer.tokenize_stream() from a binary file object, then from an mmap, then with the
+whole file read into a string, and reports the token throughput and the growth of the peak
+resident set size of each run. (Pages of an mmap that have been read count towards the RSS while
+the map is open, even though they belong to the page cache and are never copied.)
+
+Usage: python -m benchmarks.stream_lexing [size_mib]
+'''
+
+import mmap
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from lexer import CoolPyLexer
+
+CLASS_TEMPLATE = '''(* generated class {0} (* with a nested comment *) *)
+class C{0} inherits IO {{
+    x : Int <- {0};
+    s : String <- "value of class {0}";
+    f(a : Int, b : Int) : Int {{ {{ x <- a + b * x; if x < 0 then ~x else x fi; }} }};  -- inline comment
+}};
+'''
+
+
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform != 'darwin' else rss / (1024 * 1024)
+
+
+def write_source(path, size):
+    written = 0
+    index = 0
+    with open(path, 'w') as file:
+        while written < size:
+            chunk = ''.join(CLASS_TEMPLATE.format(index + i) for i in range(1000))
+            file.write(chunk)
+            written += len(chunk)
+            index += 1000
+
+
+def main(size_mib = 100):
+    lexer = CoolPyLexer(backend = 'fast')
+    handle, path = tempfile.mkstemp(suffix = '.cl')
+    os.close(handle)
+    try:
+        write_source(path, size_mib * 1024 * 1024)
+
+        results = []
+
+        before = peak_rss()
+        start = time.perf_counter()
+        with open(path, 'rb') as file:
+            count = sum(1 for _ in lexer.tokenize_stream(file))
+        results.append(('streamed', count, time.perf_counter() - start, peak_rss() - before))
+
+        before = peak_rss()
+        start = time.perf_counter()
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as source:
+                count = sum(1 for _ in lexer.tokenize_stream(source))
+        results.append(('mmap', count, time.perf_counter() - start, peak_rss() - before))
+
+        before = peak_rss()
+        start = time.perf_counter()
+        with open(path, 'r') as file:
+            lexer.input(file.read())
+        count = sum(1 for _ in lexer)
+        results.append(('in memory', count, time.perf_counter() - start, peak_rss() - before))
+    finally:
+        os.remove(path)
+
+    assert len({count for _, count, _, _ in results}) == 1
+    print(f'source: {size_mib} MiB, {results[0][1]} tokens')
+    print(f'{"mode":<10} {"time (s)":>9} {"tokens/s":>10} {"peak RSS growth (MiB)":>22}')
+    for mode, count, elapsed, rss in results:
+        print(f'{mode:<10} {elapsed:>9.2f} {count / elapsed:>10.0f} {rss:>22.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,74 @@
+'''
+Benchmark of the string literal scanner and of the symbol table of CoolPyLexer.
+
+Tokenizes a program made of string literals with escapes (\\n, \\t, \\", escaped newlines) of
+growing lengths up to the 1024-character limit with both lexer backends, checks they give the same
+tokens, and reports the throughput. Then parses the programs in examples/, replicated up to
+roughly the requested number of lines, and reports the number of names and literals in the AST,
+the number of distinct objects among them (one per entry of the symbol table) and the bytes the
+sharing saves.
+
+Usage: python -m benchmarks.string_literals [lines]
+'''
+
+import sys
+import time
+
+from benchmarks.ast_memory import replicated_source
+from helpers import iter_nodes
+from lexer import CoolPyLexer
+from parser import CoolPyParser
+
+
+def string_program(lines):
+    literals = []
+    for i in range(lines):
+        text = 'word\\t' * (i % 150) + 'quote \\" and \\\\ back\\\nslash\\n'
+        literals.append(f'        out_string("{text}");\n')
+    return 'class Main inherits IO {\n    main() : Object {\n' + ''.join(literals) + '    };\n};\n'
+
+
+def tokenize(lexer, source_code):
+    start = time.perf_counter()
+    lexer.reset()
+    lexer.input(source_code)
+    tokens = [(token.type, token.value, token.lineno, token.lexpos) for token in lexer]
+    return tokens, time.perf_counter() - start
+
+
+def leaf_values(program):
+    for node in iter_nodes(program):
+        for field in type(node).__slots__:
+            value = getattr(node, field)
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                yield value
+
+
+def main(lines = 20000):
+    source_code = string_program(lines)
+    print(f'{"backend":<8} {"tokens":>8} {"strings":>8} {"time (s)":>9} {"MB/s":>7}')
+    expected = None
+    for backend in ('ply', 'fast'):
+        lexer = CoolPyLexer(backend = backend)
+        tokens, elapsed = tokenize(lexer, source_code)
+        assert not lexer.error_list, lexer.error_list
+        assert expected is None or tokens == expected, 'the backends disagree'
+        expected = tokens
+        strings = sum(1 for token in tokens if token[0] == 'STRING')
+        print(f'{backend:<8} {len(tokens):>8} {strings:>8} {elapsed:>9.3f} '
+              f'{len(source_code) / elapsed / 1e6:>7.1f}')
+
+    parser = CoolPyParser(lexer_backend = 'fast')
+    program = parser.parse(replicated_source(lines))
+    values = list(leaf_values(program))
+    distinct = {id(value): value for value in values}
+    unshared = sum(sys.getsizeof(value) for value in values)
+    shared = sum(sys.getsizeof(value) for value in distinct.values())
+    print(f'\nnames and literals in the AST: {len(values)}, distinct objects: {len(distinct)} '
+          f'(symbol table: {len(parser.symbols)} entries)')
+    print(f'bytes of the values: {unshared} without sharing, {shared} shared '
+          f'({unshared - shared} saved)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,79 @@
+'''
+Memory benchmark for the columnar TokenBuffer.
+
+Tokenizes examples/ replicated to the requested number of lines and compares the memory held by
+a list of PLY LexToken objects with the memory of a TokenBuffer (both relative to the size of
+the source text). Also checks that parsing from the buffer gives the same AST as parsing the
+source, and times both.
+
+Usage: python -m benchmarks.token_buffer [lines]
+'''
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+from helpers import print_readable_ast
+from lexer import CoolPyLexer
+from parser import CoolPyParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+def readable(program):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        print_readable_ast(program)
+    return output.getvalue()
+
+
+def main(target_lines = 20000):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES, '*.cl'))):
+        with open(path, 'r') as file:
+            sources.append(file.read())
+    chunk = '\n'.join(sources)
+    source_code = '\n'.join([chunk] * max(1, target_lines // chunk.count('\n')))
+
+    lexer = CoolPyLexer(backend = 'fast')
+
+    tracemalloc.start()
+    lexer.reset()
+    lexer.input(source_code)
+    token_list = list(lexer)
+    objects_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del token_list
+
+    lexer.reset()
+    start = time.perf_counter()
+    buffer = lexer.tokenize_all(source_code)
+    tokenize_time = time.perf_counter() - start
+    buffer_size = buffer.nbytes()
+
+    print(f'source: {len(source_code)} characters, {len(buffer)} tokens, '
+          f'{len(buffer.values)} distinct values')
+    print(f'{"representation":<16} {"bytes":>11} {"bytes/token":>12} {"x source":>9}')
+    for name, size in (('token objects', objects_size), ('TokenBuffer', buffer_size)):
+        print(f'{name:<16} {size:>11} {size / len(buffer):>12.1f} {size / len(source_code):>9.2f}')
+    print(f'tokenize_all: {tokenize_time:.3f} s')
+
+    parser = CoolPyParser(lexer_backend = 'fast')
+    start = time.perf_counter()
+    expected = parser.parse(source_code)
+    from_source = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = parser.parse(tokenfunc = buffer.tokenfunc())
+    from_buffer = time.perf_counter() - start
+
+    assert readable(expected) == readable(actual)
+    print(f'parse from source: {from_source:.3f} s, from TokenBuffer: {from_buffer:.3f} s (identical ASTs)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
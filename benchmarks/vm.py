@@ -0,0 +1,67 @@
+'''
+Benchmark of the bytecode virtual machine (vm) against the tree-walking interpreter.
+
+Runs the workloads of benchmarks.interpreter (primes, fib, shapes) with both engines, checks
+they print the same output, and reports the best of three runs of each. Also reports the size of
+the serialized bytecode (after checking the program read back from it prints the same output),
+and the time to get a runnable program from it (BytecodeProgram.loads())
+compared with parsing, checking and compiling the source, which shipping bytecode skips.
+
+Usage: python -m benchmarks.vm [scale]
+'''
+
+import io
+import sys
+import time
+
+from benchmarks.interpreter import run_program
+from benchmarks.interpreter import workloads
+from parser import CoolPyParser
+from semant import analyze
+from vm import BytecodeProgram
+from vm import VirtualMachine
+from vm import compile_program
+
+
+def best_time(function, repeat = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(scale = 1):
+    parser = CoolPyParser(lexer_backend = 'fast')
+    print(f'{"workload":<10} {"interpret s":>12} {"vm s":>8} {"speedup":>8} {"bytes":>7} '
+          f'{"from source ms":>15} {"from bytecode ms":>17}')
+    for name, source_code in workloads(scale):
+        program = parser.parse(source_code)
+        result = analyze(program, source_code)
+        assert not result.diagnostics, result.diagnostics
+
+        _, interpret_time, expected = run_program(program, result.environment)
+
+        bytecode = compile_program(program, result.environment, result.types)
+        output = io.StringIO()
+        vm_time = best_time(lambda: VirtualMachine(bytecode, io.StringIO(), output).run())
+        assert output.getvalue() == expected * 3, f'{name}: the outputs differ'
+
+        def from_source():
+            parsed = parser.parse(source_code)
+            analysis = analyze(parsed, source_code)
+            return compile_program(parsed, analysis.environment, analysis.types)
+
+        data = bytecode.dumps()
+        output = io.StringIO()
+        VirtualMachine(BytecodeProgram.loads(data), io.StringIO(), output).run()
+        assert output.getvalue() == expected, f'{name}: the loaded bytecode prints another output'
+        source_time = best_time(from_source)
+        load_time = best_time(lambda: VirtualMachine(BytecodeProgram.loads(data)))
+        print(f'{name:<10} {interpret_time:>12.3f} {vm_time:>8.3f} {interpret_time / vm_time:>7.1f}x '
+              f'{len(data):>7} {source_time * 1000:>15.2f} {load_time * 1000:>17.3f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+
+class Diagnostic(namedtuple('Diagnostic', ['phase', 'message', 'start', 'end', 'line'])):
+    '''
+    Diagnostic is a problem reported by one of the phases of the compiler.
+
+    ...
+
+    Diagnostics are plain tuples, so they can be compared, sorted, pickled and sent across
+    processes. start and end are source offsets (None if the problem is not tied to a part of
+    the source), line is the line number of start (None if unknown).
+
+    Attributes
+    ----------
+    phase : str
+        'input' (a source that cannot be read), 'lexical', 'syntax', 'semantic' or 'runtime'.
+    message : str
+        What is wrong.
+    start, end : int
+        Source offsets of the first character and just past the last character concerned.
+    line : int
+        Line of start, numbered from 1.
+    '''
+    __slots__ = ()
+
+    def __str__(self):
+        location = ''
+        if self.line is not None:
+            location += f' Line: {self.line},'
+        if self.start is not None:
+            location += f' position: {self.start},'
+        return f'{self.phase.capitalize()} error!{location} {self.message}'
+
+
+def node_diagnostic(phase, message, node, lines = None):
+    '''
+    Returns a Diagnostic located at the span of an AST node. lines is a spans.LineIndex of the
+    source, used to fill in the line number.
+    '''
+    start = getattr(node, 'start', None)
+    end = getattr(node, 'end', None)
+    line = lines.line_of(start) if lines is not None and start is not None else None
+    return Diagnostic(phase, message, start, end, line)
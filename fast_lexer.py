@@ -0,0 +1,319 @@
+import codecs
+import re
+
+
+class Token:
+    '''
+    A lexical token produced by CoolPyFastLexer. It has the same attributes as PLY's LexToken
+    (and prints the same way), but uses a fixed slot layout. endlexpos is the offset just past
+    the last character of the token.
+    '''
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'endlexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos, endlexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.endlexpos = endlexpos
+
+    def __str__(self):
+        return 'LexToken(%s,%r,%d,%d)' % (self.type, self.value, self.lineno, self.lexpos)
+
+    def __repr__(self):
+        return str(self)
+
+
+# Actions of the master regular expression groups.
+_SKIP, _SIMPLE, _NAME, _ID, _NEWLINE, _INTEGER, _STRING, _BOOLEAN, _COMMENT, _REPORT = range(10)
+
+# Actions of the function rules of CoolPyLexer, keyed by rule name. Every string rule
+# (t_LPAREN, t_PLUS, ...) is a _SIMPLE token whose type is the rule name. The _REPORT rules
+# (lexical errors) are called with the matched text, as PLY calls them. The values of _NAME, _ID,
+# _INTEGER and _STRING tokens are interned in the symbol table of the CoolPyLexer.
+_FUNCTION_ACTIONS = {
+    't_INTEGER': _INTEGER,
+    't_STRING': _STRING,
+    't_BOOLEAN': _BOOLEAN,
+    't_SINGLE_LINE_COMMENT': _SKIP,
+    't_NOT': _SIMPLE,
+    't_TYPE': _NAME,
+    't_ID': _ID,
+    't_newline': _NEWLINE,
+    't_start_comment': _COMMENT,
+    't_ILLEGAL': _REPORT,
+}
+
+# Everything that matters inside a (* ... *) comment; all other characters are skipped in bulk
+# (counting their newlines).
+_COMMENT_MARKERS = re.compile(r'\(\*|\*\)')
+
+
+def _master_rules(module):
+    '''Returns the (name, pattern) pairs of the INITIAL state of a CoolPyLexer, in the order in
+    which PLY tries them: function rules in definition order, then string rules by decreasing
+    regular expression length (ties broken by name).
+    '''
+    functions = []
+    strings = []
+    for name, rule in vars(type(module)).items():
+        if not name.startswith('t_') or name.startswith('t_COMMENT') or name in ('t_error', 't_ignore'):
+            continue
+        if callable(rule):
+            functions.append((name, rule.__doc__))
+        else:
+            strings.append((name, rule))
+
+    strings.sort(key = lambda rule: rule[0])
+    strings.sort(key = lambda rule: len(rule[1]), reverse = True)
+    return functions + strings
+
+
+def _chunk_reader(stream, chunk_size, encoding):
+    '''Returns a function reading the next non-empty text chunk of stream ('' at the end).'''
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    def read():
+        while True:
+            chunk = stream.read(chunk_size)
+            if isinstance(chunk, str):
+                return chunk
+            text = decoder.decode(chunk, final = not chunk)
+            if text or not chunk:
+                return text
+
+    return read
+
+
+class CoolPyFastLexer:
+    '''
+    CoolPyFastLexer is a table-free alternative to the PLY lexer built by CoolPyLexer.build().
+
+    ...
+
+    It scans with a single compiled regular expression whose alternatives are the rules of the
+    given CoolPyLexer, tried in the same order as PLY tries them, dispatches on the index of the
+    matching group and resolves keywords with a precomputed dictionary. It produces tokens with
+    the same types, values, line numbers and positions as the PLY lexer and exposes the parts of
+    PLY's Lexer interface used by CoolPyLexer and yacc (input(), token(), lineno, lexpos, begin()).
+    Comment bodies are skipped in bulk instead of character by character. Lexical errors (runs of
+    illegal characters, unterminated strings and comments) are reported to the CoolPyLexer, as
+    the PLY lexer does.
+
+    Besides a string (input()), the source can be a file object or an mmap read in chunks
+    (input_stream()); tokens are then produced lazily while the stream is read.
+
+    Attributes
+    ----------
+    module : CoolPyLexer
+        The lexer specification (rules, reserved keywords and error handler).
+    lineno : int
+        The current line number.
+    lexpos : int
+        The position of the next character to scan.
+    lexdata : str
+        The source code being tokenized.
+    comment_count : int
+        Nesting depth of the current comment, minus one (as in CoolPyLexer's COMMENT state).
+    comment_start, comment_lineno : int
+        Offset and line of the start of the current (outermost) comment.
+    '''
+
+    def __init__(self, module):
+        self.module = module
+
+        rules = _master_rules(module)
+        ignore = ''.join(re.escape(character) for character in module.t_ignore)
+        patterns = [f'([{ignore}]+)']
+        self._actions = [None, (_SKIP, None)]
+        for name, pattern in rules:
+            patterns.append(f'({pattern})')
+            action = _FUNCTION_ACTIONS.get(name, _SIMPLE)
+            self._actions.append((action, getattr(module, name) if action is _REPORT else name[2:]))
+
+        self._master = re.compile('|'.join(patterns), re.VERBOSE)
+        self._keywords = dict(module.reserved)
+
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lineno = 1
+        self.lexstate = 'INITIAL'
+        self.lexstatestack = []
+        self.comment_count = 0
+        self.comment_start = 0
+        self.comment_lineno = 1
+        self._tokens = iter(())
+
+    def input(self, source_code, start = 0):
+        '''Tokenizes source_code, from offset start on (token positions stay relative to the 
+        beginning of source_code). lineno should then be set to the line of start.
+        '''
+        self.lexdata = source_code
+        self.lexpos = start
+        self._tokens = self._scan(source_code, pos = start)
+
+    def input_stream(self, stream, chunk_size = 1 << 16, encoding = 'utf-8'):
+        '''Tokenizes the Cool program read from stream, chunk by chunk, instead of a string.
+
+        Parameters
+        ----------
+        stream : file object or mmap.mmap
+            Anything with a read(size) method returning str or bytes. Bytes are decoded
+            incrementally with the given encoding; positions are counted in characters.
+        chunk_size : int, optional
+            Number of characters (or bytes) read at a time.
+        encoding : str, optional
+            Encoding of binary streams.
+        '''
+        self.lexdata = None
+        self.lexpos = 0
+        self._tokens = self._scan('', _chunk_reader(stream, chunk_size, encoding))
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def begin(self, state):
+        self.lexstate = state
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def __iter__(self):
+        return self._tokens
+
+    def _scan(self, data, read = None, pos = 0):
+        '''Yields the tokens of data, from offset pos on. If read is given, data is only the 
+        beginning of the input and read() returns the following chunks ('' at the end of the input).
+
+        While streaming, anything that may continue past the end of the buffered text (a match
+        reaching the end of the buffer, an opening quote without its closing quote, the last
+        character of a comment body) is left in the buffer until the next chunk arrives, so tokens,
+        strings and nested comments may span chunk boundaries. Only the unconsumed tail of the
+        buffer is kept, so memory is bounded by the chunk size plus twice the longest token. The
+        buffer is refilled with at least as much text as is left over, so a token spanning many
+        chunks is rescanned a logarithmic number of times, not once per chunk.
+        '''
+        match = self._master.match
+        search_marker = _COMMENT_MARKERS.search
+        actions = self._actions
+        keywords = self._keywords
+        get_keyword = keywords.get
+        error = self.module.t_error
+        report_error = self.module.report_error
+        scan_string = self.module.scan_string
+        intern = self.module.symbols.intern
+
+        base = self.lexpos - pos
+        end = len(data)
+        eof = read is None
+        lineno = self.lineno
+        depth = self.comment_count + 1 if self.lexstate == 'COMMENT' else 0
+        comment_start, comment_lineno = self.comment_start, self.comment_lineno
+
+        while True:
+            while pos < end:
+                if depth:
+                    marker = search_marker(data, pos)
+                    if marker is None or (not eof and marker.end() == end):
+                        # The last character may start a '(*' or '*)' split by the chunk boundary.
+                        skipped = end if eof else max(pos, end - 1) if marker is None else marker.start()
+                        lineno += data.count('\n', pos, skipped)
+                        pos = skipped
+                        break
+                    lineno += data.count('\n', pos, marker.start())
+                    pos = marker.end()
+                    if marker.group() == '(*':
+                        depth += 1
+                    else:
+                        depth -= 1
+                    continue
+
+                m = match(data, pos)
+                if m is None:
+                    token = Token('error', data[pos], lineno, base + pos, base + pos + 1)
+                    token.lexer = self
+                    self.lexpos = base + pos
+                    self.lineno = lineno
+                    error(token)
+                    pos = self.lexpos - base if self.lexpos > base + pos else pos + 1
+                    continue
+
+                if not eof and m.end() == end:
+                    break
+
+                action, kind = actions[m.lastindex]
+                start = pos
+                pos = m.end()
+
+                if action is _ID:
+                    value = m.group()
+                    kind = get_keyword(value)
+                    if kind is None:
+                        kind = 'ID' if value.islower() or len(value) > 8 else get_keyword(value.lower(), 'ID')
+                    if kind == 'ID':
+                        value = intern(value)
+                elif action is _SIMPLE:
+                    value = m.group()
+                elif action is _NAME:
+                    value = intern(m.group())
+                elif action is _SKIP:
+                    continue
+                elif action is _NEWLINE:
+                    lineno += pos - start
+                    continue
+                elif action is _INTEGER:
+                    value = intern(int(m.group()))
+                elif action is _STRING:
+                    value, pos, newlines, message = scan_string(data, pos)
+                    if not eof and pos == end:
+                        # The literal may go on in the next chunk.
+                        pos = start
+                        break
+                    if message is not None:
+                        report_error(message, base + start, base + pos, lineno)
+                        lineno += newlines
+                        continue
+                    self.lexpos = base + pos
+                    self.lineno = lineno + newlines
+                    yield Token(kind, intern(value), lineno, base + start, base + pos)
+                    lineno += newlines
+                    continue
+                elif action is _BOOLEAN:
+                    value = m.group() == 'true'
+                elif action is _REPORT:
+                    kind(Token(kind.__name__[2:], m.group(), lineno, base + start, base + pos))
+                    continue
+                else:
+                    depth = 1
+                    comment_start, comment_lineno = base + start, lineno
+                    continue
+
+                self.lexpos = base + pos
+                self.lineno = lineno
+                yield Token(kind, value, lineno, base + start, base + pos)
+
+            if eof:
+                break
+
+            tail = data[pos:]
+            chunks = [tail]
+            size = 0
+            while size <= len(tail):
+                chunk = read()
+                if not chunk:
+                    eof = True
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            data = ''.join(chunks)
+            base += pos
+            pos = 0
+            end = len(data)
+
+        self.lexpos = base + pos
+        self.lineno = lineno
+        self.comment_start, self.comment_lineno = comment_start, comment_lineno
+        if depth:
+            self.module.report_error('Unterminated comment at end of input.', comment_start, base + pos,
+                                     comment_lineno)
+        self.lexstate = 'INITIAL'
@@ -1,41 +1,112 @@
+import sys
+
 from ast import AST
 from ast import Self
 
-def print_readable_ast(tree, level = 0, inline = False):
+# Indentation of one level of print_readable_ast().
+_INDENTATION = '    '
 
-    def indent(source_string, level = 1, lstrip_first = False):
-        indentation = '    '
-        out = '\n'.join((level * indentation) + i for i in source_string.splitlines())
-        if lstrip_first:
-            return out.lstrip()
-        return out
 
-    def is_node(node):
-        return isinstance(node, AST) and hasattr(node, 'to_tuple')
+def _indent(text, level, inline):
+    if inline:
+        return '\n'.join((level * _INDENTATION) + line for line in text.splitlines()).lstrip()
+    return '\n'.join((level * _INDENTATION) + line for line in text.splitlines())
 
-    if is_node(tree):
-        attrs = tree.to_tuple()
         
-        if len(attrs) <= 1:
-            print(indent(f'{tree.class_name}()', level, inline))
-        else:
-            print(indent(f'{tree.class_name}(', level, inline))
-            for key, value in attrs:
+def iter_readable_ast(tree, level = 0, inline = False):
+    '''
+    Yields the text printed by print_readable_ast(), in chunks of whole lines.
+
+    The tree is walked with an explicit stack, so the depth of the tree is not limited by the
+    recursion limit, and every line is built once, at its final indentation.
+    '''
+    # Items are text to emit, or (value, level, inline) triples still to be printed.
+    stack = [(tree, level, inline)]
+    while stack:
+        item = stack.pop()
+        if item.__class__ is str:
+            yield item
+            continue
+
+        value, level, inline = item
+        prefix = '' if inline else level * _INDENTATION
+
+        if isinstance(value, AST) and hasattr(value, 'to_tuple'):
+            attributes = value.to_tuple()
+            if len(attributes) <= 1:
+                yield f'{prefix}{value.class_name}()\n'
+                continue
+            yield f'{prefix}{value.class_name}(\n'
+            stack.append(level * _INDENTATION + ')\n')
+            for key, child in reversed(attributes):
                 if key == 'class_name':
                     continue
-                print(indent(key + '=', level + 1), end='')
-                print_readable_ast(value, level + 1, True)
-            print(indent(')', level))
-
-    elif isinstance(tree, (tuple, list)):
-        braces = '()' if isinstance(tree, tuple) else '[]'
-        if len(tree) == 0:
-            print(braces)
+                stack.append((child, level + 1, True))
+                stack.append((level + 1) * _INDENTATION + key + '=')
+
+        elif isinstance(value, (tuple, list)):
+            braces = '()' if isinstance(value, tuple) else '[]'
+            if len(value) == 0:
+                # Never indented, as printed since the first version.
+                yield braces + '\n'
+                continue
+            yield prefix + braces[0] + '\n'
+            stack.append(level * _INDENTATION + braces[1] + '\n')
+            for child in reversed(value):
+                stack.append((child, level + 1, False))
+
         else:
-            print(indent(braces[0], level, inline))
-            for obj in tree:
-                print_readable_ast(obj, level + 1)
-            print(indent(braces[1], level))
+            yield _indent(repr(value), level, inline) + '\n'
 
+
+def write_readable_ast(tree, sink, buffer_size = 1 << 16):
+    '''
+    Writes the text of print_readable_ast() to sink, a text file object (or anything with a write()
+    method), in writes of about buffer_size characters.
+    '''
+    chunks = []
+    buffered = 0
+    for chunk in iter_readable_ast(tree):
+        chunks.append(chunk)
+        buffered += len(chunk)
+        if buffered >= buffer_size:
+            sink.write(''.join(chunks))
+            chunks = []
+            buffered = 0
+    if chunks:
+        sink.write(''.join(chunks))
+
+
+def readable_ast(tree):
+    '''Returns the text of print_readable_ast() as a string.'''
+    return ''.join(iter_readable_ast(tree))
+
+
+def print_readable_ast(tree, level = 0, inline = False, file = None):
+    '''
+    Prints an AST (or any value) in an indented, one field per line form, to file (defaults to
+    sys.stdout). See iter_readable_ast().
+    '''
+    if file is None:
+        file = sys.stdout
+    if level == 0 and not inline:
+        write_readable_ast(tree, file)
     else:
-        print(indent(repr(tree), level, inline))
+        file.write(''.join(iter_readable_ast(tree, level, inline)))
+
+
+def iter_nodes(tree):
+    '''
+    Yields the AST nodes of a tree in preorder (a node before its children, children in source
+    order). Action tuples and lists of nodes are walked through, but not yielded.
+    Iterative, so deeply nested trees do not hit the recursion limit.
+    '''
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, AST):
+            yield item
+            # The fields of a node, in the order of to_tuple().
+            stack.extend(getattr(item, field) for field in reversed(type(item).__slots__))
+        elif isinstance(item, (tuple, list)):
+            stack.extend(reversed(item))
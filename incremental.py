@@ -0,0 +1,177 @@
+from collections import namedtuple
+
+import ast as AST
+from fast_lexer import CoolPyFastLexer
+from helpers import iter_nodes
+from parser import CoolPyParser
+
+# An edit of a source: the characters in [start, end) are replaced by text.
+TextEdit = namedtuple('TextEdit', ['start', 'end', 'text'])
+
+# program and errors as returned by a parse of source (the edited text). reparsed is the range of
+# indices of the classes of program that were parsed anew (all of them after a full parse).
+ReparseResult = namedtuple('ReparseResult', ['program', 'source', 'errors', 'reparsed', 'full'])
+
+
+class _Resync(Exception):
+    '''Raised when the edited region cannot be parsed on its own.'''
+
+
+def apply_edit(source_code: str, edit: TextEdit) -> str:
+    '''Returns source_code with edit applied.'''
+    if not 0 <= edit.start <= edit.end <= len(source_code):
+        raise ValueError(f'Edit [{edit.start}, {edit.end}) is out of range (0-{len(source_code)}).')
+    return source_code[:edit.start] + edit.text + source_code[edit.end:]
+
+
+class IncrementalParser:
+    '''
+    IncrementalParser re-parses an edited Cool program one top-level class at a time.
+
+    ...
+
+    The source is cut into units, one per class: unit i runs from the start of class i to the start
+    of class i + 1 (the first unit also holds what precedes the first class, the last one what
+    follows the last class). Given the previous program, its source and an edit, reparse() lexes
+    and parses only the units touched by the edit, with a CoolPyFastLexer started at the first of
+    them, and splices the resulting classes between the untouched AST.Class subtrees, which are
+    reused as they are. The spans of the classes after the edit are shifted by the length change;
+    the nodes of every class are kept in a flat list for that, so that the shift is a tight loop
+    rather than a tree walk.
+
+    The region can be parsed on its own only if the edit did not move a class boundary: the token
+    following the region must start exactly where the next untouched class starts (an unclosed
+    comment or string, or a class that lost its closing brace, breaks this), and the region must
+    parse without errors. Otherwise the whole program is parsed again.
+
+    Attributes
+    ----------
+    parser : CoolPyParser
+        The parser used for both partial and full parses.
+
+    Methods
+    -------
+    parse(source_code)
+        Parses a whole program.
+    reparse(program, old_source, edit)
+        Parses a program after an edit, reusing the classes the edit did not touch.
+    '''
+
+    def __init__(self, parser = None, **parser_options):
+        '''
+        Parameters
+        ----------
+        parser : CoolPyParser, optional
+            A built parser. One is created with parser_options if omitted.
+        '''
+        self.parser = parser if parser is not None else CoolPyParser(**parser_options)
+        # id(class) -> (class, its located nodes), for shifting spans.
+        self._class_nodes = {}
+
+    def parse(self, source_code: str) -> ReparseResult:
+        program = self.parser.parse(source_code)
+        errors = list(self.parser.error_list)
+        classes = len(program.classes) if program is not None else 0
+        return ReparseResult(program, source_code, errors, range(classes), True)
+
+    def reparse(self, program, old_source: str, edit: TextEdit) -> ReparseResult:
+        '''
+        Parses old_source with edit applied.
+
+        Parameters
+        ----------
+        program : AST.Program
+            The program parsed (without errors) from old_source. Its untouched classes are moved
+            into the new program, so it must not be used afterwards.
+        old_source : str
+            The source before the edit.
+        edit : TextEdit
+            The edit.
+
+        Returns
+        -------
+        ReparseResult
+        '''
+        source_code = apply_edit(old_source, edit)
+        if program is None or not program.classes or program.start is None:
+            return self.parse(source_code)
+
+        classes = program.classes
+        delta = len(edit.text) - (edit.end - edit.start)
+
+        # Units touching the edit (an edit on a boundary belongs to both sides of it).
+        bounds = [0] + [node.start for node in classes[1:]] + [len(old_source)]
+        first = 0
+        while bounds[first + 1] < edit.start:
+            first += 1
+        last = first
+        while last + 1 < len(classes) and bounds[last + 1] <= edit.end:
+            last += 1
+
+        region_start = bounds[first]
+        region_end = bounds[last + 1] + delta
+
+        try:
+            region = self._parse_region(source_code, region_start, region_end)
+        except _Resync:
+            return self.parse(source_code)
+
+        if delta:
+            for node in classes[last + 1:]:
+                self._shift(node, delta)
+
+        new_classes = classes[:first] + region.classes + classes[last + 1:]
+        class_nodes = self._class_nodes
+        self._class_nodes = {id(node): class_nodes[id(node)] 
+                             for node in new_classes if id(node) in class_nodes}
+        new_program = AST.Program(classes = new_classes)
+        new_program.start = new_classes[0].start
+        new_program.end = region.end if last + 1 == len(classes) else program.end + delta
+
+        reparsed = range(first, first + len(region.classes))
+        return ReparseResult(new_program, source_code, [], reparsed, False)
+
+    def _shift(self, class_node, delta):
+        '''Moves the spans of all the nodes of a class by delta characters.'''
+        entry = self._class_nodes.get(id(class_node))
+        if entry is None:
+            nodes = [node for node in iter_nodes(class_node) if node.start is not None]
+            entry = self._class_nodes[id(class_node)] = (class_node, nodes)
+        for node in entry[1]:
+            node.start += delta
+            node.end += delta
+
+    def _parse_region(self, source_code, region_start, region_end):
+        '''Parses the classes of source_code[region_start:region_end] as a program.'''
+        scanner = CoolPyFastLexer(self.parser.lexer)
+        scanner.input(source_code, start = region_start)
+        scanner.lineno = source_code.count('\n', 0, region_start) + 1
+        next_token = scanner.token
+
+        def region_token():
+            token = next_token()
+            if token is None:
+                if region_end != len(source_code):
+                    raise _Resync()
+                return None
+            if token.endlexpos > region_end:
+                # The first token after the region must start exactly at the next class.
+                if token.lexpos != region_end:
+                    raise _Resync()
+                return None
+            return token
+
+        def region_error(token):
+            raise _Resync()
+
+        parser = self.parser.parser
+        error_function = parser.errorfunc
+        parser.errorfunc = region_error
+        try:
+            region = self.parser.parse(tokenfunc = region_token, lexer = scanner)
+        finally:
+            parser.errorfunc = error_function
+
+        if region is None or self.parser.error_list:
+            raise _Resync()
+        return region
@@ -0,0 +1,476 @@
+from collections import namedtuple
+
+import ast as AST
+from runtime import CoolAbort
+from runtime import CoolObject
+from runtime import CoolRuntimeError
+from runtime import Runtime
+from runtime import default_value
+from runtime import divide
+from runtime import run_with_stack
+from runtime import wrap_int
+from semant import case_branch
+from semant import analyze
+from semant import builtin_classes
+
+# A method ready to run: either a Python function of the Runtime (builtin), or a body with the
+# number of local variable slots its frames need (formal parameters first).
+RuntimeMethod = namedtuple('RuntimeMethod', ['name', 'owner', 'body', 'frame_size', 'builtin'])
+
+# The initializer of an attribute, run on every new object of the classes having the attribute.
+Initializer = namedtuple('Initializer', ['slot', 'expression', 'frame_size'])
+
+
+class RuntimeClass:
+    '''
+    The run-time description of a class: its dispatch table (vtable), the default values of its
+    attribute slots and its attribute initializers, built once per program.
+    '''
+    __slots__ = ('name', 'methods', 'defaults', 'initializers')
+
+    def __init__(self, name, methods, defaults, initializers):
+        self.name = name
+        self.methods = methods
+        self.defaults = defaults
+        self.initializers = initializers
+
+    def __repr__(self):
+        return f'RuntimeClass({self.name})'
+
+
+class CoolInterpreter(Runtime):
+    '''
+    CoolInterpreter runs type-checked Cool programs by walking their AST.
+
+    ...
+
+    Everything that does not depend on run-time values is computed once, before the program
+    starts: the vtable of every class (a dictionary from method name to RuntimeMethod, inherited
+    methods included, built from the dispatch tables of semant.ClassEnvironment), the attribute
+    layouts, and the location of every variable (a slot of the frame of the method, or a slot of
+    the attributes of self), so the evaluator never searches scopes or the inheritance chain.
+    Every DynamicDispatch site has a monomorphic inline cache holding the receiver class of its
+    last call and the method it resolved to, and every Case remembers the branch selected for
+    each dynamic class it has seen.
+
+    Method calls of the program are Python calls of the evaluator; run() executes on a thread
+    with a large stack so deeply recursive programs can run.
+
+    Attributes
+    ----------
+    program : AST.Program
+        The program.
+    environment : semant.ClassEnvironment
+        The classes of the program.
+    classes : dict
+        The RuntimeClass of every class, by name.
+
+    Methods
+    -------
+    run()
+        Runs Main.main() of the program and returns its value.
+    new(class_name)
+        Creates and initializes an object.
+    call(receiver, method, arguments)
+        Calls a method of an object.
+    evaluate(node, receiver, frame)
+        Evaluates an expression.
+    '''
+
+    def __init__(self, program, environment = None, stdin = None, stdout = None):
+        '''
+        Parameters
+        ----------
+        program : AST.Program
+            The program, free of semantic errors.
+        environment : semant.ClassEnvironment, optional
+            Its environment. The program is analyzed if omitted, and an Exception is raised if
+            it has semantic errors.
+        stdin, stdout : file, optional
+            The streams of the IO methods.
+        '''
+        super().__init__(stdin, stdout)
+        if environment is None:
+            result = analyze(program)
+            if result.diagnostics:
+                raise Exception('The program has semantic errors:\n' +
+                                '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+            environment = result.environment
+
+        self.program = program
+        self.environment = environment
+
+        # Where every Object / Assignment refers to: (True, attribute slot) or (False, frame slot).
+        self._variables = {}
+        # The frame slot of the variable of every Let and Case.
+        self._bindings = {}
+        # Inline caches of the DynamicDispatch sites ([receiver class, method]) and the branch
+        # tables of the Case expressions (dynamic class name -> branch index).
+        self._dispatch_caches = {}
+        self._case_tables = {}
+
+        self._evaluators = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                evaluator = getattr(self, '_evaluate_' + kind.__name__, None)
+                if evaluator is not None:
+                    self._evaluators[kind] = evaluator
+
+        self.classes = {}
+        self._build_classes()
+
+    def _build_classes(self):
+        environment = self.environment
+        nodes = {node.name: node for node in builtin_classes()}
+        nodes.update((node.name, node) for node in self.program.classes)
+
+        # Every method body and initializer is prepared once, where it is defined.
+        methods = {}
+        initializers = {}
+        for class_name in environment.names:
+            for feature in nodes[class_name].features:
+                if isinstance(feature, AST.Method):
+                    if feature.body is None:
+                        builtin = self.builtin(class_name, feature.name)
+                        methods[class_name, feature.name] = RuntimeMethod(feature.name, class_name,
+                                                                          None, 0, builtin)
+                    else:
+                        formals = [formal.name for formal in feature.formal_parameters]
+                        frame_size = self._prepare(class_name, feature.body, formals)
+                        methods[class_name, feature.name] = RuntimeMethod(feature.name, class_name,
+                                                                          feature.body, frame_size, None)
+                elif isinstance(feature, AST.Attribute) and feature.expression is not None:
+                    initializers[class_name, feature.name] = (
+                        feature.expression, self._prepare(class_name, feature.expression, []))
+
+        for class_name in environment.names:
+            vtable = {info.name: methods[info.owner, info.name]
+                      for info in environment.dispatch_table(class_name)}
+            layout = environment.attributes(class_name)
+            defaults = [default_value(info.type) for info in layout]
+            class_initializers = []
+            for info in layout:
+                initializer = initializers.get((info.owner, info.name))
+                if initializer is not None:
+                    class_initializers.append(Initializer(info.slot, *initializer))
+            self.classes[class_name] = RuntimeClass(class_name, vtable, defaults,
+                                                    tuple(class_initializers))
+
+    def _prepare(self, class_name, expression, formals):
+        '''
+        Resolves the variables of an expression of class class_name, whose frames start with the
+        given formal parameters, and creates its inline caches. Returns the frame size.
+        '''
+        environment = self.environment
+        variables = self._variables
+        scope = {}
+        for i, name in enumerate(formals):
+            scope.setdefault(name, []).append(i)
+        frame_size = len(formals)
+        depth = len(formals)
+
+        # ('visit', node) | ('bind', (name, slot)) | ('unbind', name) | ('release', None)
+        work = [('visit', expression)]
+        while work:
+            operation, item = work.pop()
+            if operation == 'bind':
+                name, slot = item
+                scope.setdefault(name, []).append(slot)
+                continue
+            if operation == 'unbind':
+                scope[item].pop()
+                continue
+            if operation == 'release':
+                depth -= 1
+                continue
+
+            node = item
+            kind = node.__class__
+            if kind is AST.Object or kind is AST.Assignment:
+                name = node.name if kind is AST.Object else node.instance.name
+                slots = scope.get(name)
+                if slots:
+                    variables[node] = (False, slots[-1])
+                else:
+                    variables[node] = (True, environment.lookup_attribute(class_name, name).slot)
+                if kind is AST.Assignment:
+                    work.append(('visit', node.expression))
+            elif kind is AST.Let or kind is AST.Case:
+                # A new frame slot, live until the end of the body (of every branch of a case:
+                # branches never run together, so they share the slot).
+                slot = depth
+                depth += 1
+                frame_size = max(frame_size, depth)
+                self._bindings[node] = slot
+                work.append(('release', None))
+                if kind is AST.Let:
+                    work.append(('unbind', node.instance))
+                    work.append(('visit', node.body))
+                    work.append(('bind', (node.instance, slot)))
+                    if node.expression is not None:
+                        work.append(('visit', node.expression))
+                else:
+                    for action in reversed(node.actions):
+                        name, _, body = case_branch(action)
+                        work.append(('unbind', name))
+                        work.append(('visit', body))
+                        work.append(('bind', (name, slot)))
+                    self._case_tables[node] = {}
+                    work.append(('visit', node.expression))
+            else:
+                if kind is AST.DynamicDispatch:
+                    self._dispatch_caches[node] = [None, None]
+                for field in reversed(kind.__slots__):
+                    value = getattr(node, field)
+                    if isinstance(value, AST.AST):
+                        work.append(('visit', value))
+                    elif isinstance(value, (tuple, list)):
+                        for child in reversed(value):
+                            if isinstance(child, AST.AST):
+                                work.append(('visit', child))
+        return frame_size
+
+    def run(self):
+        '''Runs (new Main).main() on a thread with a large stack and returns its value. Abort
+        stops the program and returns None; run-time errors raise CoolRuntimeError.'''
+        return run_with_stack(self._run)
+
+    def _run(self):
+        try:
+            return self.call(self.new('Main'), 'main', [])
+        except CoolAbort:
+            return None
+        finally:
+            self.stdout.flush()
+
+    def new(self, class_name):
+        cool_class = self.classes[class_name]
+        if class_name == 'Int' or class_name == 'String' or class_name == 'Bool':
+            return default_value(class_name)
+        instance = CoolObject(cool_class, list(cool_class.defaults))
+        for slot, expression, frame_size in cool_class.initializers:
+            instance.attributes[slot] = self.evaluate(expression, instance, [None] * frame_size)
+        return instance
+
+    def class_of(self, value):
+        if value.__class__ is CoolObject:
+            return value.cool_class
+        return self.classes[self.class_name_of(value)]
+
+    def call(self, receiver, method, arguments):
+        return self._invoke(self.class_of(receiver).methods[method], receiver, arguments)
+
+    def _invoke(self, method, receiver, arguments, node = None):
+        if method.builtin is not None:
+            try:
+                return method.builtin(receiver, *arguments)
+            except CoolRuntimeError as error:
+                # Builtins do not know the call site: report the error at the dispatch.
+                if error.node is None:
+                    error.node = node
+                raise
+        frame = arguments
+        if method.frame_size > len(arguments):
+            frame = arguments + [None] * (method.frame_size - len(arguments))
+        return self.evaluate(method.body, receiver, frame)
+
+    def evaluate(self, node, receiver, frame):
+        return self._evaluators[node.__class__](node, receiver, frame)
+
+    def _evaluate_Integer(self, node, receiver, frame):
+        return node.content
+
+    def _evaluate_String(self, node, receiver, frame):
+        return node.content
+
+    def _evaluate_Boolean(self, node, receiver, frame):
+        return node.content
+
+    def _evaluate_Self(self, node, receiver, frame):
+        return receiver
+
+    def _evaluate_Object(self, node, receiver, frame):
+        is_attribute, slot = self._variables[node]
+        return receiver.attributes[slot] if is_attribute else frame[slot]
+
+    def _evaluate_Assignment(self, node, receiver, frame):
+        value = self.evaluate(node.expression, receiver, frame)
+        is_attribute, slot = self._variables[node]
+        if is_attribute:
+            receiver.attributes[slot] = value
+        else:
+            frame[slot] = value
+        return value
+
+    def _evaluate_NewObject(self, node, receiver, frame):
+        if node.type == 'SELF_TYPE':
+            return self.new(self.class_of(receiver).name)
+        return self.new(node.type)
+
+    def _evaluate_IsVoid(self, node, receiver, frame):
+        return self.evaluate(node.expression, receiver, frame) is None
+
+    def _evaluate_Block(self, node, receiver, frame):
+        evaluate = self.evaluate
+        value = None
+        for expression in node.expression_list:
+            value = evaluate(expression, receiver, frame)
+        return value
+
+    def _evaluate_DynamicDispatch(self, node, receiver, frame):
+        # The arguments are evaluated before the receiver (Cool manual, section 7.4).
+        evaluate = self.evaluate
+        arguments = [evaluate(argument, receiver, frame) for argument in node.arguments]
+        instance = evaluate(node.instance, receiver, frame)
+        if instance is None:
+            raise CoolRuntimeError(f'Dispatch to void (method {node.method}).', node)
+
+        cool_class = instance.cool_class if instance.__class__ is CoolObject else self.class_of(instance)
+        cache = self._dispatch_caches[node]
+        if cache[0] is not cool_class:
+            cache[0] = cool_class
+            cache[1] = cool_class.methods[node.method]
+        method = cache[1]
+
+        if method.builtin is not None:
+            try:
+                return method.builtin(instance, *arguments)
+            except CoolRuntimeError as error:
+                if error.node is None:
+                    error.node = node
+                raise
+        if method.frame_size > len(arguments):
+            arguments += [None] * (method.frame_size - len(arguments))
+        return evaluate(method.body, instance, arguments)
+
+    def _evaluate_StaticDispatch(self, node, receiver, frame):
+        evaluate = self.evaluate
+        arguments = [evaluate(argument, receiver, frame) for argument in node.arguments]
+        instance = evaluate(node.instance, receiver, frame)
+        if instance is None:
+            raise CoolRuntimeError(f'Dispatch to void (method {node.method}).', node)
+        method = self.classes[node.dispatch_type].methods[node.method]
+        return self._invoke(method, instance, arguments, node)
+
+    def _evaluate_Let(self, node, receiver, frame):
+        if node.expression is None:
+            value = default_value(node.return_type)
+        else:
+            value = self.evaluate(node.expression, receiver, frame)
+        frame[self._bindings[node]] = value
+        return self.evaluate(node.body, receiver, frame)
+
+    def _evaluate_If(self, node, receiver, frame):
+        if self.evaluate(node.predicate, receiver, frame):
+            return self.evaluate(node.then_body, receiver, frame)
+        return self.evaluate(node.else_body, receiver, frame)
+
+    def _evaluate_WhileLoop(self, node, receiver, frame):
+        evaluate = self.evaluate
+        predicate = node.predicate
+        body = node.body
+        while evaluate(predicate, receiver, frame):
+            evaluate(body, receiver, frame)
+        return None
+
+    def _evaluate_Case(self, node, receiver, frame):
+        value = self.evaluate(node.expression, receiver, frame)
+        if value is None:
+            raise CoolRuntimeError('Match on void in case statement.', node)
+
+        class_name = value.cool_class.name if value.__class__ is CoolObject else self.class_name_of(value)
+        table = self._case_tables[node]
+        branch = table.get(class_name)
+        if branch is None:
+            # The branch of the closest ancestor of the dynamic class.
+            branch_types = {}
+            for i, action in enumerate(node.actions):
+                branch_types.setdefault(case_branch(action)[1], i)
+            for ancestor in self.environment.ancestors(class_name):
+                if ancestor in branch_types:
+                    branch = table[class_name] = branch_types[ancestor]
+                    break
+            else:
+                raise CoolRuntimeError(f'No match in case statement for class {class_name}.', node)
+
+        frame[self._bindings[node]] = value
+        return self.evaluate(case_branch(node.actions[branch])[2], receiver, frame)
+
+    def _evaluate_IntegerComplement(self, node, receiver, frame):
+        return wrap_int(-self.evaluate(node.integer_expression, receiver, frame))
+
+    def _evaluate_BooleanComplement(self, node, receiver, frame):
+        return not self.evaluate(node.boolean_expression, receiver, frame)
+
+    def _evaluate_Addition(self, node, receiver, frame):
+        return wrap_int(self.evaluate(node.first, receiver, frame) + self.evaluate(node.second, receiver, frame))
+
+    def _evaluate_Subtraction(self, node, receiver, frame):
+        return wrap_int(self.evaluate(node.first, receiver, frame) - self.evaluate(node.second, receiver, frame))
+
+    def _evaluate_Multiplication(self, node, receiver, frame):
+        return wrap_int(self.evaluate(node.first, receiver, frame) * self.evaluate(node.second, receiver, frame))
+
+    def _evaluate_Division(self, node, receiver, frame):
+        dividend = self.evaluate(node.first, receiver, frame)
+        return divide(dividend, self.evaluate(node.second, receiver, frame), node)
+
+    def _evaluate_LessThan(self, node, receiver, frame):
+        return self.evaluate(node.first, receiver, frame) < self.evaluate(node.second, receiver, frame)
+
+    def _evaluate_LessThanOrEqual(self, node, receiver, frame):
+        return self.evaluate(node.first, receiver, frame) <= self.evaluate(node.second, receiver, frame)
+
+    def _evaluate_Equal(self, node, receiver, frame):
+        first = self.evaluate(node.first, receiver, frame)
+        second = self.evaluate(node.second, receiver, frame)
+        if first.__class__ is CoolObject or first.__class__ is not second.__class__:
+            return first is second
+        return first == second
+
+
+def run_file(path, stdin = None, stdout = None):
+    '''
+    Parses, checks and runs a Cool program. Returns the exit status: 0 on success, 1 if the
+    program has errors or fails at run time (the diagnostics are printed).
+    '''
+    import sys
+
+    from parser import CoolPyParser
+    from spans import LineIndex
+
+    with open(path, 'r') as file:
+        source_code = file.read()
+
+    parser = CoolPyParser(build_parser = True)
+    program = parser.parse(source_code)
+    if program is None or parser.error_list:
+        for error in parser.error_list:
+            print(error, file = sys.stderr)
+        return 1
+
+    result = analyze(program, source_code)
+    if result.diagnostics:
+        for diagnostic in result.diagnostics:
+            print(diagnostic, file = sys.stderr)
+        return 1
+
+    interpreter = CoolInterpreter(program, result.environment, stdin = stdin, stdout = stdout)
+    try:
+        interpreter.run()
+    except CoolRuntimeError as error:
+        interpreter.stdout.flush()
+        print(error.diagnostic(LineIndex(source_code)), file = sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or not str(sys.argv[1]).endswith('.cl'):
+        print('Provide the path to the Cool program source file.')
+        print('Usage: python -m interpreter <file_name.cl>')
+        exit()
+
+    exit(run_file(sys.argv[1]))
@@ -1,5 +1,22 @@
+import re
+
 from ply import lex
 
+from diagnostics import Diagnostic
+from fast_lexer import CoolPyFastLexer
+from symbols import SymbolTable
+from tables import TableCache
+from token_buffer import TokenBuffer
+
+# The longest string constant allowed by the Cool manual (after escape processing).
+MAX_STRING_LENGTH = 1024
+
+# The characters that end a run of plain characters in a string literal.
+_STRING_SPECIAL = re.compile(r'["\\\n\0]')
+
+# The escape sequences of string literals; \c stands for c for any other character c.
+_ESCAPES = {'b': '\b', 't': '\t', 'n': '\n', 'f': '\f'}
+
 class CoolPyLexer:
     '''
     CoolPyLexer provides methods to tokenize the input Cool source code.
@@ -9,13 +26,24 @@ class CoolPyLexer:
     Attributes
     ----------
     lexer : Lexer
-        An instance of Lexer used to access all the public methods of Lexer.
+        An instance of Lexer used to access all the public methods of Lexer (a CoolPyFastLexer 
+        when the 'fast' backend is selected).
     reserved : dict
         A dictionary of the reserved keywords of the Cool programming language.
     tokens : list
         A list of syntax tokens of the Cool programming language.
     last_token : 
         The last token returned when iterated over an instance of PyCoolLexer (after tokenization).  
+    error_list : list
+        The lexical errors of the current input, as diagnostics.Diagnostic objects (at most 
+        max_errors of them).
+    error_count : int
+        The number of lexical errors of the current input, including those not kept in error_list.
+    max_errors : int
+        The maximum number of errors kept in error_list (None for no limit).
+    symbols : SymbolTable
+        The symbol table of the current input: the values of the ID, TYPE, INTEGER and STRING 
+        tokens are interned in it.
     build_lexer : bool
         A flag to determine whether the lexer should be built upon initialization or not.
     _debug : bool
@@ -28,6 +56,13 @@ class CoolPyLexer:
         Path to the lexer's debug log.
     _errorlog : str
         Path to the lexer's error log.
+    _cache_tables : bool
+        A flag to determine whether the lexer tables should be loaded from (and stored in) the 
+        persistent table cache.
+    _cache_dir : str
+        Directory of the persistent table cache.
+    _backend : str
+        The lexer backend, either 'ply' or 'fast'.
 
     Methods
     -------
@@ -36,6 +71,16 @@ class CoolPyLexer:
     input(source_code)
         A wrapper for Lexer's input(source_code: str) method. Tokenizes the Cool program 
         provided as the input.
+    reset()
+        Resets the per-input state of the lexer (errors, line number, lexer state and comment depth).
+    report_error(message, start, end, lineno)
+        Records a lexical error of the current input.
+    scan_string(data, start)
+        Scans a string literal, processing its escape sequences.
+    tokenize_stream(stream, chunk_size)
+        Lazily tokenizes a Cool program read in chunks from a file object or an mmap.
+    tokenize_all(source)
+        Tokenizes a whole Cool program into a columnar TokenBuffer.
     '''
 
     def __init__(self,
@@ -45,7 +90,11 @@ class CoolPyLexer:
                  optimize    = True,
                  outputdir   = '',
                  debuglog    = None,
-                 errorlog    = None):
+                 errorlog    = None,
+                 cache_tables = True,
+                 cache_dir   = None,
+                 backend     = 'ply',
+                 max_errors  = None):
         '''
         Paramters
         ---------
@@ -61,8 +110,23 @@ class CoolPyLexer:
             Path to the lexer's debug log. By default, the lexer logs to stderr.
         errorlog : str, optional
             Path to the lexer's error log. By default, the lexer logs to stderr.
+        cache_tables : bool, optional
+            A flag to determine whether the lexer tables should be kept in the persistent table 
+            cache (see tables.TableCache). The cache is bypassed in 'debug' mode and when 
+            'optimize' mode is off; lextab and outputdir are only used in that case.
+        cache_dir : str, optional
+            Directory of the persistent table cache. Defaults to tables.default_cache_dir().
+        backend : str, optional
+            'ply' (default) builds the lexer with lex.lex(). 'fast' uses CoolPyFastLexer, a 
+            single-regex scanner producing identical tokens without PLY's tables.
+        max_errors : int, optional
+            The maximum number of errors kept in error_list for one input (None, the default, 
+            keeps all of them). The errors past the limit are only counted in error_count.
         '''
 
+        if backend not in ('ply', 'fast'):
+            raise ValueError(f'Unknown lexer backend {backend!r}, expected \'ply\' or \'fast\'.')
+
         self.lexer = None
 
         # Dictionary of reserved keywords of the Cool programming language.
@@ -97,6 +161,10 @@ class CoolPyLexer:
         ] + list(self.reserved.values())
 
         self.last_token = None
+        self.error_list = []
+        self.error_count = 0
+        self.max_errors = max_errors
+        self.symbols = SymbolTable()
 
         self._debug     = debug
         self._lextab    = lextab
@@ -104,6 +172,9 @@ class CoolPyLexer:
         self._outputdir = outputdir
         self._debuglog  = debuglog
         self._errorlog  = errorlog
+        self._cache_tables = cache_tables
+        self._cache_dir = cache_dir
+        self._backend = backend
 
         if build_lexer is True:
             self.build(debug     = debug, 
@@ -111,7 +182,9 @@ class CoolPyLexer:
                        optimize  = optimize, 
                        outputdir = outputdir, 
                        debuglog  = debuglog,
-                       errorlog  = errorlog)
+                       errorlog  = errorlog,
+                       cache_tables = cache_tables,
+                       cache_dir = cache_dir)
     
     # Regular expression rules for simple tokens.
     t_LPAREN = r'\('
@@ -137,12 +210,20 @@ class CoolPyLexer:
     # Regular expression rules with some action code.
     def t_INTEGER(self, token):
         r'[0-9]+'
-        token.value = int(token.value)
+        token.value = self.symbols.intern(int(token.value))
         return token
 
+    # A string literal is scanned by scan_string(), from its opening quote on.
     def t_STRING(self, token):
-        r'"[^"]*"'
-        token.value = token.value[1:-1]
+        r'"'
+        lexer = token.lexer
+        value, end, newlines, error = self.scan_string(lexer.lexdata, token.lexpos + 1)
+        lexer.lexpos = end
+        lexer.lineno += newlines
+        if error is not None:
+            self.report_error(error, token.lexpos, end, token.lineno)
+            return None
+        token.value = self.symbols.intern(value)
         return token
 
     def t_BOOLEAN(self, token):
@@ -160,18 +241,33 @@ class CoolPyLexer:
 
     def t_TYPE(self, token):
         r'[A-Z][A-Za-z0-9_]*'
+        token.value = self.symbols.intern(token.value)
         return token
 
     # ID ~ Identifier
     def t_ID(self, token):
         r'[a-z][A-Za-z0-9_]*'
         token.type = self.reserved.get(token.value.lower(), 'ID')
+        if token.type == 'ID':
+            token.value = self.symbols.intern(token.value)
         return token
     
     def t_newline(self, token):
         r'\n+'
         token.lexer.lineno += len(token.value)
 
+    # A run of characters that cannot start any token is reported once, as a single error.
+    def t_ILLEGAL(self, token):
+        r'[^A-Za-z0-9 \t\n(){}:,.;@*/+\-~<="]+'
+        text = token.value
+        if len(text) == 1:
+            message = f'Illegal character: {text!r}.'
+        elif len(text) <= 16:
+            message = f'{len(text)} illegal characters: {text!r}.'
+        else:
+            message = f'{len(text)} illegal characters, starting with {text[:16]!r}.'
+        self.report_error(message, token.lexpos, token.lexpos + len(text), token.lineno)
+
     # Handling multi-line comments using states.
     @property
     def states(self):
@@ -183,6 +279,8 @@ class CoolPyLexer:
         r'\(\*'
         token.lexer.push_state('COMMENT')
         token.lexer.comment_count = 0
+        token.lexer.comment_start = token.lexpos
+        token.lexer.comment_lineno = token.lineno
 
     def t_COMMENT_startanother(self, token):
         r'\(\*'
@@ -199,15 +297,83 @@ class CoolPyLexer:
         else:
             token.lexer.comment_count -= 1
 
+    # The text of a comment is skipped in bulk, up to the next (* or *).
+    def t_COMMENT_text(self, token):
+        r'(?:[^(*]|\((?!\*)|\*(?!\)))[^(*]*(?:(?:\((?!\*)|\*(?!\)))[^(*]*)*'
+        token.lexer.lineno += token.value.count('\n')
+
+    def t_COMMENT_eof(self, token):
+        self.report_error('Unterminated comment at end of input.', 
+                          token.lexer.comment_start, token.lexpos, token.lexer.comment_lineno)
+        token.lexer.begin('INITIAL')
+
     def t_COMMENT_error(self, token):
         token.lexer.skip(1)
 
     t_COMMENT_ignore = ''
 
+    # Every character is matched by one of the rules above (t_ILLEGAL included): this is a fallback.
     def t_error(self, token):
-        print(f'Illegal character! Line: {token.lineno}, character: {token.value[0]}')
+        self.report_error(f'Illegal character: {token.value[0]!r}.', token.lexpos, token.lexpos + 1, 
+                          token.lineno)
         token.lexer.skip(1)
 
+    def scan_string(self, data, start):
+        '''Scans the string literal whose opening quote is just before offset start of data, in one 
+        pass: runs of plain characters are copied at once, and the escape sequences of the Cool 
+        manual are processed on the way: \\b, \\t, \\n and \\f, and \\c stands for c for any other 
+        character c (a backslash before a newline continues the string on the next line).
+
+        Returns (value, end, newlines, error): the value of the literal, the offset just past its 
+        closing quote (or of the unescaped newline or the end of data that cuts it short), the 
+        number of escaped newlines in it and an error message, None if the literal is valid. A 
+        literal is invalid if it is cut short, contains a null character (escaped or not) or is 
+        longer than MAX_STRING_LENGTH characters.
+        '''
+        search = _STRING_SPECIAL.search
+        pieces = []
+        newlines = 0
+        error = None
+        pos = start
+        while True:
+            match = search(data, pos)
+            if match is None:
+                return ''.join(pieces), len(data), newlines, 'Unterminated string at end of input.'
+            stop = match.start()
+            if stop > pos:
+                pieces.append(data[pos:stop])
+            character = data[stop]
+            if character == '"':
+                break
+            if character == '\n':
+                return ''.join(pieces), stop, newlines, 'Unterminated string at end of line.'
+            if character == '\0':
+                error = error or 'String contains a null character.'
+                pos = stop + 1
+                continue
+            # A backslash: the next character is escaped.
+            if stop + 1 == len(data):
+                return ''.join(pieces), len(data), newlines, 'Unterminated string at end of input.'
+            escaped = data[stop + 1]
+            if escaped == '\n':
+                newlines += 1
+            elif escaped == '\0':
+                error = error or 'String contains an escaped null character.'
+            pieces.append(_ESCAPES.get(escaped, escaped))
+            pos = stop + 2
+
+        value = pieces[0] if len(pieces) == 1 else ''.join(pieces)
+        if error is None and len(value) > MAX_STRING_LENGTH:
+            error = f'String constant longer than {MAX_STRING_LENGTH} characters.'
+        return value, stop + 1, newlines, error
+
+    def report_error(self, message, start, end, lineno):
+        '''Records a lexical error of the current input (in error_list, unless max_errors errors
+        are already kept).'''
+        self.error_count += 1
+        if self.max_errors is None or len(self.error_list) < self.max_errors:
+            self.error_list.append(Diagnostic('lexical', message, start, end, lineno))
+
     t_ignore = ''.join([' ', '\t'])
 
     def build(self, **kwargs):
@@ -225,6 +391,10 @@ class CoolPyLexer:
             Path to the lexer's debug log. By default, the lexer logs to stderr.
         errorlog : str, optional
             Path to the lexer's error log. By default, the lexer logs to stderr.
+        cache_tables : bool, optional
+            A flag to determine whether the lexer tables should be kept in the persistent table cache.
+        cache_dir : str, optional
+            Directory of the persistent table cache.
         '''
         if kwargs is None or len(kwargs) == 0:
             debug       = self._debug
@@ -233,6 +403,8 @@ class CoolPyLexer:
             outputdir   = self._outputdir 
             debuglog    = self._debuglog
             errorlog    = self._errorlog
+            cache_tables = self._cache_tables
+            cache_dir   = self._cache_dir
         else:
             debug       = kwargs.get('debug', self._debug)
             lextab      = kwargs.get('lextab', self._lextab)
@@ -240,7 +412,19 @@ class CoolPyLexer:
             outputdir   = kwargs.get('outputdir', self._outputdir)
             debuglog    = kwargs.get('debuglog', self._debuglog)
             errorlog    = kwargs.get('errorlog', self._errorlog)
-    
+            cache_tables = kwargs.get('cache_tables', self._cache_tables)
+            cache_dir   = kwargs.get('cache_dir', self._cache_dir)
+
+        if self._backend == 'fast':
+            self.lexer = CoolPyFastLexer(self)
+            return
+
+        if cache_tables and optimize and not debug:
+            self.lexer = TableCache(cache_dir).build_lexer(self, 
+                                                           debuglog = debuglog, 
+                                                           errorlog = errorlog)
+            return
+
         self.lexer = lex.lex(module     = self, 
                              lextab     = lextab, 
                              debug      = debug, 
@@ -249,6 +433,22 @@ class CoolPyLexer:
                              debuglog   = debuglog, 
                              errorlog   = errorlog)
 
+    def reset(self):
+        '''Resets the per-input state of the lexer, so that the same instance can tokenize 
+        another program: the errors, the line number, the lexer state stack and the comment 
+        nesting depth; the next input gets a new symbol table.
+        '''
+        if self.lexer is None:
+            raise Exception('Lexer was not built. Try building the lexer with the build() method.')
+        self.error_list = []
+        self.error_count = 0
+        self.symbols = SymbolTable()
+        self.lexer.lineno = 1
+        self.lexer.lexstatestack = []
+        self.lexer.begin('INITIAL')
+        self.lexer.comment_count = 0
+        self.last_token = None
+
     def input(self, source_code: str):
         '''A wrapper for Lexer's input(source_code: str) method. Tokenizes Cool program 
         provided as the input.
@@ -262,11 +462,82 @@ class CoolPyLexer:
             raise Exception('Lexer was not built. Try building the lexer with the build() method.')
         self.lexer.input(source_code)
 
+    def tokenize_stream(self, stream, chunk_size = 1 << 16, encoding = 'utf-8'):
+        '''Tokenizes the Cool program read from a file object or an mmap, chunk by chunk.
+
+        The whole program is never held in memory: tokens are yielded as the stream is read, and
+        tokens, strings and nested comments may span chunk boundaries. Streaming always uses the 
+        CoolPyFastLexer scanner (with the rules of this lexer), whatever the selected backend.
+        Lexical errors are left in error_list as the stream is read.
+
+        Parameters
+        ----------
+        stream : file object or mmap.mmap
+            The source, opened in text or binary mode.
+        chunk_size : int, optional
+            Number of characters (or bytes) read at a time.
+        encoding : str, optional
+            Encoding of binary streams.
+
+        Returns
+        -------
+        CoolPyFastLexer
+            The scanner, positioned at the start of the stream. Iterate over it (or call its 
+            token() method) to get the tokens; it can also be given to yacc as the lexer.
+        '''
+        self.error_list = []
+        self.error_count = 0
+        self.symbols = SymbolTable()
+        scanner = CoolPyFastLexer(self)
+        scanner.input_stream(stream, chunk_size = chunk_size, encoding = encoding)
+        return scanner
+
+    def tokenize_all(self, source, chunk_size = 1 << 16, encoding = 'utf-8'):
+        '''Tokenizes a whole Cool program into a TokenBuffer, which stores the kinds, offsets, 
+        line numbers and interned values of the tokens in arrays rather than as token objects.
+        Lexical errors are left in error_list.
+
+        Parameters
+        ----------
+        source : str, file object or mmap.mmap
+            The Cool program, as a string or as a stream read in chunks.
+        chunk_size : int, optional
+            Number of characters (or bytes) read at a time from a stream.
+        encoding : str, optional
+            Encoding of binary streams.
+
+        Returns
+        -------
+        TokenBuffer
+            The tokens of the program. Pass buffer.tokenfunc() to CoolPyParser.parse() to parse it.
+        '''
+        self.error_list = []
+        self.error_count = 0
+        self.symbols = SymbolTable()
+        scanner = CoolPyFastLexer(self)
+        if isinstance(source, str):
+            scanner.input(source)
+        else:
+            scanner.input_stream(source, chunk_size = chunk_size, encoding = encoding)
+
+        buffer = TokenBuffer(self.tokens)
+        append = buffer.append
+        for token in scanner:
+            append(token.type, token.value, token.lineno, token.lexpos, token.endlexpos)
+        return buffer
+
     def token(self):
+        '''Returns the next token (None at the end of the input). Every token carries an 
+        endlexpos attribute, the offset just past its last character.
+        '''
         if self.lexer is None:
             raise Exception('Lexer was not built. Try building the lexer with the build() method.')
-        self.last_token = self.lexer.token()
-        return self.last_token
+        token = self.lexer.token()
+        if token is not None and self._backend == 'ply':
+            # PLY's lexer stops right after the token it returns.
+            token.endlexpos = self.lexer.lexpos
+        self.last_token = token
+        return token
 
     def __iter__(self):
         return self
@@ -295,10 +566,9 @@ if __name__ == '__main__':
         exit()
 
     input_file = sys.argv[1]
-    with open(input_file, 'r') as file:
-        source_code = file.read()
-    
     lexer = CoolPyLexer()
-    lexer.input(source_code)
-    for token in lexer:
-        print(token)
+    with open(input_file, 'r') as file:
+        for token in lexer.tokenize_stream(file):
+            print(token)
+    for error in lexer.error_list:
+        print(error)
@@ -0,0 +1,1085 @@
+import ast as AST
+from diagnostics import node_diagnostic
+from semant import BASIC_CLASSES
+from semant import SELF_TYPE
+from semant import analyze
+from semant import case_branch
+from spans import LineIndex
+
+
+# Object layout of the Cool runtime: class tag, size in words, dispatch table, then the attributes.
+# Int and Bool objects hold their value in the first attribute, String objects a pointer to an Int
+# (the length) followed by the characters, null-terminated. Every prototype and constant object
+# is preceded by a -1 word (the garbage collector eye-catcher).
+TAG_OFFSET = 0
+SIZE_OFFSET = 4
+DISPATCH_OFFSET = 8
+ATTRIBUTES_OFFSET = 12
+WORD = 4
+
+# The basic classes and the main routine, in assembly. The methods follow the calling convention
+# of generated code: the receiver in $a0, the arguments on the stack (first pushed first), popped
+# by the callee, the result in $a0; $s0 and $fp are preserved. Objects are allocated with sbrk and
+# never freed. Run-time errors print their message and exit with status 1.
+RUNTIME = '''\
+Object.copy:
+	lw	$t1, 4($a0)
+	sll	$t3, $t1, 2
+	move	$t2, $a0
+	move	$a0, $t3
+	li	$v0, 9
+	syscall
+	move	$t3, $v0
+Object.copy_loop:
+	beqz	$t1, Object.copy_end
+	lw	$t4, 0($t2)
+	sw	$t4, 0($t3)
+	addiu	$t2, $t2, 4
+	addiu	$t3, $t3, 4
+	addiu	$t1, $t1, -1
+	b	Object.copy_loop
+Object.copy_end:
+	move	$a0, $v0
+	jr	$ra
+
+Object.abort:
+	move	$t1, $a0
+	la	$a0, _abort_message
+	li	$v0, 4
+	syscall
+	lw	$t1, 0($t1)
+	sll	$t1, $t1, 2
+	la	$t2, class_nameTab
+	addu	$t2, $t2, $t1
+	lw	$t2, 0($t2)
+	addiu	$a0, $t2, 16
+	syscall
+	la	$a0, _newline
+	syscall
+	li	$v0, 10
+	syscall
+
+Object.type_name:
+	lw	$t1, 0($a0)
+	sll	$t1, $t1, 2
+	la	$t2, class_nameTab
+	addu	$t2, $t2, $t1
+	lw	$a0, 0($t2)
+	jr	$ra
+
+IO.out_string:
+	move	$t0, $a0
+	lw	$t1, 4($sp)
+	addiu	$a0, $t1, 16
+	li	$v0, 4
+	syscall
+	move	$a0, $t0
+	addiu	$sp, $sp, 4
+	jr	$ra
+
+IO.out_int:
+	move	$t0, $a0
+	lw	$t1, 4($sp)
+	lw	$a0, 12($t1)
+	li	$v0, 1
+	syscall
+	move	$a0, $t0
+	addiu	$sp, $sp, 4
+	jr	$ra
+
+IO.in_int:
+	addiu	$sp, $sp, -8
+	sw	$ra, 8($sp)
+	li	$v0, 5
+	syscall
+	sw	$v0, 4($sp)
+	la	$a0, Int_protObj
+	jal	Object.copy
+	lw	$t1, 4($sp)
+	sw	$t1, 12($a0)
+	lw	$ra, 8($sp)
+	addiu	$sp, $sp, 8
+	jr	$ra
+
+IO.in_string:
+	addiu	$sp, $sp, -4
+	sw	$ra, 4($sp)
+	la	$a0, _input_buffer
+	li	$a1, 4096
+	li	$v0, 8
+	syscall
+	la	$a1, _input_buffer
+	move	$a2, $zero
+IO.in_string_length:
+	addu	$t1, $a1, $a2
+	lbu	$t1, 0($t1)
+	beqz	$t1, IO.in_string_copy
+	beq	$t1, 10, IO.in_string_copy
+	addiu	$a2, $a2, 1
+	b	IO.in_string_length
+IO.in_string_copy:
+	jal	_new_string
+	la	$a1, _input_buffer
+	addiu	$a2, $a0, 16
+	lw	$a3, 12($a0)
+	lw	$a3, 12($a3)
+	jal	_copy_bytes
+	lw	$ra, 4($sp)
+	addiu	$sp, $sp, 4
+	jr	$ra
+
+String.length:
+	lw	$a0, 12($a0)
+	jr	$ra
+
+String.concat:
+	addiu	$sp, $sp, -8
+	sw	$ra, 8($sp)
+	sw	$a0, 4($sp)
+	lw	$t1, 12($sp)
+	lw	$t2, 12($a0)
+	lw	$t2, 12($t2)
+	lw	$t3, 12($t1)
+	lw	$t3, 12($t3)
+	addu	$a2, $t2, $t3
+	jal	_new_string
+	lw	$t1, 4($sp)
+	addiu	$a1, $t1, 16
+	addiu	$a2, $a0, 16
+	lw	$a3, 12($t1)
+	lw	$a3, 12($a3)
+	jal	_copy_bytes
+	lw	$t1, 12($sp)
+	addiu	$a1, $t1, 16
+	lw	$a3, 12($t1)
+	lw	$a3, 12($a3)
+	jal	_copy_bytes
+	lw	$ra, 8($sp)
+	addiu	$sp, $sp, 12
+	jr	$ra
+
+String.substr:
+	addiu	$sp, $sp, -8
+	sw	$ra, 8($sp)
+	sw	$a0, 4($sp)
+	lw	$t1, 16($sp)
+	lw	$t1, 12($t1)
+	lw	$t2, 12($sp)
+	lw	$t2, 12($t2)
+	lw	$t3, 12($a0)
+	lw	$t3, 12($t3)
+	bltz	$t1, _substr_abort
+	bltz	$t2, _substr_abort
+	addu	$t4, $t1, $t2
+	bgt	$t4, $t3, _substr_abort
+	move	$a2, $t2
+	jal	_new_string
+	lw	$t1, 4($sp)
+	lw	$t2, 16($sp)
+	lw	$t2, 12($t2)
+	addiu	$a1, $t1, 16
+	addu	$a1, $a1, $t2
+	addiu	$a2, $a0, 16
+	lw	$a3, 12($sp)
+	lw	$a3, 12($a3)
+	jal	_copy_bytes
+	lw	$ra, 8($sp)
+	addiu	$sp, $sp, 16
+	jr	$ra
+
+# A new String of length $a2 (preserved), its characters zeroed.
+_new_string:
+	addiu	$sp, $sp, -8
+	sw	$ra, 8($sp)
+	sw	$a2, 4($sp)
+	la	$a0, Int_protObj
+	jal	Object.copy
+	lw	$a2, 4($sp)
+	sw	$a2, 12($a0)
+	move	$t4, $a0
+	addiu	$t1, $a2, 4
+	srl	$t1, $t1, 2
+	addiu	$t1, $t1, 4
+	sll	$a0, $t1, 2
+	li	$v0, 9
+	syscall
+	lw	$t2, _string_tag
+	sw	$t2, 0($v0)
+	sw	$t1, 4($v0)
+	la	$t2, String_dispTab
+	sw	$t2, 8($v0)
+	sw	$t4, 12($v0)
+	move	$a0, $v0
+	lw	$ra, 8($sp)
+	addiu	$sp, $sp, 8
+	jr	$ra
+
+# Copies $a3 bytes from $a1 to $a2, advancing both.
+_copy_bytes:
+	beqz	$a3, _copy_bytes_end
+	lbu	$t0, 0($a1)
+	sb	$t0, 0($a2)
+	addiu	$a1, $a1, 1
+	addiu	$a2, $a2, 1
+	addiu	$a3, $a3, -1
+	b	_copy_bytes
+_copy_bytes_end:
+	jr	$ra
+
+# Cool equality of the objects $t1 and $t2: $a0 (true) if they are equal, else $a1 (false).
+equality_test:
+	beq	$t1, $t2, equality_test_end
+	beqz	$t1, equality_test_false
+	beqz	$t2, equality_test_false
+	lw	$v0, 0($t1)
+	lw	$v1, 0($t2)
+	bne	$v0, $v1, equality_test_false
+	lw	$t3, _int_tag
+	beq	$v0, $t3, equality_test_value
+	lw	$t3, _bool_tag
+	beq	$v0, $t3, equality_test_value
+	lw	$t3, _string_tag
+	bne	$v0, $t3, equality_test_false
+	lw	$t3, 12($t1)
+	lw	$t3, 12($t3)
+	lw	$t4, 12($t2)
+	lw	$t4, 12($t4)
+	bne	$t3, $t4, equality_test_false
+	addiu	$t1, $t1, 16
+	addiu	$t2, $t2, 16
+equality_test_characters:
+	beqz	$t3, equality_test_end
+	lbu	$v0, 0($t1)
+	lbu	$v1, 0($t2)
+	bne	$v0, $v1, equality_test_false
+	addiu	$t1, $t1, 1
+	addiu	$t2, $t2, 1
+	addiu	$t3, $t3, -1
+	b	equality_test_characters
+equality_test_value:
+	lw	$t3, 12($t1)
+	lw	$t4, 12($t2)
+	beq	$t3, $t4, equality_test_end
+equality_test_false:
+	move	$a0, $a1
+equality_test_end:
+	jr	$ra
+
+# Prints the message $a0 and exits.
+_runtime_error:
+	li	$v0, 4
+	syscall
+	la	$a0, _newline
+	syscall
+	li	$a0, 1
+	li	$v0, 17
+	syscall
+
+# No branch of a case matches the object $a0: prints the message $a1, the class name and exits.
+_case_abort:
+	move	$t1, $a0
+	move	$a0, $a1
+	li	$v0, 4
+	syscall
+	lw	$t1, 0($t1)
+	sll	$t1, $t1, 2
+	la	$t2, class_nameTab
+	addu	$t2, $t2, $t1
+	lw	$t2, 0($t2)
+	addiu	$a0, $t2, 16
+	syscall
+	la	$a0, _period_newline
+	syscall
+	li	$a0, 1
+	li	$v0, 17
+	syscall
+
+# substr($t1, $t2) out of the range of a string of length $t3.
+_substr_abort:
+	la	$a0, _substr_message
+	li	$v0, 4
+	syscall
+	move	$a0, $t1
+	li	$v0, 1
+	syscall
+	la	$a0, _comma
+	li	$v0, 4
+	syscall
+	move	$a0, $t2
+	li	$v0, 1
+	syscall
+	la	$a0, _substr_length_message
+	li	$v0, 4
+	syscall
+	move	$a0, $t3
+	li	$v0, 1
+	syscall
+	la	$a0, _period_newline
+	li	$v0, 4
+	syscall
+	li	$a0, 1
+	li	$v0, 17
+	syscall
+'''
+
+RUNTIME_DATA = '''\
+_abort_message:
+	.asciiz "Abort called from class "
+_substr_message:
+	.asciiz "Runtime error! Substring out of range: substr("
+_substr_length_message:
+	.asciiz ") of a string of length "
+_comma:
+	.asciiz ", "
+_period_newline:
+	.asciiz ".\\n"
+_newline:
+	.asciiz "\\n"
+	.align 2
+_input_buffer:
+	.space 4096
+'''
+
+# Instructions that write their first operand and only read the others (the pure ones can be
+# removed when their result is overwritten before being read), and the stores.
+_WRITE_FIRST = frozenset(['la', 'li', 'lui', 'move', 'lw', 'lb', 'lbu', 'neg', 'negu', 'not', 'add',
+                          'addu', 'sub', 'subu', 'mul', 'div', 'rem', 'and', 'or', 'xor', 'nor', 'slt',
+                          'sltu', 'seq', 'addi', 'addiu', 'andi', 'ori', 'xori', 'slti', 'sll', 'srl',
+                          'sra'])
+_PURE = _WRITE_FIRST - {'div', 'rem', 'add', 'sub', 'addi'}
+_STORES = frozenset(['sw', 'sb'])
+_UNCONDITIONAL = frozenset(['b', 'j', 'jr'])
+_BRANCHES = frozenset(['beq', 'bne', 'blt', 'ble', 'bgt', 'bge', 'beqz', 'bnez', 'bltz', 'blez',
+                       'bgtz', 'bgez'])
+
+
+class MipsGenerator:
+    '''
+    MipsGenerator translates a type-checked program into MIPS assembly for SPIM.
+
+    ...
+
+    The output follows the conventions of the Cool runtime system: every class has a prototype
+    object (<Class>_protObj), an initializer (<Class>_init) and a dispatch table (<Class>_dispTab),
+    classes are tagged by their number in the ClassEnvironment (preorder, so a case branch tests
+    a range of tags), class_nameTab holds the class names and class_objTab the prototype and
+    initializer of every class, and new copies the prototype with Object.copy and runs the
+    initializer. The basic classes are implemented in assembly (RUNTIME), so the output is
+    self-contained: it runs on SPIM without trap.handler, or on the bundled simulator (spim.py).
+
+    Code is generated for a stack machine: the value of every expression is in $a0, operands are
+    pushed on the stack, self is in $s0, and let and case variables live in the frame, at offsets
+    of $fp. The generator is iterative, like the other passes.
+
+    Methods
+    -------
+    generate()
+        Returns the text segment as a list of instructions and the data segment as lines.
+    '''
+
+    def __init__(self, program, environment, types, source_code = None):
+        '''
+        Parameters
+        ----------
+        program : AST.Program
+            The program, free of semantic errors.
+        environment : semant.ClassEnvironment
+            Its classes.
+        types : dict
+            The static type of every expression (semant.SemanticResult.types).
+        source_code : str, optional
+            The source, for the line numbers of the run-time error messages.
+        '''
+        self.program = program
+        self.environment = environment
+        self.types = types
+        self.lines = LineIndex(source_code) if source_code is not None else None
+        self._handlers = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                handler = getattr(self, '_generate_' + kind.__name__, None)
+                if handler is not None:
+                    self._handlers[kind] = handler
+        self._strings = {}
+        self._integers = {}
+        self._messages = {}
+        self._label_count = 0
+
+    def generate(self):
+        '''Returns the text segment as a list of instructions (tuples (operation, operand...), and
+        ('label', name) for labels) and the data segment as lines.'''
+        environment = self.environment
+        nodes = {node.name: node for node in self.program.classes}
+        for name in environment.names:
+            self._string(name)
+        self._integer(0)
+        self._string('')
+
+        text = []
+        for class_name in environment.names:
+            text.extend(self._generate_initializer(class_name, nodes.get(class_name)))
+            if class_name in nodes:
+                for feature in nodes[class_name].features:
+                    if isinstance(feature, AST.Method):
+                        text.extend(self._generate_method(class_name, feature))
+
+        main_slot = environment.lookup_method('Main', 'main').slot
+        entry = [('label', 'main'),
+                 ('la', '$a0', 'Main_protObj'),
+                 ('jal', 'Object.copy'),
+                 ('jal', 'Main_init'),
+                 ('lw', '$t1', f'{DISPATCH_OFFSET}($a0)'),
+                 ('lw', '$t1', f'{main_slot * WORD}($t1)'),
+                 ('jalr', '$t1'),
+                 ('li', '$v0', '10'),
+                 ('syscall',)]
+        return entry + text, self._data()
+
+    def _label(self):
+        self._label_count += 1
+        return f'label{self._label_count}'
+
+    def _string(self, text):
+        label = self._strings.get(text)
+        if label is None:
+            label = self._strings[text] = f'str_const{len(self._strings)}'
+            self._integer(len(text.encode('utf-8')))
+        return label
+
+    def _integer(self, value):
+        label = self._integers.get(value)
+        if label is None:
+            label = self._integers[value] = f'int_const{len(self._integers)}'
+        return label
+
+    def _message(self, message, node):
+        '''The label of the error message of a node, formatted like the other engines do.'''
+        text = str(node_diagnostic('runtime', message, node, self.lines))
+        label = self._messages.get(text)
+        if label is None:
+            label = self._messages[text] = f'_message{len(self._messages)}'
+        return label
+
+    def _data(self):
+        environment = self.environment
+        out = ['\t.data', '\t.align 2', '\t.globl main']
+        for name in ('Int', 'Bool', 'String'):
+            out += [f'_{name.lower()}_tag:', f'\t.word {environment.class_id(name)}']
+
+        out.append('class_nameTab:')
+        out += [f'\t.word {self._string(name)}' for name in environment.names]
+        out.append('class_objTab:')
+        for name in environment.names:
+            out += [f'\t.word {name}_protObj', f'\t.word {name}_init']
+
+        for name in environment.names:
+            out.append(f'{name}_dispTab:')
+            out += [f'\t.word {info.owner}.{info.name}' for info in environment.dispatch_table(name)]
+
+        for name in environment.names:
+            if name == 'Int' or name == 'Bool':
+                attributes = ['0']
+            elif name == 'String':
+                attributes = [self._integer(0), '0']
+            else:
+                attributes = [self._default(info.type) for info in environment.attributes(name)]
+            out += ['\t.word -1', f'{name}_protObj:', f'\t.word {environment.class_id(name)}',
+                    f'\t.word {3 + len(attributes)}', f'\t.word {name}_dispTab']
+            out += [f'\t.word {attribute}' for attribute in attributes]
+
+        for value, label in [(False, 'bool_const0'), (True, 'bool_const1')]:
+            out += ['\t.word -1', f'{label}:', f'\t.word {environment.class_id("Bool")}', '\t.word 4',
+                    '\t.word Bool_dispTab', f'\t.word {int(value)}']
+        for value, label in list(self._integers.items()):
+            out += ['\t.word -1', f'{label}:', f'\t.word {environment.class_id("Int")}', '\t.word 4',
+                    '\t.word Int_dispTab', f'\t.word {value}']
+        for text, label in self._strings.items():
+            encoded = text.encode('utf-8')
+            out += ['\t.word -1', f'{label}:', f'\t.word {environment.class_id("String")}',
+                    f'\t.word {4 + (len(encoded) + 4) // 4}', '\t.word String_dispTab',
+                    f'\t.word {self._integers[len(encoded)]}']
+            out += _string_directives(encoded)
+            out.append('\t.align 2')
+        for text, label in self._messages.items():
+            out.append(f'{label}:')
+            out += _string_directives(text.encode('utf-8'))
+        out.append('\t.align 2')
+        out += RUNTIME_DATA.splitlines()
+        return out
+
+    def _default(self, type_name):
+        if type_name == 'Int':
+            return self._integer(0)
+        if type_name == 'String':
+            return self._string('')
+        if type_name == 'Bool':
+            return 'bool_const0'
+        return '0'
+
+    def _load_default(self, type_name):
+        if type_name == 'Bool':
+            return ('la', '$a0', 'bool_const0')
+        if type_name in BASIC_CLASSES:
+            return ('la', '$a0', self._default(type_name))
+        return ('move', '$a0', '$zero')
+
+    def _generate_initializer(self, class_name, class_node):
+        body = []
+        parent = self.environment.parent(class_name)
+        if parent is not None:
+            body.append(('jal', f'{parent}_init'))
+        self._start_function(class_name, [])
+        if class_node is not None:
+            for feature in class_node.features:
+                if isinstance(feature, AST.Attribute) and feature.expression is not None:
+                    body += self._generate(feature.expression)
+                    slot = self.environment.lookup_attribute(class_name, feature.name).slot
+                    body.append(('sw', '$a0', f'{ATTRIBUTES_OFFSET + WORD * slot}($s0)'))
+        body.append(('move', '$a0', '$s0'))
+        return self._function(f'{class_name}_init', body, 0)
+
+    def _generate_method(self, class_name, method):
+        formals = [formal.name for formal in method.formal_parameters]
+        self._start_function(class_name, formals)
+        body = self._generate(method.body)
+        return self._function(f'{class_name}.{method.name}', body, len(formals))
+
+    def _start_function(self, class_name, formals):
+        self._class_name = class_name
+        # Argument i of n is at 12 + 4 (n - 1 - i) from $fp, the saved $ra, $s0 and $fp below.
+        self._scope = {name: [f'{12 + WORD * (len(formals) - 1 - i)}($fp)'] for i, name in enumerate(formals)}
+        self._locals = 0
+        self._frame_size = 0
+
+    def _function(self, label, body, arguments):
+        prologue = [('label', label),
+                    ('addiu', '$sp', '$sp', '-12'),
+                    ('sw', '$fp', '12($sp)'),
+                    ('sw', '$s0', '8($sp)'),
+                    ('sw', '$ra', '4($sp)'),
+                    ('addiu', '$fp', '$sp', '4'),
+                    ('move', '$s0', '$a0')]
+        if self._frame_size:
+            prologue.append(('addiu', '$sp', '$sp', str(-WORD * self._frame_size)))
+        epilogue = [('lw', '$ra', '0($fp)'),
+                    ('lw', '$s0', '4($fp)'),
+                    ('addiu', '$sp', '$fp', str(8 + WORD * arguments)),
+                    ('lw', '$fp', '8($fp)'),
+                    ('jr', '$ra')]
+        return prologue + body + epilogue
+
+    def _generate(self, expression):
+        '''Returns the instructions computing an expression into $a0.'''
+        self._out = []
+        work = [(self._visit, (expression,))]
+        while work:
+            step, arguments = work.pop()
+            steps = step(*arguments)
+            if steps:
+                work.extend(reversed(steps))
+        return self._out
+
+    def _visit(self, node):
+        return self._handlers[node.__class__](node)
+
+    def _emit(self, *instructions):
+        self._out.extend(instructions)
+
+    def _push(self):
+        self._out += [('sw', '$a0', '0($sp)'), ('addiu', '$sp', '$sp', '-4')]
+
+    def _pop(self, register):
+        self._out += [('lw', register, '4($sp)'), ('addiu', '$sp', '$sp', '4')]
+
+    def _bind(self, name):
+        '''Gives a variable the next local slot of the frame and stores $a0 in it.'''
+        self._locals += 1
+        self._frame_size = max(self._frame_size, self._locals)
+        location = f'{-WORD * self._locals}($fp)'
+        self._scope.setdefault(name, []).append(location)
+        self._out.append(('sw', '$a0', location))
+
+    def _unbind(self, name):
+        self._scope[name].pop()
+        self._locals -= 1
+
+    def _location(self, name):
+        locations = self._scope.get(name)
+        if locations:
+            return locations[-1]
+        slot = self.environment.lookup_attribute(self._class_name, name).slot
+        return f'{ATTRIBUTES_OFFSET + WORD * slot}($s0)'
+
+    def _generate_Integer(self, node):
+        self._emit(('la', '$a0', self._integer(node.content)))
+
+    def _generate_String(self, node):
+        self._emit(('la', '$a0', self._string(node.content)))
+
+    def _generate_Boolean(self, node):
+        self._emit(('la', '$a0', 'bool_const1' if node.content else 'bool_const0'))
+
+    def _generate_Self(self, node):
+        self._emit(('move', '$a0', '$s0'))
+
+    def _generate_Object(self, node):
+        self._emit(('lw', '$a0', self._location(node.name)))
+
+    def _generate_Assignment(self, node):
+        return [(self._visit, (node.expression,)),
+                (self._emit, (('sw', '$a0', self._location(node.instance.name)),))]
+
+    def _generate_NewObject(self, node):
+        if node.type == SELF_TYPE:
+            self._emit(('la', '$t1', 'class_objTab'),
+                       ('lw', '$t2', f'{TAG_OFFSET}($s0)'),
+                       ('sll', '$t2', '$t2', '3'),
+                       ('addu', '$t1', '$t1', '$t2'),
+                       ('sw', '$t1', '0($sp)'),
+                       ('addiu', '$sp', '$sp', '-4'),
+                       ('lw', '$a0', '0($t1)'),
+                       ('jal', 'Object.copy'))
+            self._pop('$t1')
+            self._emit(('lw', '$t1', '4($t1)'), ('jalr', '$t1'))
+        else:
+            self._emit(('la', '$a0', f'{node.type}_protObj'),
+                       ('jal', 'Object.copy'),
+                       ('jal', f'{node.type}_init'))
+
+    def _generate_IsVoid(self, node):
+        return [(self._visit, (node.expression,)), (self._emit, (('move', '$t1', '$a0'),)),
+                (self._select_boolean, ('beqz', '$t1'))]
+
+    def _select_boolean(self, *branch):
+        '''$a0 <- true if the branch is taken, else false.'''
+        label = self._label()
+        self._emit(('la', '$a0', 'bool_const1'), (*branch, label), ('la', '$a0', 'bool_const0'),
+                   ('label', label))
+
+    def _generate_Block(self, node):
+        return [(self._visit, (expression,)) for expression in node.expression_list]
+
+    def _generate_dispatch(self, node, static_type):
+        # The arguments are evaluated (and pushed) before the receiver.
+        steps = []
+        for argument in node.arguments:
+            steps += [(self._visit, (argument,)), (self._push, ())]
+        steps += [(self._visit, (node.instance,)), (self._call, (node, static_type))]
+        return steps
+
+    def _call(self, node, static_type):
+        label = self._label()
+        self._emit(('bnez', '$a0', label),
+                   ('la', '$a0', self._message(f'Dispatch to void (method {node.method}).', node)),
+                   ('j', '_runtime_error'),
+                   ('label', label))
+        if static_type is not None:
+            slot = self.environment.lookup_method(static_type, node.method).slot
+            self._emit(('la', '$t1', f'{static_type}_dispTab'))
+        else:
+            class_name = self.types.get(node.instance, self._class_name)
+            if class_name == SELF_TYPE:
+                class_name = self._class_name
+            slot = self.environment.lookup_method(class_name, node.method).slot
+            self._emit(('lw', '$t1', f'{DISPATCH_OFFSET}($a0)'))
+        self._emit(('lw', '$t1', f'{slot * WORD}($t1)'), ('jalr', '$t1'))
+
+    def _generate_DynamicDispatch(self, node):
+        return self._generate_dispatch(node, None)
+
+    def _generate_StaticDispatch(self, node):
+        return self._generate_dispatch(node, node.dispatch_type)
+
+    def _generate_Let(self, node):
+        steps = [(self._visit, (node.expression,)) if node.expression is not None
+                 else (self._emit, (self._load_default(node.return_type),))]
+        return steps + [(self._bind, (node.instance,)), (self._visit, (node.body,)),
+                        (self._unbind, (node.instance,))]
+
+    def _generate_If(self, node):
+        otherwise = self._label()
+        end = self._label()
+        return [(self._visit, (node.predicate,)),
+                (self._emit, (('lw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)'), ('beqz', '$t1', otherwise))),
+                (self._visit, (node.then_body,)),
+                (self._emit, (('b', end), ('label', otherwise))),
+                (self._visit, (node.else_body,)),
+                (self._emit, (('label', end),))]
+
+    def _generate_WhileLoop(self, node):
+        start = self._label()
+        end = self._label()
+        return [(self._emit, (('label', start),)),
+                (self._visit, (node.predicate,)),
+                (self._emit, (('lw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)'), ('beqz', '$t1', end))),
+                (self._visit, (node.body,)),
+                (self._emit, (('b', start), ('label', end), ('move', '$a0', '$zero')))]
+
+    def _generate_Case(self, node):
+        environment = self.environment
+        matched = self._label()
+        end = self._label()
+        steps = [(self._visit, (node.expression,)),
+                 (self._emit, (('bnez', '$a0', matched),
+                               ('la', '$a0', self._message('Match on void in case statement.', node)),
+                               ('j', '_runtime_error'),
+                               ('label', matched),
+                               ('lw', '$t2', f'{TAG_OFFSET}($a0)')))]
+        # The most specific branches are tested first; the classes conforming to a branch type are
+        # the tags of its subtree.
+        branches = sorted((case_branch(action) for action in node.actions),
+                          key = lambda branch: -environment.depths[environment.class_id(branch[1])])
+        for name, branch_type, body in branches:
+            following = self._label()
+            first = environment.class_id(branch_type)
+            steps += [(self._emit, (('blt', '$t2', str(first), following),
+                                    ('bge', '$t2', str(environment.subtree_ends[first]), following))),
+                      (self._bind, (name,)),
+                      (self._visit, (body,)),
+                      (self._unbind, (name,)),
+                      (self._emit, (('b', end), ('label', following)))]
+        message = self._message('No match in case statement for class ', node)
+        steps.append((self._emit, (('la', '$a1', message), ('j', '_case_abort'), ('label', end))))
+        return steps
+
+    def _generate_IntegerComplement(self, node):
+        return [(self._visit, (node.integer_expression,)),
+                (self._emit, (('jal', 'Object.copy'),
+                              ('lw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)'),
+                              ('subu', '$t1', '$zero', '$t1'),
+                              ('sw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)')))]
+
+    def _generate_BooleanComplement(self, node):
+        return [(self._visit, (node.boolean_expression,)),
+                (self._emit, (('lw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)'),)),
+                (self._select_boolean, ('beqz', '$t1'))]
+
+    def _operands(self, node):
+        '''The steps leaving the first operand in $t1 and the second in $a0.'''
+        return [(self._visit, (node.first,)), (self._push, ()), (self._visit, (node.second,))]
+
+    def _arithmetic(self, node, operation):
+        return self._operands(node) + [(self._arithmetic_result, (node, operation))]
+
+    def _arithmetic_result(self, node, operation):
+        # The result is a copy of the second operand.
+        self._emit(('jal', 'Object.copy'))
+        self._pop('$t1')
+        self._emit(('lw', '$t1', f'{ATTRIBUTES_OFFSET}($t1)'), ('lw', '$t2', f'{ATTRIBUTES_OFFSET}($a0)'))
+        if operation == 'div':
+            label = self._label()
+            self._emit(('bnez', '$t2', label),
+                       ('la', '$a0', self._message('Division by zero.', node)),
+                       ('j', '_runtime_error'),
+                       ('label', label))
+        self._emit((operation, '$t1', '$t1', '$t2'), ('sw', '$t1', f'{ATTRIBUTES_OFFSET}($a0)'))
+
+    def _generate_Addition(self, node):
+        return self._arithmetic(node, 'addu')
+
+    def _generate_Subtraction(self, node):
+        return self._arithmetic(node, 'subu')
+
+    def _generate_Multiplication(self, node):
+        return self._arithmetic(node, 'mul')
+
+    def _generate_Division(self, node):
+        return self._arithmetic(node, 'div')
+
+    def _comparison(self, node, branch):
+        return self._operands(node) + [(self._compare, (branch,))]
+
+    def _compare(self, branch):
+        self._pop('$t1')
+        self._emit(('lw', '$t1', f'{ATTRIBUTES_OFFSET}($t1)'), ('lw', '$t2', f'{ATTRIBUTES_OFFSET}($a0)'))
+        self._select_boolean(branch, '$t1', '$t2')
+
+    def _generate_LessThan(self, node):
+        return self._comparison(node, 'blt')
+
+    def _generate_LessThanOrEqual(self, node):
+        return self._comparison(node, 'ble')
+
+    def _generate_Equal(self, node):
+        return self._operands(node) + [(self._equal, ())]
+
+    def _equal(self):
+        label = self._label()
+        self._pop('$t1')
+        self._emit(('move', '$t2', '$a0'),
+                   ('la', '$a0', 'bool_const1'),
+                   ('beq', '$t1', '$t2', label),
+                   ('la', '$a1', 'bool_const0'),
+                   ('jal', 'equality_test'),
+                   ('label', label))
+
+
+def _string_directives(encoded):
+    '''The directives of a null-terminated string: .ascii for printable runs, .byte otherwise.'''
+    out = []
+    run = []
+    for byte in encoded:
+        if 32 <= byte < 127 and byte not in (34, 92):
+            run.append(chr(byte))
+            continue
+        if run:
+            out.append(f'\t.ascii "{"".join(run)}"')
+            run = []
+        out.append(f'\t.byte {byte}')
+    if run:
+        out.append(f'\t.ascii "{"".join(run)}"')
+    out.append('\t.byte 0')
+    return out
+
+
+def _memory(operand):
+    '''The (offset, base register) of a memory operand, or None for a label.'''
+    if operand.endswith(')'):
+        offset, base = operand[:-1].split('(')
+        return int(offset or '0'), base
+    return None
+
+
+def _reads(instruction):
+    '''The registers an instruction of _WRITE_FIRST or _STORES reads.'''
+    operation = instruction[0]
+    operands = instruction[1:] if operation in _STORES else instruction[2:]
+    registers = set()
+    for operand in operands:
+        if operand.startswith('$'):
+            registers.add(operand)
+        else:
+            memory = _memory(operand) if operation in ('lw', 'lb', 'lbu', 'sw', 'sb') else None
+            if memory is not None:
+                registers.add(memory[1])
+    return registers
+
+
+def _is_sp_adjustment(instruction):
+    return instruction[0] == 'addiu' and instruction[1] == '$sp' and instruction[2] == '$sp'
+
+
+def _dead_stack_store(instructions, i):
+    '''
+    Whether the store to the stack at i is dead. Stack adjustments are moved down past the
+    instructions of a basic block, so within a block a slot below the stack pointer may still be
+    read (a push stored before the pop preceding it); at the end of the block the stack pointer is
+    back where the generated code has it, and the slots below it are dead.
+    '''
+    offset = _memory(instructions[i][2])[0]
+    for j in range(i + 1, len(instructions)):
+        instruction = instructions[j]
+        operation = instruction[0]
+        if _is_sp_adjustment(instruction):
+            offset -= int(instruction[3])
+            continue
+        if operation not in _WRITE_FIRST and operation not in _STORES:
+            return offset <= 0
+        for operand in instruction[1:]:
+            if operand == '$sp':
+                return False
+            memory = _memory(operand) if operation in ('lw', 'lb', 'lbu', 'sw', 'sb') else None
+            if memory is not None and memory[1] == '$sp' and memory[0] == offset:
+                return operation == 'sw'
+    return offset <= 0
+
+
+def _rewrite(instructions, i):
+    '''
+    Tries the peephole rules on the instructions starting at i. Returns the number of
+    instructions matched and their replacement, or None.
+    '''
+    first = instructions[i]
+    second = instructions[i + 1] if i + 1 < len(instructions) else None
+    operation = first[0]
+
+    # A push immediately popped: sw R 0($sp); addiu $sp $sp -4; lw S 4($sp); addiu $sp $sp 4.
+    if operation == 'sw' and first[2] == '0($sp)' and i + 3 < len(instructions) and \
+            instructions[i + 1] == ('addiu', '$sp', '$sp', '-4') and \
+            instructions[i + 2][0] == 'lw' and instructions[i + 2][2] == '4($sp)' and \
+            instructions[i + 3] == ('addiu', '$sp', '$sp', '4'):
+        target = instructions[i + 2][1]
+        return 4, [] if target == first[1] else [('move', target, first[1])]
+
+    if second is None:
+        return None
+
+    # A load of the value just stored.
+    if operation == 'sw' and second[0] == 'lw' and first[2] == second[2]:
+        return 2, [first] if second[1] == first[1] else [first, ('move', second[1], first[1])]
+
+    # Consecutive stack adjustments.
+    if _is_sp_adjustment(first) and _is_sp_adjustment(second):
+        total = int(first[3]) + int(second[3])
+        return 2, [('addiu', '$sp', '$sp', str(total))] if total else []
+
+    if operation == 'move' and first[1] == first[2]:
+        return 1, []
+
+    # Self, labels and new objects are never void: the void checks of dispatches on them go away
+    # (the stack adjustments of the arguments may stand in between).
+    j = i + 1
+    while j < len(instructions) and _is_sp_adjustment(instructions[j]):
+        j += 1
+    test = instructions[j] if j < len(instructions) else ('nop',)
+    if test[0] in ('bnez', 'beqz') and (
+            (operation == 'move' and first[2] == '$s0' and first[1] == test[1]) or
+            (operation == 'la' and first[1] == test[1]) or
+            (operation == 'jal' and test[1] == '$a0' and (first[1].endswith('_init') or
+                                                           first[1] == 'Object.copy'))):
+        kept = instructions[i:j]
+        return j + 1 - i, kept + [('b', test[2])] if test[0] == 'bnez' else kept
+
+    # A stack slot reloaded after one instruction that does not use the reloaded register.
+    third = instructions[i + 2] if i + 2 < len(instructions) else None
+    if operation == 'sw' and first[2].endswith('($sp)') and third is not None and \
+            third[0] == 'lw' and third[2] == first[2] and second[0] in _WRITE_FIRST and \
+            '$sp' not in _reads(second) and second[1] not in ('$sp', third[1]) and \
+            third[1] not in _reads(second):
+        return 3, [first, ('move', third[1], first[1]), second]
+
+    # A store to a stack slot that is overwritten, or popped, before being read.
+    if operation == 'sw' and first[2].endswith('($sp)') and _dead_stack_store(instructions, i):
+        return 1, []
+
+    # A register written and overwritten before being read.
+    if operation in _PURE and first[1] != '$sp' and second[0] in _WRITE_FIRST and \
+            second[1] == first[1] and first[1] not in _reads(second):
+        return 1, []
+
+    # Stack adjustments move down past the instructions that do not depend on them, so that the
+    # adjustments of consecutive pushes (the arguments of a dispatch) merge.
+    if _is_sp_adjustment(first) and (second[0] in _WRITE_FIRST or second[0] in _STORES) and \
+            second[1] != '$sp':
+        adjustment = int(first[3])
+        moved = []
+        for operand in second[1:]:
+            if operand == '$sp':
+                return None
+            memory = _memory(operand) if second[0] in ('lw', 'lb', 'lbu', 'sw', 'sb') else None
+            if memory is not None and memory[1] == '$sp':
+                operand = f'{memory[0] + adjustment}($sp)'
+            moved.append(operand)
+        return 2, [(second[0], *moved), first]
+
+    # A jump to the next instruction.
+    if operation in _UNCONDITIONAL or operation in _BRANCHES:
+        target = first[-1]
+        j = i + 1
+        while j < len(instructions) and instructions[j][0] == 'label':
+            if instructions[j][1] == target and operation != 'jr':
+                return 1, []
+            j += 1
+
+    # Unreachable instructions after an unconditional jump.
+    if operation in _UNCONDITIONAL and second[0] != 'label':
+        j = i + 1
+        while j < len(instructions) and instructions[j][0] != 'label':
+            j += 1
+        return j - i, [first]
+    return None
+
+
+def peephole(instructions):
+    '''
+    Returns the instructions (tuples, see MipsGenerator.generate()) with the peephole rules of
+    _rewrite() applied until none matches: pushes immediately popped become moves, loads of
+    values just stored and writes overwritten before use are removed, stack adjustments sink and
+    merge (so the pushes of the arguments of a dispatch take one adjustment), the void checks of
+    dispatches on self and new objects are dropped, and so are jumps to the next instruction and
+    unreachable code.
+    '''
+    changed = True
+    while changed:
+        changed = False
+        out = []
+        i = 0
+        while i < len(instructions):
+            rewritten = _rewrite(instructions, i)
+            if rewritten is None:
+                out.append(instructions[i])
+                i += 1
+            else:
+                matched, replacement = rewritten
+                out.extend(replacement)
+                i += matched
+                changed = True
+        instructions = out
+    return instructions
+
+
+def format_assembly(text, data):
+    out = data + ['', '\t.text']
+    for instruction in text:
+        if instruction[0] == 'label':
+            out.append(f'{instruction[1]}:')
+        else:
+            operands = ', '.join(instruction[1:])
+            out.append(f'\t{instruction[0]}\t{operands}' if operands else f'\t{instruction[0]}')
+    out.append('')
+    out.append(RUNTIME)
+    return '\n'.join(out)
+
+
+def compile_program(program, environment = None, types = None, source_code = None, optimize = True) -> str:
+    '''
+    Compiles a parsed program to MIPS assembly, with the peephole pass unless optimize is false.
+    The program is analyzed if environment or types is omitted, and an Exception is raised if it
+    has semantic errors.
+    '''
+    if environment is None or types is None:
+        result = analyze(program, source_code)
+        if result.diagnostics:
+            raise Exception('The program has semantic errors:\n' +
+                            '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+        environment, types = result.environment, result.types
+    text, data = MipsGenerator(program, environment, types, source_code).generate()
+    if optimize:
+        text = peephole(text)
+    return format_assembly(text, data)
+
+
+def compile_source(source_code: str, optimize = True) -> str:
+    '''Parses, checks and compiles a Cool program to MIPS assembly. Raises an Exception listing
+    the errors if it has syntax or semantic errors.'''
+    from parser import CoolPyParser
+
+    parser = CoolPyParser(build_parser = True)
+    program = parser.parse(source_code)
+    if program is None or parser.error_list:
+        raise Exception('The program has syntax errors:\n' + '\n'.join(map(str, parser.error_list)))
+    result = analyze(program, source_code)
+    if result.diagnostics:
+        raise Exception('The program has semantic errors:\n' +
+                        '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    return compile_program(program, result.environment, result.types, source_code, optimize)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    arguments = argparse.ArgumentParser(description = 'Compile a Cool program to MIPS assembly.')
+    arguments.add_argument('path', help = 'the .cl file')
+    arguments.add_argument('-o', '--output', help = 'the .s file (standard output by default)')
+    arguments.add_argument('--no-peephole', action = 'store_true', help = 'skip the peephole optimizer')
+    arguments.add_argument('--run', action = 'store_true', help = 'run the program on the bundled simulator')
+    options = arguments.parse_args()
+
+    try:
+        with open(options.path, 'r') as file:
+            assembly = compile_source(file.read(), optimize = not options.no_peephole)
+    except Exception as error:
+        print(error, file = sys.stderr)
+        exit(1)
+
+    if options.run:
+        from spim import run_assembly
+
+        status, _ = run_assembly(assembly)
+        exit(status)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(assembly)
+    else:
+        print(assembly)
@@ -0,0 +1,260 @@
+import ast as AST
+from runtime import divide
+from runtime import wrap_int
+
+
+# Expressions that can be dropped when their value is unused: they have no effect and cannot fail.
+_PURE = (AST.Integer, AST.String, AST.Boolean, AST.Object, AST.Self)
+
+_ARITHMETIC = {
+    AST.Addition: lambda first, second: wrap_int(first + second),
+    AST.Subtraction: lambda first, second: wrap_int(first - second),
+    AST.Multiplication: lambda first, second: wrap_int(first * second),
+}
+
+_COMPARISONS = {
+    AST.LessThan: lambda first, second: first < second,
+    AST.LessThanOrEqual: lambda first, second: first <= second,
+}
+
+_DEFAULTS = {
+    'Int': lambda: AST.Integer(content = 0),
+    'String': lambda: AST.String(content = ''),
+    'Bool': lambda: AST.Boolean(content = False),
+}
+
+# Markers of the work stack of ConstantFolder.fold().
+_EXIT = object()
+_END = object()
+
+
+class ConstantFolder:
+    '''
+    ConstantFolder simplifies the expressions of a program whose value is known before running it.
+
+    ...
+
+    It folds the arithmetic, comparisons and complements of literals (with the 32-bit semantics of
+    Cool: sums and products wrap around, divisions truncate towards zero, a division by a literal
+    zero is kept to fail at run time), simplifies identities (x + 0, x * 1, not not x, ~~x...),
+    keeps the taken branch of an if with a literal predicate, replaces the body of a while loop
+    whose predicate is false, flattens nested blocks and drops their unused pure expressions, and
+    collapses the lets whose variable is unused (with a pure initializer) or is the whole body.
+
+    The result is a new tree of the same node types; the input is not modified. A folded node has
+    the span of the expression it replaces, so run-time errors keep their locations. The pass is
+    one bottom-up walk with an explicit stack, so deep trees do not hit the recursion limit.
+
+    The pass is meant for programs free of semantic errors: folding may give an expression a more
+    specific static type (the type of the taken branch of an if), and nodes are new, so analyze
+    the result again (semant.analyze()) for the types of its expressions.
+
+    Methods
+    -------
+    fold(tree)
+        Returns the simplified copy of a tree (a Program, or any node).
+    '''
+
+    def __init__(self):
+        self._rules = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                rule = getattr(self, '_fold_' + kind.__name__, None)
+                if rule is not None:
+                    self._rules[kind] = rule
+        for kind in _ARITHMETIC:
+            self._rules[kind] = self._fold_arithmetic
+        for kind in _COMPARISONS:
+            self._rules[kind] = self._fold_comparison
+
+    def fold(self, tree):
+        # The number of references (uses and assignments) seen so far of every variable name: a
+        # let whose variable got no new reference while its body was folded does not use it.
+        self._references = {}
+        values = []
+        work = [tree]
+        while work:
+            item = work.pop()
+            if item is _EXIT:
+                node, references = work.pop(), work.pop()
+                kind = type(node)
+                fields = kind.__slots__
+                children = values[len(values) - len(fields):]
+                del values[len(values) - len(fields):]
+                copy = kind.__new__(kind)
+                copy.start = node.start
+                copy.end = node.end
+                for field, child in zip(fields, children):
+                    setattr(copy, field, child)
+                rule = self._rules.get(kind)
+                if rule is not None:
+                    if kind is AST.Let:
+                        copy = rule(copy, references)
+                    else:
+                        copy = rule(copy)
+                values.append(copy)
+            elif isinstance(item, AST.AST):
+                if type(item) is AST.Object:
+                    self._references[item.name] = self._references.get(item.name, 0) + 1
+                work.append(self._references.get(item.instance, 0) if type(item) is AST.Let else None)
+                work.append(item)
+                work.append(_EXIT)
+                work.extend(getattr(item, field) for field in reversed(type(item).__slots__))
+            elif isinstance(item, tuple) and item and item[0] is _END:
+                # The end of a tuple or list: item is (_END, type, length).
+                _, container, length = item
+                children = values[len(values) - length:]
+                del values[len(values) - length:]
+                values.append(container(children))
+            elif isinstance(item, (tuple, list)):
+                work.append((_END, type(item), len(item)))
+                work.extend(reversed(item))
+            else:
+                values.append(item)
+        return values.pop()
+
+    def _replace(self, node, replacement):
+        '''Returns the replacement of a node, with the span of the node.'''
+        replacement.start = node.start
+        replacement.end = node.end
+        return replacement
+
+    def _fold_arithmetic(self, node):
+        first, second = node.first, node.second
+        if type(first) is AST.Integer and type(second) is AST.Integer:
+            return self._replace(node, AST.Integer(content = _ARITHMETIC[type(node)](first.content,
+                                                                                      second.content)))
+        # Identities: x + 0, 0 + x, x - 0, x * 1, 1 * x, and x * 0 or 0 * x when x is pure.
+        kind = type(node)
+        if type(second) is AST.Integer and (second.content == 0 and kind is not AST.Multiplication or
+                                            second.content == 1 and kind is AST.Multiplication):
+            return first
+        if type(first) is AST.Integer and kind is not AST.Subtraction and \
+                first.content == (0 if kind is AST.Addition else 1):
+            return second
+        if kind is AST.Multiplication and (type(first) is AST.Integer and first.content == 0 and
+                                           isinstance(second, _PURE) or
+                                           type(second) is AST.Integer and second.content == 0 and
+                                           isinstance(first, _PURE)):
+            return self._replace(node, AST.Integer(content = 0))
+        return node
+
+    def _fold_Division(self, node):
+        first, second = node.first, node.second
+        if type(second) is AST.Integer and second.content != 0:
+            if type(first) is AST.Integer:
+                return self._replace(node, AST.Integer(content = divide(first.content, second.content)))
+            if second.content == 1:
+                return first
+        return node
+
+    def _fold_comparison(self, node):
+        first, second = node.first, node.second
+        if type(first) is AST.Integer and type(second) is AST.Integer:
+            return self._replace(node, AST.Boolean(content = _COMPARISONS[type(node)](first.content,
+                                                                                       second.content)))
+        return node
+
+    def _fold_Equal(self, node):
+        first, second = node.first, node.second
+        if type(first) is type(second) and type(first) in (AST.Integer, AST.String, AST.Boolean):
+            return self._replace(node, AST.Boolean(content = first.content == second.content))
+        return node
+
+    def _fold_IntegerComplement(self, node):
+        operand = node.integer_expression
+        if type(operand) is AST.Integer:
+            return self._replace(node, AST.Integer(content = wrap_int(-operand.content)))
+        if type(operand) is AST.IntegerComplement:
+            return operand.integer_expression
+        return node
+
+    def _fold_BooleanComplement(self, node):
+        operand = node.boolean_expression
+        if type(operand) is AST.Boolean:
+            return self._replace(node, AST.Boolean(content = not operand.content))
+        if type(operand) is AST.BooleanComplement:
+            return operand.boolean_expression
+        return node
+
+    def _fold_If(self, node):
+        predicate = node.predicate
+        if type(predicate) is AST.Boolean:
+            return node.then_body if predicate.content else node.else_body
+        if type(predicate) is AST.BooleanComplement:
+            # if not p then a else b fi = if p then b else a fi.
+            node.predicate = predicate.boolean_expression
+            node.then_body, node.else_body = node.else_body, node.then_body
+        return node
+
+    def _fold_WhileLoop(self, node):
+        if type(node.predicate) is AST.Boolean and not node.predicate.content and \
+                type(node.body) is not AST.Integer:
+            # The body never runs: it only has to remain a valid expression.
+            node.body = AST.Integer(content = 0)
+            node.body.start, node.body.end = node.predicate.start, node.predicate.end
+        return node
+
+    def _fold_Block(self, node):
+        expressions = []
+        for expression in node.expression_list:
+            if type(expression) is AST.Block:
+                expressions.extend(expression.expression_list)
+            else:
+                expressions.append(expression)
+        # The values of all but the last expression are unused.
+        kept = [expression for expression in expressions[:-1] if not _is_dead(expression)]
+        kept.append(expressions[-1])
+        if len(kept) == 1:
+            return kept[0]
+        node.expression_list = tuple(kept)
+        return node
+
+    def _fold_Let(self, node, references):
+        body = node.body
+        # let x : T <- e in x is e (or the default value of T).
+        if type(body) is AST.Object and body.name == node.instance:
+            if node.expression is not None:
+                return node.expression
+            if node.return_type in _DEFAULTS:
+                return self._replace(node, _DEFAULTS[node.return_type]())
+        # A variable never referenced in the body, with an initializer without effects.
+        if self._references.get(node.instance, 0) == references and \
+                (node.expression is None or isinstance(node.expression, _PURE)):
+            return body
+        return node
+
+
+def _is_dead(expression):
+    '''Whether an expression whose value is unused can be removed.'''
+    return isinstance(expression, _PURE) or type(expression) is AST.WhileLoop and \
+        type(expression.predicate) is AST.Boolean and not expression.predicate.content
+
+
+def fold_constants(tree):
+    '''Returns the copy of a tree simplified by a ConstantFolder (see ConstantFolder).'''
+    return ConstantFolder().fold(tree)
+
+
+def count_nodes(tree):
+    '''Returns the number of AST nodes of a tree.'''
+    from helpers import iter_nodes
+
+    return sum(1 for _ in iter_nodes(tree))
+
+
+if __name__ == '__main__':
+    import sys
+
+    from helpers import print_readable_ast
+    from parser import CoolPyParser
+
+    if len(sys.argv) < 2 or not sys.argv[1].endswith('.cl'):
+        print('Usage: python optimizer.py <file_name.cl>')
+        exit()
+
+    with open(sys.argv[1], 'r') as file:
+        program = CoolPyParser(build_parser = True).parse(file.read())
+    optimized = fold_constants(program)
+    print_readable_ast(optimized)
+    print(f'{count_nodes(program)} nodes, {count_nodes(optimized)} after folding.', file = sys.stderr)
@@ -1,7 +1,9 @@
 from ply import yacc
 
 import ast as AST
+from diagnostics import Diagnostic
 from lexer import CoolPyLexer
+from tables import TableCache
 
 class CoolPyParser:
     '''
@@ -17,6 +19,11 @@ class CoolPyParser:
         An instance of Lexer used to access all the public methods of Lexer.
     tokens : list
         A list of syntax tokens of the Cool programming language.  
+    error_list : list
+        The lexical and syntax errors of the last parse, as diagnostics.Diagnostic objects.
+    symbols : SymbolTable
+        The symbol table of the last parse (the table of the lexer), in which the names and 
+        literals of its AST are interned.
     build_parser : bool
         A flag to determine whether the parser should be built upon initialization or not.
     _debug : bool
@@ -29,6 +36,13 @@ class CoolPyParser:
         Path to the parser's debug log.
     _errorlog : str
         Path to the parser's error log.
+    _cache_tables : bool
+        A flag to determine whether the parser tables should be loaded from (and stored in) the 
+        persistent table cache.
+    _cache_dir : str
+        Directory of the persistent table cache.
+    _lexer_backend : str
+        The backend of the CoolPyLexer, either 'ply' or 'fast'.
 
     Methods
     -------
@@ -36,6 +50,10 @@ class CoolPyParser:
         Builds the CoolPyParser instance with yacc.yacc().
     parse(source_code) 
         Parses the Cool program provided as the input.
+    parse_stream(stream, chunk_size)
+        Parses the Cool program read in chunks from a file object or an mmap.
+    reset()
+        Resets the per-parse state of the parser and its lexer.
     '''
 
     def __init__(self,
@@ -46,7 +64,10 @@ class CoolPyParser:
                  outputdir      = '',
                  yacctab        = 'pycoolc.yacctab',
                  debuglog       = None,
-                 errorlog       = None):
+                 errorlog       = None,
+                 cache_tables   = True,
+                 cache_dir      = None,
+                 lexer_backend  = 'ply'):
         '''
         PARAMETERS
         ----------
@@ -62,12 +83,22 @@ class CoolPyParser:
             Path to the parser's debug log.
         _errorlog : str
             Path to the parser's error log.
+        cache_tables : bool
+            A flag to determine whether the lexer and parser tables should be kept in the persistent 
+            table cache (see tables.TableCache). The cache is bypassed in 'debug' mode and when 
+            'optimize' mode is off; yacctab, outputdir and write_tables are only used in that case.
+        cache_dir : str
+            Directory of the persistent table cache. Defaults to tables.default_cache_dir().
+        lexer_backend : str
+            The backend of the CoolPyLexer, 'ply' (default) or 'fast'.
         '''
 
         self.tokens     = None
         self.lexer      = None
         self.parser     = None
         self.error_list = []
+        # The classes reduced during the current parse, for the partial program of a broken input.
+        self._classes   = []
 
         self._debug         = debug
         self._write_tables  = write_tables
@@ -76,6 +107,9 @@ class CoolPyParser:
         self._yacctab       = yacctab
         self._debuglog      = debuglog
         self._errorlog      = errorlog
+        self._cache_tables  = cache_tables
+        self._cache_dir     = cache_dir
+        self._lexer_backend = lexer_backend
 
         if build_parser is True:
             self.build(debug        = debug, 
@@ -84,7 +118,9 @@ class CoolPyParser:
                        outputdir    = outputdir,
                        yacctab      = yacctab, 
                        debuglog     = debuglog, 
-                       errorlog     = errorlog)
+                       errorlog     = errorlog,
+                       cache_tables = cache_tables,
+                       cache_dir    = cache_dir)
 
     # Define precedence and associativity of different operators in the Cool programming language.
     precedence = (
@@ -106,7 +142,7 @@ class CoolPyParser:
         '''
         program : class_list
         '''
-        parse[0] = AST.Program(classes = parse[1])
+        parse[0] = self._located(parse, AST.Program(classes = tuple(parse[1])))
 
 
     # A single Cool program can consist of one or more classes, with each 
@@ -114,15 +150,31 @@ class CoolPyParser:
     # Hence, the production rules:
     #   class_list -> class_list class ;
     #   class_list -> class ;
+    #
+    # Note: all the list productions below (class_list, features_list, formal_parameters_list, 
+    # block_list, arguments_list and actions_list) append to a Python list while parsing, which keeps 
+    # each reduction O(1). The list is frozen into a tuple once, by the rule that consumes it.
     def p_class_list(self, parse):
         '''
         class_list : class_list class SEMICOLON
                    | class SEMICOLON
         '''
         if len(parse) == 3:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]]
         else:
-            parse[0] = parse[1] + (parse[2],)
+            parse[1].append(parse[2])
+            parse[0] = parse[1]
+
+    # Error recovery: a syntax error outside of any class (e.g. in a class header) skips the input 
+    # up to the next semicolon, and the parse goes on with the next class.
+    #   class_list -> class_list error ;
+    #   class_list -> error ;
+    def p_class_list_error(self, parse):
+        '''
+        class_list : class_list error SEMICOLON
+                   | error SEMICOLON
+        '''
+        parse[0] = [] if len(parse) == 3 else parse[1]
 
 
     # A class definition in Cool is of the form - 
@@ -143,13 +195,35 @@ class CoolPyParser:
         '''
         class : CLASS TYPE LBRACE features_list_optional RBRACE
         '''
-        parse[0] = AST.Class(name = parse[2], parent = 'Object', features = parse[4])
+        parse[0] = self._located(parse, AST.Class(name = parse[2], parent = self.symbols.intern('Object'), features = parse[4]))
+        self._classes.append(parse[0])
 
     def p_class_inherits(self, parse):
         '''
         class : CLASS TYPE INHERITS TYPE LBRACE features_list_optional RBRACE
         '''
-        parse[0] = AST.Class(name = parse[2], parent = parse[4], features = parse[6])
+        parse[0] = self._located(parse, AST.Class(name = parse[2], parent = parse[4], features = parse[6]))
+        self._classes.append(parse[0])
+
+    # Error recovery: a syntax error in the body of a class that is not followed by a semicolon 
+    # skips the input up to the closing brace. The class keeps the features parsed before the error.
+    def p_class_error(self, parse):
+        '''
+        class : CLASS TYPE LBRACE features_list error RBRACE
+              | CLASS TYPE LBRACE error RBRACE
+        '''
+        features = tuple(parse[4]) if len(parse) == 7 else tuple()
+        parse[0] = self._located(parse, AST.Class(name = parse[2], parent = self.symbols.intern('Object'), features = features))
+        self._classes.append(parse[0])
+
+    def p_class_inherits_error(self, parse):
+        '''
+        class : CLASS TYPE INHERITS TYPE LBRACE features_list error RBRACE
+              | CLASS TYPE INHERITS TYPE LBRACE error RBRACE
+        '''
+        features = tuple(parse[6]) if len(parse) == 9 else tuple()
+        parse[0] = self._located(parse, AST.Class(name = parse[2], parent = parse[4], features = features))
+        self._classes.append(parse[0])
 
 
     # The body of a class definition consists of a list of feature definitions. 
@@ -159,7 +233,7 @@ class CoolPyParser:
         features_list_optional : features_list
                                | empty
         '''
-        parse[0] = tuple() if parse.slice[1].type == 'empty' else parse[1]
+        parse[0] = tuple() if parse.slice[1].type == 'empty' else tuple(parse[1])
 
 
     # Each feature is separated by a semicolon (;).
@@ -171,10 +245,24 @@ class CoolPyParser:
         features_list : features_list feature SEMICOLON
                       | feature SEMICOLON
         '''
+        # A method whose body had a syntax error is None, and is left out.
         if len(parse) == 3:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]] if parse[1] is not None else []
         else:
-            parse[0] = parse[1] + (parse[2],)
+            if parse[2] is not None:
+                parse[1].append(parse[2])
+            parse[0] = parse[1]
+
+    # Error recovery: a syntax error in a feature skips the input up to the next semicolon, and 
+    # the parse goes on with the next feature.
+    #   features_list -> features_list error ;
+    #   features_list -> error ;
+    def p_features_list_error(self, parse):
+        '''
+        features_list : features_list error SEMICOLON
+                      | error SEMICOLON
+        '''
+        parse[0] = [] if len(parse) == 3 else parse[1]
 
 
     # A feature in Cool can be either a class method or an attribute.
@@ -198,7 +286,7 @@ class CoolPyParser:
         '''
         feature : ID LPAREN formal_parameters_list RPAREN COLON TYPE LBRACE expression RBRACE
         '''
-        parse[0] = AST.Method(name = parse[1], formal_parameters = parse[3], return_type = parse[6], body = parse[8])
+        parse[0] = self._located(parse, AST.Method(name = parse[1], formal_parameters = tuple(parse[3]), return_type = parse[6], body = parse[8]))
 
     
     # A method defination with no parameters is also valid!
@@ -206,7 +294,17 @@ class CoolPyParser:
         '''
         feature : ID LPAREN RPAREN COLON TYPE LBRACE expression RBRACE
         '''
-        parse[0] = AST.Method(name = parse[1], formal_parameters = tuple(), return_type = parse[5], body = parse[7])
+        parse[0] = self._located(parse, AST.Method(name = parse[1], formal_parameters = tuple(), return_type = parse[5], body = parse[7]))
+
+
+    # Error recovery: a syntax error in the body of a method (outside of a block) skips the input up 
+    # to the closing brace of the body. The method is left out of its class.
+    def p_feature_method_error(self, parse):
+        '''
+        feature : ID LPAREN formal_parameters_list RPAREN COLON TYPE LBRACE error RBRACE
+                | ID LPAREN RPAREN COLON TYPE LBRACE error RBRACE
+        '''
+        parse[0] = None
 
 
     # A feature in Cool can be either a class method or an attribute.
@@ -224,7 +322,7 @@ class CoolPyParser:
         '''
         feature : ID COLON TYPE ASSIGN expression
         '''
-        parse[0] = AST.Attribute(name = parse[1], attribute_type = parse[3], expression = parse[5])
+        parse[0] = self._located(parse, AST.Attribute(name = parse[1], attribute_type = parse[3], expression = parse[5]))
 
 
     # Since, the initialization part of an attribute declaration is optional, the following production
@@ -237,7 +335,7 @@ class CoolPyParser:
         '''
         feature : ID COLON TYPE
         '''
-        parse[0] = AST.Attribute(name = parse[1], attribute_type = parse[3], expression = None)
+        parse[0] = self._located(parse, AST.Attribute(name = parse[1], attribute_type = parse[3], expression = None))
 
 
     # A formal parameters list (method arguments) consists of comma-separated paramter.
@@ -250,9 +348,10 @@ class CoolPyParser:
                                 | formal_parameter
         '''
         if len(parse) == 2:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]]
         else:
-            parse[0] = parse[1] + (parse[3],)
+            parse[1].append(parse[3])
+            parse[0] = parse[1]
 
 
     # A formal paramter is of the form:
@@ -266,7 +365,7 @@ class CoolPyParser:
         '''
         formal_parameter : ID COLON TYPE
         '''
-        parse[0] = AST.FormalParameter(name = parse[1], parameter_type = parse[3])
+        parse[0] = self._located(parse, AST.FormalParameter(name = parse[1], parameter_type = parse[3]))
 
 
     # An expression in Cool can consist of just an identifier.
@@ -276,7 +375,7 @@ class CoolPyParser:
         '''
         expression : ID
         '''
-        parse[0] = AST.Object(name = parse[1])
+        parse[0] = self._located(parse, AST.Object(name = parse[1]))
 
 
     # An expression in Cool can consist of just an integer.
@@ -286,7 +385,7 @@ class CoolPyParser:
         '''
         expression : INTEGER
         '''
-        parse[0] = AST.Integer(content = parse[1])
+        parse[0] = self._located(parse, AST.Integer(content = parse[1]))
 
 
     # An expression in Cool can consist of just an boolean.
@@ -296,7 +395,7 @@ class CoolPyParser:
         '''
         expression : BOOLEAN
         '''
-        parse[0] = AST.Boolean(content = parse[1])
+        parse[0] = self._located(parse, AST.Boolean(content = parse[1]))
 
 
     # An expression in Cool can consist of just an string.
@@ -306,7 +405,7 @@ class CoolPyParser:
         '''
         expression : STRING
         '''
-        parse[0] = AST.String(content = parse[1])
+        parse[0] = self._located(parse, AST.String(content = parse[1]))
 
 
     # An expression in Cool can consist of just SELF_TYPE.
@@ -316,7 +415,7 @@ class CoolPyParser:
         '''
         expression  : SELF
         '''
-        parse[0] = AST.Self(name = 'SELF')
+        parse[0] = self._located(parse, AST.Self(name = self.symbols.intern('SELF')))
 
 
     # An expression in Cool can consist of a code block. A code block in Cool is a set of 
@@ -327,7 +426,18 @@ class CoolPyParser:
         '''
         expression : LBRACE block_list RBRACE
         '''
-        parse[0] = AST.Block(expression_list = parse[2])
+        parse[0] = self._located(parse, AST.Block(expression_list = tuple(parse[2])))
+
+    # Error recovery: a syntax error in the last expression of a block skips the input up to the 
+    # closing brace. The block keeps the expressions parsed before the error (it is empty if there 
+    # are none).
+    def p_expression_block_error(self, parse):
+        '''
+        expression : LBRACE block_list error RBRACE
+                   | LBRACE error RBRACE
+        '''
+        expressions = tuple(parse[2]) if len(parse) == 5 else tuple()
+        parse[0] = self._located(parse, AST.Block(expression_list = expressions))
 
 
     # A code block can consists of several code blocks.
@@ -343,9 +453,21 @@ class CoolPyParser:
                    | expression SEMICOLON
         '''
         if len(parse) == 3:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]]
         else:
-            parse[0] = parse[1] + (parse[2],)
+            parse[1].append(parse[2])
+            parse[0] = parse[1]
+
+    # Error recovery: a syntax error in an expression of a block skips the input up to the next 
+    # semicolon, and the parse goes on with the next expression.
+    #   block_list -> block_list error ;
+    #   block_list -> error ;
+    def p_block_list_error(self, parse):
+        '''
+        block_list : block_list error SEMICOLON
+                   | error SEMICOLON
+        '''
+        parse[0] = [] if len(parse) == 3 else parse[1]
 
     
     # An expression can also be assignment expression.
@@ -353,7 +475,8 @@ class CoolPyParser:
         '''
         expression : ID ASSIGN expression
         '''
-        parse[0] = AST.Assignment(AST.Object(name = parse[1]), expression = parse[3])
+        instance = self._located_token(parse, 1, AST.Object(name = parse[1]))
+        parse[0] = self._located(parse, AST.Assignment(instance, expression = parse[3]))
 
 
     # An expression can also be method call on an object.
@@ -365,7 +488,7 @@ class CoolPyParser:
         '''
         expression : expression DOT ID LPAREN arguments_list_optional RPAREN
         '''
-        parse[0] = AST.DynamicDispatch(instance = parse[1], method = parse[3], arguments = parse[5])
+        parse[0] = self._located(parse, AST.DynamicDispatch(instance = parse[1], method = parse[3], arguments = parse[5]))
 
     
     # The argument list can also be empty in a method call!
@@ -374,7 +497,7 @@ class CoolPyParser:
         arguments_list_optional : arguments_list
                                 | empty
         '''
-        parse[0] = tuple() if parse.slice[1].type == 'empty' else parse[1]
+        parse[0] = tuple() if parse.slice[1].type == 'empty' else tuple(parse[1])
 
     # The argument list can consist of multiple comma-separated expressions.
     # Hence, the production rules:
@@ -386,15 +509,16 @@ class CoolPyParser:
                        | expression
         '''
         if len(parse) == 2:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]]
         else:
-            parse[0] = parse[1] + (parse[3],)
+            parse[1].append(parse[3])
+            parse[0] = parse[1]
 
     def p_expression_static_dispatch(self, parse):
         '''
         expression : expression AT TYPE DOT ID LPAREN arguments_list_optional RPAREN
         '''
-        parse[0] = AST.StaticDispatch(instance = parse[1], dispatch_type = parse[3], method = parse[5], arguments = parse[7])
+        parse[0] = self._located(parse, AST.StaticDispatch(instance = parse[1], dispatch_type = parse[3], method = parse[5], arguments = parse[7]))
 
 
     # A class method can also be invoked without the use of any object.
@@ -403,7 +527,7 @@ class CoolPyParser:
         '''
         expression : ID LPAREN arguments_list_optional RPAREN
         '''
-        parse[0] = AST.DynamicDispatch(instance = AST.Self('SELF'), method = parse[1], arguments = parse[3])
+        parse[0] = self._located(parse, AST.DynamicDispatch(instance = self._located_token(parse, 1, AST.Self(self.symbols.intern('SELF')), width = 0), method = parse[1], arguments = parse[3]))
 
 
     # An expression may consists of arithmetic expressions.
@@ -415,13 +539,13 @@ class CoolPyParser:
                    | expression DIVIDE expression
         '''
         if parse[2] == '+':
-            parse[0] = AST.Addition(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.Addition(first = parse[1], second = parse[3]))
         elif parse[2] == '-':
-            parse[0] = AST.Subtraction(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.Subtraction(first = parse[1], second = parse[3]))
         elif parse[2] == '*':
-            parse[0] = AST.Multiplication(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.Multiplication(first = parse[1], second = parse[3]))
         elif parse[2] == '/':
-            parse[0] = AST.Division(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.Division(first = parse[1], second = parse[3]))
 
 
     # An expression may consists of comparision expression.
@@ -432,11 +556,11 @@ class CoolPyParser:
                    | expression EQ expression
         '''
         if parse[2] == '<':
-            parse[0] = AST.LessThan(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.LessThan(first = parse[1], second = parse[3]))
         elif parse[2] == '<=':
-            parse[0] = AST.LessThanOrEqual(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.LessThanOrEqual(first = parse[1], second = parse[3]))
         elif parse[2] == '=':
-            parse[0] = AST.Equal(first = parse[1], second = parse[3])
+            parse[0] = self._located(parse, AST.Equal(first = parse[1], second = parse[3]))
 
     
     # An expression may be enclosed within paranthesis (in order to define precedence).
@@ -477,7 +601,7 @@ class CoolPyParser:
         '''
         expression : IF expression THEN expression ELSE expression FI
         '''
-        parse[0] = AST.If(predicate = parse[2], then_body = parse[4], else_body = parse[6])
+        parse[0] = self._located(parse, AST.If(predicate = parse[2], then_body = parse[4], else_body = parse[6]))
 
 
     # A while loop in Cool has the following construct - 
@@ -496,7 +620,7 @@ class CoolPyParser:
         '''
         expression : WHILE expression LOOP expression POOL
         '''
-        parse[0] = AST.WhileLoop(predicate = parse[2], body = parse[4])
+        parse[0] = self._located(parse, AST.WhileLoop(predicate = parse[2], body = parse[4]))
 
     
     # An expression can also be a let expression in Cool.
@@ -531,28 +655,28 @@ class CoolPyParser:
         let_expression : LET ID COLON TYPE IN expression
                        | nested_lets COMMA LET ID COLON TYPE
         '''
-        parse[0] = AST.Let(instance = parse[2], return_type = parse[4], expression = None, body = parse[6])
+        parse[0] = self._located(parse, AST.Let(instance = parse[2], return_type = parse[4], expression = None, body = parse[6]))
 
     def p_expression_let_initialized(self, parse):
         '''
         let_expression : LET ID COLON TYPE ASSIGN expression IN expression
                        | nested_lets COMMA LET ID COLON TYPE ASSIGN expression
         '''
-        parse[0] = AST.Let(instance = parse[2], return_type = parse[4], expression = parse[6], body = parse[8])
+        parse[0] = self._located(parse, AST.Let(instance = parse[2], return_type = parse[4], expression = parse[6], body = parse[8]))
 
     def p_inner_lets_simple(self, parse):
         '''
         nested_lets : ID COLON TYPE IN expression
                     | nested_lets COMMA ID COLON TYPE
         '''
-        parse[0] = AST.Let(instance = parse[1], return_type = parse[3], expression = None, body = parse[5])
+        parse[0] = self._located(parse, AST.Let(instance = parse[1], return_type = parse[3], expression = None, body = parse[5]))
 
     def p_inner_lets_initialized(self, parse):
         '''
         nested_lets : ID COLON TYPE ASSIGN expression IN expression
                     | nested_lets COMMA ID COLON TYPE ASSIGN expression
         '''
-        parse[0] = AST.Let(instance = parse[1], return_type = parse[3], expression = parse[5], body = parse[7])
+        parse[0] = self._located(parse, AST.Let(instance = parse[1], return_type = parse[3], expression = parse[5], body = parse[7]))
 
     
     # A case expression has the form -
@@ -575,7 +699,7 @@ class CoolPyParser:
         '''
         expression : CASE expression OF actions_list ESAC
         '''
-        parse[0] = AST.Case(expression = parse[2], actions = parse[4])
+        parse[0] = self._located(parse, AST.Case(expression = parse[2], actions = tuple(parse[4])))
 
     
     # A case expression can consist of multiple actions (or cases). 
@@ -588,9 +712,10 @@ class CoolPyParser:
                      | action
         '''
         if len(parse) == 2:
-            parse[0] = (parse[1],)
+            parse[0] = [parse[1]]
         else:
-            parse[0] = parse[1] + (parse[2],)
+            parse[1].append(parse[2])
+            parse[0] = parse[1]
 
 
     # An action expression of a Cool case expression is of the form (as can be seen in the example above) -
@@ -614,7 +739,7 @@ class CoolPyParser:
         '''
         expression : NEW TYPE
         '''
-        parse[0] = AST.NewObject(parse[2])
+        parse[0] = self._located(parse, AST.NewObject(parse[2]))
 
 
     # The expression
@@ -625,7 +750,7 @@ class CoolPyParser:
         '''
         expression : ISVOID expression
         '''
-        parse[0] = AST.IsVoid(parse[2])
+        parse[0] = self._located(parse, AST.IsVoid(parse[2]))
 
     
     # A complement of an Int in Cool can be evaluated using the ~ operator.
@@ -635,7 +760,7 @@ class CoolPyParser:
         '''
         expression : INT_COMP expression
         '''
-        parse[0] = AST.IntegerComplement(parse[2])
+        parse[0] = self._located(parse, AST.IntegerComplement(parse[2]))
 
 
     # A complement of a Bool in Cool can be evaluated using the not/NOT operator.
@@ -645,7 +770,7 @@ class CoolPyParser:
         '''
         expression : NOT expression
         '''
-        parse[0] = AST.BooleanComplement(parse[2])
+        parse[0] = self._located(parse, AST.BooleanComplement(parse[2]))
 
     def p_empty(self, parse):
         '''
@@ -653,16 +778,41 @@ class CoolPyParser:
         '''
         parse[0] = None
 
+    def _located(self, parse, node):
+        '''
+        Sets the span of a node built by a production to the span of the symbols on its right-hand
+        side: from the first character of the first symbol to just past the last symbol.
+        '''
+        node.start = parse.lexspan(1)[0]
+        node.end = parse.lexspan(len(parse) - 1)[1]
+        return node
+
+    def _located_token(self, parse, n, node, width = None):
+        '''
+        Sets the span of a node to the span of the n-th symbol of a production (or to the first
+        'width' characters of it).
+        '''
+        node.start, node.end = parse.lexspan(n)
+        if width is not None:
+            node.end = node.start + width
+        return node
+
     def p_error(self, parse):
         '''
-        Error rule for Syntax Errors handling and reporting.
+        Error rule for Syntax Errors handling and reporting. Records a Diagnostic in error_list; 
+        yacc then recovers with the error productions above (the errors found while it recovers, 
+        i.e. before three more tokens are shifted, are not reported).
         '''
         if parse is None:
-            print('Error! Unexpected end of input!')
+            # The end of the input: located just past the last symbol parsed.
+            last = self.parser.symstack[-1]
+            end = getattr(last, 'endlexpos', getattr(last, 'lexpos', 0))
+            line = getattr(last, 'endlineno', getattr(last, 'lineno', 1))
+            self.error_list.append(Diagnostic('syntax', 'Unexpected end of input.', end, end, line))
         else:
-            error = f'Syntax error! Line: {parse.lineno}, position: {parse.lexpos}, character: {parse.value}, type: {parse.type}'
-            self.error_list.append(error)
-            self.parser.errok()
+            end = getattr(parse, 'endlexpos', parse.lexpos + len(str(parse.value)))
+            self.error_list.append(Diagnostic('syntax', f'character: {parse.value}, type: {parse.type}', 
+                                              parse.lexpos, end, parse.lineno))
 
     def build(self, **kwargs):
         '''
@@ -677,6 +827,8 @@ class CoolPyParser:
             yacctab         = self._yacctab
             debuglog        = self._debuglog
             errorlog        = self._errorlog
+            cache_tables    = self._cache_tables
+            cache_dir       = self._cache_dir
         else:
             debug           = kwargs.get('debug', self._debug)
             write_tables    = kwargs.get('write_tables', self._write_tables)
@@ -685,15 +837,26 @@ class CoolPyParser:
             yacctab         = kwargs.get('yacctab', self._yacctab)
             debuglog        = kwargs.get('debuglog', self._debuglog)
             errorlog        = kwargs.get('errorlog', self._errorlog)
+            cache_tables    = kwargs.get('cache_tables', self._cache_tables)
+            cache_dir       = kwargs.get('cache_dir', self._cache_dir)
 
         self.lexer = CoolPyLexer(debug       = debug, 
                                 optimize    = optimize, 
                                 outputdir   = outputdir, 
                                 debuglog    = debuglog,
-                                errorlog    = errorlog)
+                                errorlog    = errorlog,
+                                cache_tables = cache_tables,
+                                cache_dir   = cache_dir,
+                                backend     = self._lexer_backend)
 
         self.tokens = self.lexer.tokens
 
+        if cache_tables and optimize and not debug:
+            self.parser = TableCache(cache_dir).build_parser(self, 
+                                                             debuglog = debuglog, 
+                                                             errorlog = errorlog)
+            return
+
         self.parser = yacc.yacc(module          = self, 
                                 write_tables    = write_tables, 
                                 debug           = debug, 
@@ -703,16 +866,77 @@ class CoolPyParser:
                                 debuglog        = debuglog, 
                                 errorlog        = errorlog)
 
-    def parse(self, program_source_code: str) -> AST.Program:
+    def reset(self):
+        '''
+        Resets the per-parse state of the parser and its lexer (the error list, the classes parsed, 
+        the line number, the lexer state and the comment depth), so that the same instance can 
+        parse another program.
+        '''
+
+        if self.parser is None:
+            raise ValueError('Parser was not build, try building it first with the build() method.')
+
+        self.error_list = []
+        self._classes = []
+        self.lexer.reset()
+
+    def parse(self, program_source_code: str = None, tokenfunc = None, lexer = None) -> AST.Program:
         '''
         Parses the Cool program provided as the input.
-        Returns the AST formed as a result of the parsing.
+        Returns the AST formed as a result of the parsing. The lexical and syntax errors of this 
+        parse are left in error_list (as diagnostics.Diagnostic objects, in source order). The parse recovers from syntax errors 
+        at the semicolons and closing braces of classes, features and blocks, so a program with 
+        errors still gives a partial AST: a Program of the classes that could be parsed (without 
+        the methods whose body is broken). Every node carries the source offsets of its first character (start) and 
+        of the position just past its last character (end); see spans.SpanIndex for lookups.
+
+        Instead of the source code, the tokens can be supplied by tokenfunc, a function returning 
+        the next token (or None at the end of the input), e.g. the token() method of the scanner 
+        returned by CoolPyLexer.tokenize_stream(). lexer is then the object yacc attaches to 
+        error tokens (defaults to this parser's lexer).
+
+        The parse only touches the state of this instance, so distinct instances can be used 
+        from different threads; see pool.ParserPool for sharing pre-built parsers.
+        '''
+
+        self.reset()
+        if lexer is None:
+            lexer = self.lexer.lexer
+            if tokenfunc is None:
+                # CoolPyLexer.token() records the end offset of every token, for the node spans.
+                tokenfunc = self.lexer.token
+
+        program = self.parser.parse(program_source_code, 
+                                    lexer      = lexer, 
+                                    tokenfunc  = tokenfunc,
+                                    tracking   = True)
+        if self.error_list:
+            # yacc gives up on an error at the end of the input, and the recovery may drop the 
+            # classes around an error: the partial program has all the classes that were reduced.
+            program = AST.Program(classes = tuple(self._classes))
+            program.start = self._classes[0].start if self._classes else None
+            program.end = self._classes[-1].end if self._classes else None
+        self._classes = []
+        if self.lexer.error_list:
+            self.error_list = sorted(self.lexer.error_list + self.error_list, key = lambda error: error.start)
+        return program
+
+    @property
+    def symbols(self):
+        '''The symbol table of the last parse (see symbols.SymbolTable).'''
+        return self.lexer.symbols
+
+    def parse_stream(self, stream, chunk_size = 1 << 16, encoding = 'utf-8') -> AST.Program:
+        '''
+        Parses the Cool program read from a file object or an mmap, chunk by chunk, without 
+        loading the whole source in memory (see CoolPyLexer.tokenize_stream()).
         '''
 
         if self.parser is None:
             raise ValueError('Parser was not build, try building it first with the build() method.')
 
-        return self.parser.parse(program_source_code)
+        scanner = self.lexer.tokenize_stream(stream, chunk_size = chunk_size, encoding = encoding)
+        return self.parse(tokenfunc = scanner.token, lexer = scanner)
 
 if __name__ == '__main__':
     import sys
@@ -727,13 +951,13 @@ if __name__ == '__main__':
 
         input_file = sys.argv[1]
         with open(input_file, 'r') as file:
-            cool_program_code = file.read()
-
-        parse_result = parser.parse(cool_program_code)
+            parse_result = parser.parse_stream(file)
 
         from helpers import print_readable_ast
 
         print_readable_ast(parse_result)
+        for error in parser.error_list:
+            print(error)
     else:
         print('Provide the path to the Cool program source file.')
         print('Usage: python parser.py <file_name.cl>')
@@ -0,0 +1,175 @@
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from parser import CoolPyParser
+
+
+# The outcome of parsing one source: the AST.Program (None if nothing could be built)
+# and the list of syntax errors reported while parsing it.
+ParseResult = namedtuple('ParseResult', ['program', 'errors'])
+
+
+class ParserPool:
+    '''
+    ParserPool hands out pre-built CoolPyParser instances (each with its own CoolPyLexer and
+    LRParser) and parses many Cool programs concurrently.
+
+    ...
+
+    A CoolPyParser keeps per-parse state (error_list, the LRParser stacks, the lexer's lineno and
+    comment_count), so an instance is only ever used by one thread at a time. The pool builds up
+    to `size` parsers lazily, resets their state whenever they are returned and reuses them.
+
+    With executor='thread', parse_many() runs on a thread pool sharing the pooled parsers.
+    With executor='process', it runs on a process pool whose workers each build one parser at
+    startup; results (ASTs included) are pickled back to the caller.
+
+    Attributes
+    ----------
+    size : int
+        The maximum number of parsers (and workers) of the pool.
+    executor : str
+        Either 'thread' or 'process'.
+
+    Methods
+    -------
+    acquire()
+        A context manager that lends a ready-to-use CoolPyParser.
+    parse(source_code)
+        Parses a single Cool program with a pooled parser.
+    parse_many(sources)
+        Parses an iterable of Cool programs concurrently, returning results in input order.
+    close()
+        Shuts down the executor of the pool.
+    '''
+
+    def __init__(self, size = None, executor = 'thread', **parser_options):
+        '''
+        Parameters
+        ----------
+        size : int, optional
+            The maximum number of parsers (and workers). Defaults to os.cpu_count().
+        executor : str, optional
+            'thread' (default) or 'process'.
+        parser_options : dict
+            Keyword arguments forwarded to CoolPyParser().
+        '''
+        if executor not in ('thread', 'process'):
+            raise ValueError(f'Unknown executor {executor!r}, expected \'thread\' or \'process\'.')
+
+        self.size = size if size else (os.cpu_count() or 1)
+        self.executor = executor
+
+        self._parser_options = parser_options
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def acquire(self):
+        '''Lends a CoolPyParser for the duration of the with block.
+
+        A new parser is built if none is idle and fewer than `size` exist; otherwise the call
+        blocks until another thread returns one. The parser is reset before it goes back to the pool.
+        '''
+        parser = self._take()
+        try:
+            yield parser
+        finally:
+            parser.reset()
+            self._idle.put(parser)
+
+    def parse(self, source_code: str) -> ParseResult:
+        '''Parses one Cool program with a pooled parser.'''
+        with self.acquire() as parser:
+            program = parser.parse(source_code)
+            return ParseResult(program, parser.error_list)
+
+    def parse_many(self, sources, chunksize = 1):
+        '''Parses the Cool programs in sources concurrently.
+
+        Parameters
+        ----------
+        sources : iterable of str
+            The Cool programs to parse.
+        chunksize : int, optional
+            Number of sources sent to a worker process at once (process executor only).
+
+        Returns
+        -------
+        list of ParseResult
+            One result per source, in input order.
+        '''
+        executor = self._get_executor()
+        if self.executor == 'process':
+            return list(executor.map(parse_in_worker, sources, chunksize = chunksize))
+        return list(executor.map(self.parse, sources))
+
+    def close(self):
+        '''Shuts down the executor of the pool. Pooled parsers stay usable through parse().'''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return CoolPyParser(**self._parser_options)
+
+        return self._idle.get()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.executor == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers = self.size,
+                                                         initializer = init_worker,
+                                                         initargs = (self._parser_options,))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers = self.size)
+            return self._executor
+
+
+# The parser of the current worker process, built once by init_worker().
+_worker_parser = None
+
+
+def init_worker(parser_options):
+    '''Process pool initializer: builds the CoolPyParser used by parse_in_worker() in this process.'''
+    global _worker_parser
+    _worker_parser = CoolPyParser(**parser_options)
+
+
+def worker_parser():
+    '''Returns the CoolPyParser built by init_worker() in this process.'''
+    return _worker_parser
+
+
+def parse_in_worker(source_code):
+    '''Parses source_code with the parser of the current worker process.'''
+    program = _worker_parser.parse(source_code)
+    return ParseResult(program, _worker_parser.error_list)
+
+
+def parse_many(sources, workers = None, executor = 'process', **parser_options):
+    '''Parses many Cool programs with a temporary ParserPool and returns their ParseResults in order.'''
+    with ParserPool(size = workers, executor = executor, **parser_options) as pool:
+        return pool.parse_many(sources)
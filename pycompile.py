@@ -0,0 +1,813 @@
+import copy
+import hashlib
+import importlib.util
+import marshal
+import os
+import tempfile
+from collections import namedtuple
+
+import ast as AST
+from runtime import CoolAbort
+from runtime import CoolRuntimeError
+from runtime import Runtime
+from runtime import Span
+from runtime import divide
+from runtime import run_with_stack
+from runtime import wrap_int
+from semant import BASIC_CLASSES
+from semant import BUILTIN_CLASSES
+from semant import SELF_TYPE
+from semant import analyze
+from semant import case_branch
+
+
+# Layout of the cache files: MAGIC, the magic number of the Python version, the cache key (32
+# bytes), then the marshalled code object of the generated module.
+MAGIC = b'COOLPYC\x01'
+
+# Subexpressions nested deeper than this are computed into temporaries, to keep the generated
+# source within the nesting limits of the Python compiler.
+MAX_EXPRESSION_DEPTH = 25
+
+# The compiled form of an expression: the statements to run first (as (indentation, text) pairs),
+# then the Python expression giving its value, the nesting depth of that expression, whether
+# evaluating it can have side effects, and whether its value is a constant (literals and self).
+Code = namedtuple('Code', ['lines', 'expression', 'depth', 'effects', 'stable'])
+
+# Integer operations: the result is kept when it fits in 32 bits (t is a temporary), and wrapped
+# otherwise.
+_WRAP = '({t} if -2147483648 <= ({t} := {value}) <= 2147483647 else _wrap({t}))'
+
+# The basic classes, in generated code. _rt and _write are set when the program runs.
+_PRELUDE = '''\
+class C_Object:
+    __slots__ = ()
+    _cool_name = 'Object'
+    def m_abort(self): return _rt.abort(self)
+    def m_type_name(self): return self._cool_name
+    def m_copy(self): return _copy(self)
+
+class C_IO(C_Object):
+    __slots__ = ()
+    _cool_name = 'IO'
+    def m_out_string(self, x):
+        _write(x)
+        return self
+    def m_out_int(self, x):
+        _write(str(x))
+        return self
+    def m_in_string(self): return _rt.in_string(self)
+    def m_in_int(self): return _rt.in_int(self)
+
+def new_Object(): return _new_object(C_Object)
+def new_IO(): return _new_object(C_IO)
+C_Object._new = staticmethod(new_Object)
+C_IO._new = staticmethod(new_IO)
+'''
+
+
+def _void(method, start, end):
+    raise CoolRuntimeError(f'Dispatch to void (method {method}).', Span(start, end))
+
+
+def _divide(dividend, divisor, start, end):
+    if divisor == 0:
+        raise CoolRuntimeError('Division by zero.', Span(start, end))
+    return divide(dividend, divisor)
+
+
+def _substr(text, start, length, span_start, span_end):
+    if start < 0 or length < 0 or start + length > len(text):
+        raise CoolRuntimeError(f'Substring out of range: substr({start}, {length}) of a string of '
+                               f'length {len(text)}.', Span(span_start, span_end))
+    return text[start:start + length]
+
+
+def _equal(first, second):
+    if first.__class__ is second.__class__ and first.__class__ in (int, str, bool):
+        return first == second
+    return first is second
+
+
+class PythonRuntime(Runtime):
+    '''The Runtime of compiled programs, whose objects are instances of generated classes.'''
+
+    def class_name_of(self, value):
+        if value.__class__ is bool:
+            return 'Bool'
+        if value.__class__ is int:
+            return 'Int'
+        if value.__class__ is str:
+            return 'String'
+        return value._cool_name
+
+    def copy_object(self, value):
+        return copy.copy(value)
+
+    def ancestors_of(self, value):
+        '''The names of the class of a value and of its ancestors.'''
+        if value.__class__ in (bool, int, str):
+            return (self.class_name_of(value), 'Object')
+        return tuple(klass._cool_name for klass in value.__class__.__mro__ if '_cool_name' in vars(klass))
+
+
+class CompiledProgram:
+    '''
+    CompiledProgram is a Cool program compiled to a Python module.
+
+    ...
+
+    Every Cool class is a Python class with one slot per attribute (__slots__), every method a
+    Python method, so dispatch is a native attribute lookup; every method body is straight-line
+    Python: arithmetic is inlined with 32-bit wrapping, loops are while loops, let variables are
+    locals, and case branches are selected through a per-site table keyed by the Python class of
+    the value. The module is compiled once to a code object, which can be cached (see
+    compile_file()), and executed on every run() with fresh IO streams.
+
+    Attributes
+    ----------
+    code : code
+        The code object of the module.
+    source : str
+        The generated Python source (None if the program was loaded from a cache file).
+
+    Methods
+    -------
+    run(stdin, stdout)
+        Runs Main.main() and returns its value.
+    namespace(stdin, stdout)
+        Executes the module and returns its globals (the classes C_<name>, the functions
+        new_<name>()), without running main().
+    '''
+
+    def __init__(self, code, source = None):
+        self.code = code
+        self.source = source
+
+    def namespace(self, stdin = None, stdout = None):
+        runtime = PythonRuntime(stdin, stdout)
+        namespace = {
+            '__name__': 'cool_program',
+            '_rt': runtime,
+            '_write': runtime.stdout.write,
+            '_copy': copy.copy,
+            '_new_object': object.__new__,
+            '_void': _void,
+            '_wrap': wrap_int,
+            '_divide': _divide,
+            '_substr': _substr,
+            '_equal': _equal,
+            '_select': _select,
+        }
+        exec(self.code, namespace)
+        return namespace
+
+    def run(self, stdin = None, stdout = None):
+        '''Runs (new Main).main() on a thread with a large stack and returns its value. Abort
+        stops the program and returns None; run-time errors raise CoolRuntimeError.'''
+        namespace = self.namespace(stdin, stdout)
+        runtime = namespace['_rt']
+
+        def main():
+            try:
+                return namespace['new_Main']().m_main()
+            except CoolAbort:
+                return None
+            finally:
+                runtime.stdout.flush()
+
+        return run_with_stack(main)
+
+
+def _select(table, branches, value, start, end):
+    '''Selects the branch of a case for the class of value, remembering it in table.'''
+    if value is None:
+        raise CoolRuntimeError('Match on void in case statement.', Span(start, end))
+    runtime = PythonRuntime()
+    for ancestor in runtime.ancestors_of(value):
+        if ancestor in branches:
+            table[value.__class__] = branch = branches.index(ancestor)
+            return branch
+    raise CoolRuntimeError(f'No match in case statement for class {runtime.class_name_of(value)}.',
+                           Span(start, end))
+
+
+class PythonCodeGenerator:
+    '''
+    PythonCodeGenerator translates a type-checked program into the source of a Python module.
+
+    ...
+
+    Expressions are translated bottom-up with an explicit stack, each into a Code: the
+    statements it needs (blocks, loops, lets, conditionals with statements, case) and the Python
+    expression of its value. Evaluation order is kept: when a later operand needs statements, or
+    when a dispatch receiver must be evaluated after its arguments (Cool evaluates the arguments
+    first), the earlier operands are saved in temporaries. Dispatches to receivers that may be
+    void are guarded, and Int, Bool and String receivers call the runtime directly.
+
+    Methods
+    -------
+    generate()
+        Returns the source of the module.
+    '''
+
+    def __init__(self, program, environment, types):
+        '''
+        Parameters
+        ----------
+        program : AST.Program
+            The program, free of semantic errors.
+        environment : semant.ClassEnvironment
+            Its classes.
+        types : dict
+            The static type of every expression (semant.SemanticResult.types).
+        '''
+        self.program = program
+        self.environment = environment
+        self.types = types
+        self._handlers = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                handler = getattr(self, '_generate_' + kind.__name__, None)
+                if handler is not None:
+                    self._handlers[kind] = handler
+        self._case_count = 0
+        self._module_lines = []
+
+    def generate(self):
+        nodes = {node.name: node for node in self.program.classes}
+        out = [_PRELUDE]
+        for name in self.environment.names:
+            if name in BUILTIN_CLASSES:
+                continue
+            out.append(self._generate_class(nodes[name]))
+        return '\n'.join(self._module_lines + out)
+
+    def _generate_class(self, class_node):
+        name = class_node.name
+        parent = self.environment.parent(name)
+        own = [info.name for info in self.environment.attributes(name) if info.owner == name]
+        lines = [f'class C_{name}(C_{parent}):',
+                 f'    __slots__ = ({"".join(repr("a_" + attribute) + ", " for attribute in own)})',
+                 f'    _cool_name = {name!r}']
+
+        for feature in class_node.features:
+            if isinstance(feature, AST.Method):
+                formals = [formal.name for formal in feature.formal_parameters]
+                parameters = ''.join(f', p_{formal}' for formal in formals)
+                body = self._generate_function(name, [feature.body], formals)
+                lines.append(f'    def m_{feature.name}(self{parameters}):')
+                lines.extend('        ' + line for line in body)
+
+        # The initializers of the attributes defined by this class, then the constructor.
+        initialized = [feature for feature in class_node.features
+                       if isinstance(feature, AST.Attribute) and feature.expression is not None]
+        lines.append('')
+        lines.append(f'def init_{name}(self):')
+        if initialized:
+            body = self._generate_function(name, [feature.expression for feature in initialized], [],
+                                           targets = ['self.a_' + feature.name for feature in initialized])
+            lines.extend('    ' + line for line in body)
+        else:
+            lines.append('    pass')
+
+        lines.append(f'def new_{name}():')
+        lines.append(f'    self = _new_object(C_{name})')
+        for info in self.environment.attributes(name):
+            lines.append(f'    self.a_{info.name} = {_default(info.type)}')
+        for ancestor in reversed(self.environment.ancestors(name)):
+            if ancestor not in BUILTIN_CLASSES:
+                lines.append(f'    init_{ancestor}(self)')
+        lines.append('    return self')
+        lines.append(f'C_{name}._new = staticmethod(new_{name})')
+        lines.append('')
+        return '\n'.join(lines)
+
+    def _generate_function(self, class_name, expressions, formals, targets = None):
+        '''
+        Returns the body lines of a function computing expressions of class class_name in order;
+        the value of the last one is returned, or, with targets, every value is assigned to its
+        target.
+        '''
+        self._class_name = class_name
+        self._temporaries = 0
+        self._variables = 0
+        self._locals = {}
+        out = []
+        for i, expression in enumerate(expressions):
+            self._resolve(class_name, expression, formals)
+            code = self._generate(expression)
+            out.extend('    ' * indentation + text for indentation, text in code.lines)
+            if targets is not None:
+                out.append(f'{targets[i]} = {code.expression}')
+            elif i == len(expressions) - 1:
+                out.append(f'return {code.expression}')
+        return out
+
+    def _temporary(self):
+        self._temporaries += 1
+        return f't{self._temporaries}'
+
+    def _variable(self, name):
+        self._variables += 1
+        return f'v{self._variables}_{name}'
+
+    def _resolve(self, class_name, expression, formals):
+        '''Names the Python locals of the let and case variables of an expression, and resolves
+        every variable reference to a local or an attribute.'''
+        scope = {name: ['p_' + name] for name in formals}
+        work = [('visit', expression)]
+        while work:
+            operation, item = work.pop()
+            if operation == 'bind':
+                name, local = item
+                scope.setdefault(name, []).append(local)
+                continue
+            if operation == 'unbind':
+                scope[item].pop()
+                continue
+
+            node = item
+            kind = node.__class__
+            if kind is AST.Object or kind is AST.Assignment:
+                name = node.name if kind is AST.Object else node.instance.name
+                locals_ = scope.get(name)
+                self._locals[node] = locals_[-1] if locals_ else 'self.a_' + name
+                if kind is AST.Assignment:
+                    work.append(('visit', node.expression))
+            elif kind is AST.Let:
+                local = self._locals[node] = self._variable(node.instance)
+                work.append(('unbind', node.instance))
+                work.append(('visit', node.body))
+                work.append(('bind', (node.instance, local)))
+                if node.expression is not None:
+                    work.append(('visit', node.expression))
+            elif kind is AST.Case:
+                branch_locals = []
+                for name, _, body in reversed([case_branch(action) for action in node.actions]):
+                    local = self._variable(name)
+                    branch_locals.append(local)
+                    work.append(('unbind', name))
+                    work.append(('visit', body))
+                    work.append(('bind', (name, local)))
+                self._locals[node] = tuple(reversed(branch_locals))
+                work.append(('visit', node.expression))
+            else:
+                for child in reversed(_children(node)):
+                    work.append(('visit', child))
+
+    def _generate(self, expression):
+        '''Translates an expression, children first, with an explicit stack.'''
+        handlers = self._handlers
+        results = []
+        work = [(expression, False)]
+        while work:
+            node, ready = work.pop()
+            children = _children(node)
+            if not ready and children:
+                work.append((node, True))
+                for child in reversed(children):
+                    work.append((child, False))
+                continue
+            if children:
+                operands = results[-len(children):]
+                del results[-len(children):]
+            else:
+                operands = []
+            results.append(handlers[node.__class__](node, operands))
+        return results[0]
+
+    def _sequence(self, operands, receiver_last = False):
+        '''
+        Returns the statements of operands (in order) and their expressions, saving an operand in
+        a temporary when statements of a later operand could change it, or when it is nested too
+        deeply. With receiver_last, the last operand is evaluated last although its expression
+        comes first in the generated code (a dispatch receiver), so the other operands are saved
+        when their order relative to it matters.
+        '''
+        lines = []
+        expressions = []
+        for i, code in enumerate(operands):
+            later = operands[i + 1:]
+            expression = code.expression
+            must_save = code.depth > MAX_EXPRESSION_DEPTH or (
+                not code.stable and any(other.lines for other in later))
+            if receiver_last and i < len(operands) - 1 and not code.stable:
+                receiver = operands[-1]
+                must_save = must_save or receiver.effects or (code.effects and not receiver.stable)
+            lines.extend(code.lines)
+            if must_save:
+                temporary = self._temporary()
+                lines.append((0, f'{temporary} = {expression}'))
+                expression = temporary
+            expressions.append(expression)
+        return lines, expressions
+
+    def _depth(self, operands):
+        return 1 + max((code.depth for code in operands), default = 0)
+
+    def _generate_Integer(self, node, operands):
+        return Code([], repr(node.content), 0, False, True)
+
+    def _generate_String(self, node, operands):
+        return Code([], repr(node.content), 0, False, True)
+
+    def _generate_Boolean(self, node, operands):
+        return Code([], 'True' if node.content else 'False', 0, False, True)
+
+    def _generate_Self(self, node, operands):
+        return Code([], 'self', 0, False, True)
+
+    def _generate_Object(self, node, operands):
+        return Code([], self._locals[node], 0, False, False)
+
+    def _generate_Assignment(self, node, operands):
+        code = operands[0]
+        target = self._locals[node]
+        lines = code.lines + [(0, f'{target} = {code.expression}')]
+        return Code(lines, target, 0, False, False)
+
+    def _generate_NewObject(self, node, operands):
+        if node.type == SELF_TYPE:
+            return Code([], 'self._new()', 1, True, False)
+        if node.type in BASIC_CLASSES:
+            return Code([], _default(node.type), 0, False, True)
+        return Code([], f'new_{node.type}()', 1, True, False)
+
+    def _generate_IsVoid(self, node, operands):
+        code = operands[0]
+        return Code(code.lines, f'({code.expression} is None)', code.depth + 1, code.effects, False)
+
+    def _generate_Block(self, node, operands):
+        lines = []
+        for code in operands[:-1]:
+            lines.extend(code.lines)
+            if code.effects:
+                lines.append((0, code.expression))
+        last = operands[-1]
+        return Code(lines + last.lines, last.expression, last.depth, last.effects, last.stable)
+
+    def _generate_dispatch(self, node, operands, static_type):
+        instance = operands[0]
+        arguments = operands[1:]
+        # Arguments are evaluated before the receiver.
+        lines, expressions = self._sequence(arguments + [instance], receiver_last = True)
+        receiver = expressions[-1]
+        arguments = expressions[:-1]
+        method = node.method
+        instance_type = self.types.get(node.instance, 'Object')
+        lookup_type = static_type if static_type is not None else instance_type
+        if lookup_type == SELF_TYPE:
+            lookup_type = self._class_name
+        depth = self._depth(operands)
+        span = f'{node.start}, {node.end}'
+
+        # Methods of the basic classes on values that are not objects of generated classes.
+        basic_receiver = instance_type in BASIC_CLASSES or (static_type in BASIC_CLASSES)
+        info = self.environment.lookup_method(lookup_type, method)
+        if info.owner in BUILTIN_CLASSES and (basic_receiver or static_type is not None or
+                                              lookup_type == 'Object'):
+            if instance_type in BASIC_CLASSES:
+                expression = self._basic_call(instance_type, method, receiver, arguments, span)
+            elif static_type is not None:
+                checked = self._checked(receiver, instance, method, span)
+                expression = f'_rt.{method}({", ".join([checked] + arguments)})'
+            else:
+                # A receiver of static type Object may be an Int, a String or a Bool at run time.
+                temporary = self._temporary()
+                builtin = f'_rt.{method}({", ".join([temporary] + arguments)})'
+                dispatch = f'{temporary}.m_{method}({", ".join(arguments)})'
+                expression = (f'({builtin} if ({temporary} := {receiver}).__class__ in (int, str, bool) '
+                              f'else {dispatch} if {temporary} is not None '
+                              f'else _void({method!r}, {span}))')
+            return Code(lines, expression, depth, True, False)
+
+        checked = self._checked(receiver, instance, method, span)
+        if static_type is not None:
+            expression = f'C_{static_type}.m_{method}({", ".join([checked] + arguments)})'
+        else:
+            expression = f'{checked}.m_{method}({", ".join(arguments)})'
+        return Code(lines, expression, depth, True, False)
+
+    def _checked(self, receiver, code, method, span):
+        '''The receiver expression, guarded against void unless it cannot be void.'''
+        if receiver == 'self' or code.stable or receiver.startswith('new_'):
+            return receiver
+        temporary = self._temporary()
+        return f'({temporary} if ({temporary} := {receiver}) is not None else _void({method!r}, {span}))'
+
+    def _basic_call(self, class_name, method, receiver, arguments, span):
+        if method == 'type_name':
+            return repr(class_name)
+        if method == 'copy':
+            return receiver
+        if method == 'length':
+            return f'len({receiver})'
+        if method == 'concat':
+            return f'({receiver} + {arguments[0]})'
+        if method == 'substr':
+            return f'_substr({receiver}, {arguments[0]}, {arguments[1]}, {span})'
+        return f'_rt.{method}({", ".join([receiver] + arguments)})'
+
+    def _generate_DynamicDispatch(self, node, operands):
+        return self._generate_dispatch(node, operands, None)
+
+    def _generate_StaticDispatch(self, node, operands):
+        return self._generate_dispatch(node, operands, node.dispatch_type)
+
+    def _generate_Let(self, node, operands):
+        local = self._locals[node]
+        body = operands[-1]
+        if node.expression is None:
+            lines = [(0, f'{local} = {_default(node.return_type)}')]
+        else:
+            initializer = operands[0]
+            lines = initializer.lines + [(0, f'{local} = {initializer.expression}')]
+        return Code(lines + body.lines, body.expression, body.depth, body.effects, body.stable)
+
+    def _generate_If(self, node, operands):
+        predicate, then_body, else_body = operands
+        if not then_body.lines and not else_body.lines:
+            expression = f'({then_body.expression} if {predicate.expression} else {else_body.expression})'
+            return Code(predicate.lines, expression, self._depth(operands),
+                        any(code.effects for code in operands), False)
+
+        result = self._temporary()
+        lines = list(predicate.lines)
+        lines.append((0, f'if {predicate.expression}:'))
+        lines.extend(_indented(then_body.lines + [(0, f'{result} = {then_body.expression}')]))
+        lines.append((0, 'else:'))
+        lines.extend(_indented(else_body.lines + [(0, f'{result} = {else_body.expression}')]))
+        return Code(lines, result, 0, False, False)
+
+    def _generate_WhileLoop(self, node, operands):
+        predicate, body = operands
+        body_lines = list(body.lines)
+        if body.effects:
+            body_lines.append((0, body.expression))
+        if not predicate.lines:
+            lines = [(0, f'while {predicate.expression}:')]
+            lines.extend(_indented(body_lines or [(0, 'pass')]))
+        else:
+            lines = [(0, 'while True:')]
+            lines.extend(_indented(predicate.lines + [(0, f'if not {predicate.expression}:'),
+                                                      (1, 'break')] + body_lines))
+        return Code(lines, 'None', 0, False, True)
+
+    def _generate_Case(self, node, operands):
+        value = operands[0]
+        branches = operands[1:]
+        self._case_count += 1
+        table = f'_case{self._case_count}'
+        branch_types = tuple(case_branch(action)[1] for action in node.actions)
+        self._module_lines.append(f'{table} = {{}}')
+
+        subject = self._temporary()
+        branch = self._temporary()
+        result = self._temporary()
+        lines = list(value.lines)
+        lines.append((0, f'{subject} = {value.expression}'))
+        lines.append((0, f'{branch} = {table}.get({subject}.__class__)'))
+        lines.append((0, f'if {branch} is None:'))
+        lines.append((1, f'{branch} = _select({table}, {branch_types!r}, {subject}, {node.start}, {node.end})'))
+        for i, (local, code) in enumerate(zip(self._locals[node], branches)):
+            body = [(0, f'{local} = {subject}')] + code.lines + [(0, f'{result} = {code.expression}')]
+            if len(branches) == 1:
+                lines.extend(body)
+                continue
+            if i == 0:
+                lines.append((0, f'if {branch} == 0:'))
+            elif i < len(branches) - 1:
+                lines.append((0, f'elif {branch} == {i}:'))
+            else:
+                lines.append((0, 'else:'))
+            lines.extend(_indented(body))
+        return Code(lines, result, 0, False, False)
+
+    def _generate_IntegerComplement(self, node, operands):
+        code = operands[0]
+        temporary = self._temporary()
+        expression = f'({temporary} if ({temporary} := -{code.expression}) != 2147483648 else -2147483648)'
+        return Code(code.lines, expression, code.depth + 1, code.effects, False)
+
+    def _generate_BooleanComplement(self, node, operands):
+        code = operands[0]
+        return Code(code.lines, f'(not {code.expression})', code.depth + 1, code.effects, False)
+
+    def _binary(self, node, operands, template):
+        lines, (first, second) = self._sequence(operands)
+        return Code(lines, template.format(first = first, second = second), self._depth(operands),
+                    any(code.effects for code in operands), False)
+
+    def _arithmetic(self, node, operands, operator):
+        value = f'{{first}} {operator} {{second}}'
+        return self._binary(node, operands, _WRAP.format(t = self._temporary(), value = value))
+
+    def _generate_Addition(self, node, operands):
+        return self._arithmetic(node, operands, '+')
+
+    def _generate_Subtraction(self, node, operands):
+        return self._arithmetic(node, operands, '-')
+
+    def _generate_Multiplication(self, node, operands):
+        return self._arithmetic(node, operands, '*')
+
+    def _generate_Division(self, node, operands):
+        # Floor division is Cool division when neither operand is negative; the other cases (and
+        # division by zero) go through _divide.
+        first = self._temporary()
+        second = self._temporary()
+        template = (f'({first} // {second} if (({first} := {{first}}) >= 0) & (({second} := {{second}}) > 0) '
+                    f'else _divide({first}, {second}, {node.start}, {node.end}))')
+        return self._binary(node, operands, template)
+
+    def _generate_LessThan(self, node, operands):
+        return self._binary(node, operands, '({first} < {second})')
+
+    def _generate_LessThanOrEqual(self, node, operands):
+        return self._binary(node, operands, '({first} <= {second})')
+
+    def _generate_Equal(self, node, operands):
+        first_type = self.types.get(node.first, 'Object')
+        second_type = self.types.get(node.second, 'Object')
+        if first_type == second_type and first_type in BASIC_CLASSES:
+            template = '({first} == {second})'
+        elif first_type not in BASIC_CLASSES + ('Object',) or second_type not in BASIC_CLASSES + ('Object',):
+            # At least one side is an object of a generated class (or void).
+            template = '({first} is {second})'
+        else:
+            template = '_equal({first}, {second})'
+        return self._binary(node, operands, template)
+
+
+def _children(node):
+    '''The subexpressions of an expression, in evaluation order (dispatch receivers first).'''
+    kind = node.__class__
+    if kind is AST.Let:
+        return [node.body] if node.expression is None else [node.expression, node.body]
+    if kind is AST.Case:
+        return [node.expression] + [case_branch(action)[2] for action in node.actions]
+    if kind is AST.DynamicDispatch or kind is AST.StaticDispatch:
+        return [node.instance] + list(node.arguments)
+    if kind is AST.Block:
+        return list(node.expression_list)
+    if kind is AST.If:
+        return [node.predicate, node.then_body, node.else_body]
+    if kind is AST.WhileLoop:
+        return [node.predicate, node.body]
+    if kind is AST.Assignment or kind is AST.IsVoid:
+        return [node.expression]
+    if kind is AST.IntegerComplement:
+        return [node.integer_expression]
+    if kind is AST.BooleanComplement:
+        return [node.boolean_expression]
+    if hasattr(node, 'first'):
+        return [node.first, node.second]
+    return []
+
+
+def _indented(lines):
+    return [(indentation + 1, text) for indentation, text in lines]
+
+
+def _default(type_name):
+    return {'Int': '0', 'String': "''", 'Bool': 'False'}.get(type_name, 'None')
+
+
+def compile_program(program, environment = None, types = None) -> CompiledProgram:
+    '''
+    Compiles a parsed program to a CompiledProgram. The program is analyzed if environment or
+    types is omitted, and an Exception is raised if it has semantic errors.
+    '''
+    if environment is None or types is None:
+        result = analyze(program)
+        if result.diagnostics:
+            raise Exception('The program has semantic errors:\n' +
+                            '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+        environment, types = result.environment, result.types
+
+    source = PythonCodeGenerator(program, environment, types).generate()
+    try:
+        code = compile(source, '<cool program>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError) as error:
+        raise Exception(f'The program is too deeply nested to be compiled to Python: {error}') from None
+    return CompiledProgram(code, source)
+
+
+_compiler_signature = None
+
+
+def compiler_signature():
+    '''Returns a hex digest identifying the compiler: the grammar (see ast_cache.grammar_signature()),
+    the modules generating and running the code, and the Python version.'''
+    global _compiler_signature
+    if _compiler_signature is None:
+        from ast_cache import grammar_signature
+
+        digest = hashlib.sha256(grammar_signature().encode())
+        digest.update(importlib.util.MAGIC_NUMBER)
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in ('pycompile.py', 'runtime.py', 'semant.py'):
+            with open(os.path.join(directory, module), 'rb') as file:
+                digest.update(file.read())
+        _compiler_signature = digest.hexdigest()
+    return _compiler_signature
+
+
+def cache_path(path, key):
+    '''The cache file of the compiled form of the source file path, for a cache key.'''
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, '__coolcache__', f'{name}.{key[:16]}.pyc')
+
+
+def compile_source(source_code: str) -> CompiledProgram:
+    '''Parses, checks and compiles a Cool program. Raises an Exception listing the errors if it
+    has syntax or semantic errors.'''
+    from parser import CoolPyParser
+
+    parser = CoolPyParser(build_parser = True)
+    program = parser.parse(source_code)
+    if program is None or parser.error_list:
+        raise Exception('The program has syntax errors:\n' + '\n'.join(map(str, parser.error_list)))
+    result = analyze(program, source_code)
+    if result.diagnostics:
+        raise Exception('The program has semantic errors:\n' +
+                        '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    return compile_program(program, result.environment, result.types)
+
+
+def compile_file(path, cache = True) -> CompiledProgram:
+    '''
+    Compiles a Cool source file. With cache, the code object is stored in a __coolcache__
+    directory next to the source, in a file named after the source and keyed by the hash of the
+    source and of the compiler, and later compilations of the same source load it instead of
+    parsing, checking and compiling again.
+    '''
+    with open(path, 'r') as file:
+        source_code = file.read()
+    if not cache:
+        return compile_source(source_code)
+
+    digest = hashlib.sha256(compiler_signature().encode())
+    digest.update(source_code.encode('utf-8', 'surrogatepass'))
+    key = digest.digest()
+    entry = cache_path(path, key.hex())
+
+    try:
+        with open(entry, 'rb') as file:
+            data = file.read()
+        header = MAGIC + importlib.util.MAGIC_NUMBER + key
+        if data.startswith(header):
+            return CompiledProgram(marshal.loads(data[len(header):]))
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+
+    compiled = compile_source(source_code)
+    directory = os.path.dirname(entry)
+    try:
+        os.makedirs(directory, exist_ok = True)
+        # Entries of previous versions of the source are stale.
+        prefix = os.path.basename(path) + '.'
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.pyc') and len(name) == len(prefix) + 20:
+                os.remove(os.path.join(directory, name))
+        handle, temporary = tempfile.mkstemp(prefix = '.tmp-', dir = directory)
+        with os.fdopen(handle, 'wb') as file:
+            file.write(MAGIC + importlib.util.MAGIC_NUMBER + key + marshal.dumps(compiled.code))
+        os.replace(temporary, entry)
+    except OSError:
+        # A read-only source directory only disables caching.
+        pass
+    return compiled
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from spans import LineIndex
+
+    arguments = argparse.ArgumentParser(description = 'Compile a Cool program to Python and run it.')
+    arguments.add_argument('path', help = 'the .cl file')
+    arguments.add_argument('--emit', action = 'store_true', help = 'print the generated Python instead of running it')
+    arguments.add_argument('--no-cache', action = 'store_true', help = 'do not use the __coolcache__ directory')
+    options = arguments.parse_args()
+
+    try:
+        compiled = compile_source(open(options.path).read()) if options.emit else \
+            compile_file(options.path, cache = not options.no_cache)
+    except Exception as error:
+        print(error, file = sys.stderr)
+        exit(1)
+
+    if options.emit:
+        print(compiled.source)
+        exit(0)
+
+    try:
+        compiled.run()
+    except CoolRuntimeError as error:
+        sys.stdout.flush()
+        with open(options.path, 'r') as file:
+            print(error.diagnostic(LineIndex(file.read())), file = sys.stderr)
+        exit(1)
@@ -0,0 +1,227 @@
+import sys
+import threading
+from collections import namedtuple
+
+from diagnostics import node_diagnostic
+
+
+# Cool integers are 32-bit two's complement.
+INT_MIN = -(1 << 31)
+INT_MAX = (1 << 31) - 1
+
+# Resources for running Cool programs, whose recursion becomes Python recursion.
+DEFAULT_STACK_SIZE = 512 * 1024 * 1024
+DEFAULT_RECURSION_LIMIT = 1000000
+
+# The location of a run-time error in compiled code, which has no AST nodes to point at.
+Span = namedtuple('Span', ['start', 'end'])
+
+
+def wrap_int(value):
+    '''Returns value wrapped to a 32-bit two's complement integer.'''
+    if INT_MIN <= value <= INT_MAX:
+        return value
+    return ((value - INT_MIN) & 0xffffffff) + INT_MIN
+
+
+def divide(dividend, divisor, node = None):
+    '''Cool integer division: truncates towards zero, fails on a zero divisor.'''
+    if divisor == 0:
+        raise CoolRuntimeError('Division by zero.', node)
+    quotient = abs(dividend) // abs(divisor)
+    return wrap_int(quotient if (dividend < 0) == (divisor < 0) else -quotient)
+
+
+def default_value(type_name):
+    '''The initial value of a variable or attribute of a type (void for all but the basic classes).'''
+    if type_name == 'Int':
+        return 0
+    if type_name == 'String':
+        return ''
+    if type_name == 'Bool':
+        return False
+    return None
+
+
+class CoolRuntimeError(Exception):
+    '''
+    Raised when a Cool program fails at run time (dispatch to void, division by zero, no match
+    in a case, substring out of range...). node is the AST node being evaluated, if known.
+    '''
+
+    def __init__(self, message, node = None):
+        super().__init__(message)
+        self.message = message
+        self.node = node
+
+    def diagnostic(self, lines = None):
+        '''Returns the error as a diagnostics.Diagnostic (lines is a spans.LineIndex).'''
+        return node_diagnostic('runtime', self.message, self.node, lines)
+
+
+class CoolAbort(Exception):
+    '''Raised by Object.abort() to halt the program.'''
+
+
+class CoolObject:
+    '''
+    An instance of a class of a Cool program (values of Int, String and Bool are Python int, str
+    and bool, and void is None). Attributes are stored by slot, in the layout of the class
+    (see semant.ClassEnvironment.attributes()).
+    '''
+    __slots__ = ('cool_class', 'attributes')
+
+    def __init__(self, cool_class, attributes):
+        self.cool_class = cool_class
+        self.attributes = attributes
+
+    def copy(self):
+        return CoolObject(self.cool_class, list(self.attributes))
+
+    def __repr__(self):
+        return f'<{self.cool_class.name} object>'
+
+
+class Runtime:
+    '''
+    Runtime implements the methods of the basic classes (Object, IO and String) for the
+    execution engines, on top of a pair of text streams.
+
+    ...
+
+    Every builtin method is a method of the runtime named after it, taking the receiver and the
+    arguments: runtime.out_string(receiver, text). The engines only differ in how they represent
+    objects, so subclasses provide class_name_of() and copy_object().
+
+    Attributes
+    ----------
+    stdin, stdout : file
+        The streams of the IO methods (sys.stdin and sys.stdout by default).
+
+    Methods
+    -------
+    builtin(class_name, method)
+        The implementation of a method of a basic class, or None.
+    class_name_of(value)
+        The name of the dynamic class of a value.
+    '''
+
+    # (class, method) -> name of the Runtime method implementing it.
+    BUILTINS = {
+        ('Object', 'abort'): 'abort',
+        ('Object', 'type_name'): 'type_name',
+        ('Object', 'copy'): 'copy',
+        ('IO', 'out_string'): 'out_string',
+        ('IO', 'out_int'): 'out_int',
+        ('IO', 'in_string'): 'in_string',
+        ('IO', 'in_int'): 'in_int',
+        ('String', 'length'): 'length',
+        ('String', 'concat'): 'concat',
+        ('String', 'substr'): 'substr',
+    }
+
+    def __init__(self, stdin = None, stdout = None):
+        self.stdin = stdin if stdin is not None else sys.stdin
+        self.stdout = stdout if stdout is not None else sys.stdout
+
+    def builtin(self, class_name, method):
+        name = self.BUILTINS.get((class_name, method))
+        return getattr(self, name) if name is not None else None
+
+    def class_name_of(self, value):
+        if value.__class__ is bool:
+            return 'Bool'
+        if value.__class__ is int:
+            return 'Int'
+        if value.__class__ is str:
+            return 'String'
+        return value.cool_class.name
+
+    def copy_object(self, value):
+        return value.copy()
+
+    def abort(self, receiver):
+        self.stdout.write(f'Abort called from class {self.class_name_of(receiver)}\n')
+        self.stdout.flush()
+        raise CoolAbort()
+
+    def type_name(self, receiver):
+        return self.class_name_of(receiver)
+
+    def copy(self, receiver):
+        if receiver.__class__ in (bool, int, str):
+            return receiver
+        return self.copy_object(receiver)
+
+    def out_string(self, receiver, text):
+        self.stdout.write(text)
+        return receiver
+
+    def out_int(self, receiver, number):
+        self.stdout.write(str(number))
+        return receiver
+
+    def in_string(self, receiver):
+        line = self.stdin.readline()
+        if line.endswith('\n'):
+            line = line[:-1]
+        # Strings with a null character are read as the empty string.
+        return '' if '\0' in line else line
+
+    def in_int(self, receiver):
+        text = self.stdin.readline().strip()
+        digits = text[1:] if text[:1] in ('-', '+') else text
+        if not digits.isdigit():
+            return 0
+        number = int(text)
+        return number if INT_MIN <= number <= INT_MAX else 0
+
+    def length(self, receiver):
+        return len(receiver)
+
+    def concat(self, receiver, text):
+        return receiver + text
+
+    def substr(self, receiver, start, length):
+        if start < 0 or length < 0 or start + length > len(receiver):
+            raise CoolRuntimeError(f'Substring out of range: substr({start}, {length}) of a string '
+                                   f'of length {len(receiver)}.')
+        return receiver[start:start + length]
+
+
+def run_with_stack(function, *arguments, stack_size = DEFAULT_STACK_SIZE,
+                   recursion_limit = DEFAULT_RECURSION_LIMIT):
+    '''
+    Calls function(*arguments) on a thread with a large stack and a raised recursion limit, and
+    returns its result (or raises its exception). Method calls of Cool programs are Python calls
+    in every engine, so deep Cool recursion needs deep Python recursion.
+    '''
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = function(*arguments)
+        except BaseException as error:
+            outcome['error'] = error
+
+    previous_limit = sys.getrecursionlimit()
+    try:
+        previous_size = threading.stack_size(stack_size)
+    except (ValueError, RuntimeError):
+        previous_size = None
+    sys.setrecursionlimit(max(previous_limit, recursion_limit))
+    try:
+        thread = threading.Thread(target = target, name = 'cool-program')
+        thread.start()
+        thread.join()
+    finally:
+        sys.setrecursionlimit(previous_limit)
+        if previous_size is not None:
+            threading.stack_size(previous_size)
+
+    if 'error' in outcome:
+        error = outcome['error']
+        if isinstance(error, RecursionError):
+            raise CoolRuntimeError('Stack overflow (method calls nested too deeply).') from None
+        raise error
+    return outcome.get('result')
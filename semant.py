@@ -0,0 +1,944 @@
+from array import array
+from collections import namedtuple
+
+import ast as AST
+from diagnostics import node_diagnostic
+from helpers import iter_nodes
+from spans import LineIndex
+
+
+SELF_TYPE = 'SELF_TYPE'
+
+# The classes every program gets, with the signatures of their methods:
+# name -> (parent, ((method, ((formal, type), ...), return type), ...)).
+BUILTIN_CLASSES = {
+    'Object': (None, (
+        ('abort', (), 'Object'),
+        ('type_name', (), 'String'),
+        ('copy', (), SELF_TYPE),
+    )),
+    'IO': ('Object', (
+        ('out_string', (('x', 'String'),), SELF_TYPE),
+        ('out_int', (('x', 'Int'),), SELF_TYPE),
+        ('in_string', (), 'String'),
+        ('in_int', (), 'Int'),
+    )),
+    'Int': ('Object', ()),
+    'String': ('Object', (
+        ('length', (), 'Int'),
+        ('concat', (('s', 'String'),), 'String'),
+        ('substr', (('i', 'Int'), ('l', 'Int')), 'String'),
+    )),
+    'Bool': ('Object', ()),
+}
+
+# Classes that cannot be inherited from, and whose values are compared by value.
+BASIC_CLASSES = ('Int', 'String', 'Bool')
+
+# A method of the dispatch table of a class: owner is the class defining the body that runs,
+# slot the position of the method in the dispatch tables of the class and of its descendants.
+MethodInfo = namedtuple('MethodInfo', ['name', 'owner', 'formal_names', 'formal_types', 'return_type', 'slot'])
+
+# An attribute of the layout of a class: slot is its position in the objects of the class and of
+# its descendants (inherited attributes come first).
+AttributeInfo = namedtuple('AttributeInfo', ['name', 'owner', 'type', 'slot'])
+
+# The outcome of analyze(): types maps every expression node of the program to its static type.
+SemanticResult = namedtuple('SemanticResult', ['program', 'environment', 'types', 'diagnostics'])
+
+
+def builtin_classes():
+    '''Returns AST.Class nodes for the basic classes. Their methods have no body (None) and
+    Object has no parent.
+    '''
+    classes = []
+    for name, (parent, methods) in BUILTIN_CLASSES.items():
+        features = tuple(
+            AST.Method(name = method,
+                       formal_parameters = tuple(AST.FormalParameter(formal, formal_type)
+                                                 for formal, formal_type in formals),
+                       return_type = return_type,
+                       body = None)
+            for method, formals, return_type in methods)
+        classes.append(AST.Class(name = name, parent = parent, features = features))
+    return classes
+
+
+class ClassEnvironment:
+    '''
+    ClassEnvironment holds everything known about the classes of a program once its class
+    headers and feature signatures have been read: the inheritance tree, the attribute layouts
+    and the method dispatch tables.
+
+    ...
+
+    Classes are numbered in preorder of the inheritance tree (Object is class 0), so that the
+    descendants of class i are exactly the classes i + 1 ... subtree_ends[i] - 1, and conformance
+    is two comparisons. The least upper bound (the lowest common ancestor) is answered in O(1)
+    from a sparse table over the Euler tour of the tree: the lowest common ancestor of two classes
+    is the class with the smallest number visited between their first visits. Attribute layouts
+    and dispatch tables are flattened once per class, inherited entries first, so looking up a
+    feature is a single dictionary access and never walks the parent chain.
+
+    Environments only hold names, numbers and tuples (no AST nodes) and are never modified once
+    built, so they can be pickled and shared with other processes (see analyze(workers = ...)).
+    The pickle holds the class names, parents, layouts and dispatch tables; the indexes are
+    rebuilt when it is loaded.
+
+    Attributes
+    ----------
+    names : tuple
+        The class names, in preorder; names[i] is class i.
+    parents : array('i')
+        The parent of every class (-1 for Object).
+    depths : array('i')
+        The depth of every class in the tree (0 for Object).
+    subtree_ends : array('i')
+        One past the last descendant of every class.
+
+    Methods
+    -------
+    class_id(name)
+        The number of a class.
+    parent(name)
+        The name of the parent of a class (None for Object).
+    ancestors(name)
+        The names of a class and of its ancestors, up to Object.
+    conforms(child, ancestor)
+        Whether a class is a descendant of (or is) another one.
+    lub(first, second)
+        The least upper bound (closest common ancestor) of two classes.
+    attributes(name)
+        The attribute layout of a class, as a tuple of AttributeInfo.
+    lookup_attribute(name, attribute)
+        An AttributeInfo, or None.
+    dispatch_table(name)
+        The dispatch table of a class, as a tuple of MethodInfo ordered by slot.
+    lookup_method(name, method)
+        A MethodInfo, or None.
+    '''
+
+    def __init__(self, names, parents, attributes, methods):
+        '''
+        Parameters
+        ----------
+        names : sequence of str
+            The class names, in preorder of the inheritance tree (Object first).
+        parents : sequence of int
+            The number of the parent of every class (-1 for Object).
+        attributes : sequence of tuple
+            The attribute layout of every class (tuples of AttributeInfo).
+        methods : sequence of tuple
+            The dispatch table of every class (tuples of MethodInfo).
+        '''
+        self.names = tuple(names)
+        self._ids = {name: i for i, name in enumerate(self.names)}
+        self.parents = array('i', parents)
+        self._attributes = tuple(attributes)
+        self._methods = tuple(methods)
+        self._attribute_maps = tuple({info.name: info for info in layout} for layout in self._attributes)
+        self._method_maps = tuple({info.name: info for info in table} for table in self._methods)
+
+        count = len(self.names)
+        self.depths = array('i', [0] * count)
+        self._ancestors = [(self.names[0],)] if count else []
+        for i in range(1, count):
+            self.depths[i] = self.depths[self.parents[i]] + 1
+            self._ancestors.append((self.names[i],) + self._ancestors[self.parents[i]])
+
+        # In preorder, a subtree ends where the next class at the same depth or above starts.
+        self.subtree_ends = array('i', [count] * count)
+        open_classes = []
+        for i in range(count):
+            while open_classes and self.depths[open_classes[-1]] >= self.depths[i]:
+                self.subtree_ends[open_classes.pop()] = i
+            open_classes.append(i)
+
+        # Euler tour: every class is visited when entered and again after each of its children.
+        self._first = array('i', [0] * count)
+        tour = array('i')
+        path = []
+        for i in range(count):
+            while path and self.parents[i] != path[-1]:
+                path.pop()
+                tour.append(path[-1])
+            self._first[i] = len(tour)
+            tour.append(i)
+            path.append(i)
+        while len(path) > 1:
+            path.pop()
+            tour.append(path[-1])
+
+        # _sparse[k][j] is the smallest class number in tour[j:j + 2 ** k].
+        self._sparse = [tour]
+        width = 1
+        while 2 * width <= len(tour):
+            previous = self._sparse[-1]
+            self._sparse.append(array('i', [min(previous[j], previous[j + width])
+                                            for j in range(len(tour) - 2 * width + 1)]))
+            width *= 2
+
+    def __reduce__(self):
+        return ClassEnvironment, (self.names, self.parents, self._attributes, self._methods)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def class_id(self, name):
+        return self._ids[name]
+
+    def parent(self, name):
+        parent = self.parents[self._ids[name]]
+        return None if parent < 0 else self.names[parent]
+
+    def ancestors(self, name):
+        return self._ancestors[self._ids[name]]
+
+    def conforms(self, child, ancestor):
+        i = self._ids[ancestor]
+        return i <= self._ids[child] < self.subtree_ends[i]
+
+    def lub(self, first, second):
+        start = self._first[self._ids[first]]
+        end = self._first[self._ids[second]]
+        if start > end:
+            start, end = end, start
+        level = (end - start + 1).bit_length() - 1
+        row = self._sparse[level]
+        return self.names[min(row[start], row[end - (1 << level) + 1])]
+
+    def attributes(self, name):
+        return self._attributes[self._ids[name]]
+
+    def lookup_attribute(self, name, attribute):
+        return self._attribute_maps[self._ids[name]].get(attribute)
+
+    def dispatch_table(self, name):
+        return self._methods[self._ids[name]]
+
+    def lookup_method(self, name, method):
+        return self._method_maps[self._ids[name]].get(method)
+
+
+def build_environment(program, lines = None):
+    '''
+    Reads the class headers and feature signatures of a program, checks them and builds its
+    ClassEnvironment. Iterative, like the rest of the analysis.
+
+    The checks are those of the Cool manual on classes and features: no class is defined twice
+    or named SELF_TYPE, no basic class is redefined or inherited from, every parent exists and the
+    inheritance graph has no cycle, attributes are not redefined, method overrides keep the
+    signature of the overridden method, and Main defines main(). Errors do not stop the analysis:
+    a class with an invalid parent is attached to Object, and an invalid feature is left out, so
+    the rest of the program can still be checked.
+
+    Parameters
+    ----------
+    program : AST.Program
+        The program.
+    lines : spans.LineIndex, optional
+        The line index of the source, to give diagnostics line numbers.
+
+    Returns
+    -------
+    (ClassEnvironment, list, list)
+        The environment, the AST.Class nodes it was built from (builtins first, then the classes
+        of the program that were not rejected, in source order) and the diagnostics.
+    '''
+    diagnostics = []
+
+    def error(message, node):
+        diagnostics.append(node_diagnostic('semantic', message, node, lines))
+
+    nodes = {}
+    for class_node in builtin_classes():
+        nodes[class_node.name] = class_node
+    for class_node in program.classes:
+        if class_node.name == SELF_TYPE:
+            error('SELF_TYPE cannot be used as a class name.', class_node)
+        elif class_node.name in BUILTIN_CLASSES:
+            error(f'Redefinition of basic class {class_node.name}.', class_node)
+        elif class_node.name in nodes:
+            error(f'Class {class_node.name} was previously defined.', class_node)
+        else:
+            nodes[class_node.name] = class_node
+
+    parents = {}
+    for name, class_node in nodes.items():
+        parent = class_node.parent
+        if parent is None:
+            parents[name] = None
+        elif parent in BASIC_CLASSES or parent == SELF_TYPE:
+            error(f'Class {name} cannot inherit class {parent}.', class_node)
+            parents[name] = 'Object'
+        elif parent not in nodes:
+            error(f'Class {name} inherits from an undefined class {parent}.', class_node)
+            parents[name] = 'Object'
+        else:
+            parents[name] = parent
+
+    # Follow the parent chains, marking the classes of the current chain, to find the cycles.
+    state = dict.fromkeys(nodes, 0)     # 0 unvisited, 1 on the current chain, 2 done
+    for name in nodes:
+        chain = []
+        current = name
+        while current is not None and state[current] == 0:
+            state[current] = 1
+            chain.append(current)
+            current = parents[current]
+        if current is not None and state[current] == 1:
+            cycle = set(chain[chain.index(current):])
+            for member in nodes:
+                if member in cycle:
+                    error(f'Class {member}, or an ancestor of {member}, is involved in an '
+                          f'inheritance cycle.', nodes[member])
+            for member in cycle:
+                parents[member] = 'Object'
+        for member in chain:
+            state[member] = 2
+
+    children = {name: [] for name in nodes}
+    for name, parent in parents.items():
+        if parent is not None:
+            children[parent].append(name)
+
+    names = []
+    stack = ['Object']
+    while stack:
+        name = stack.pop()
+        names.append(name)
+        stack.extend(reversed(children[name]))
+    ids = {name: i for i, name in enumerate(names)}
+
+    def type_exists(type_name, allow_self_type = True):
+        return type_name in nodes or (allow_self_type and type_name == SELF_TYPE)
+
+    layouts = []
+    tables = []
+    for name in names:
+        class_node = nodes[name]
+        parent = parents[name]
+        layout = list(layouts[ids[parent]]) if parent is not None else []
+        table = list(tables[ids[parent]]) if parent is not None else []
+        layout_names = {info.name: info for info in layout}
+        table_names = {info.name: info for info in table}
+        own_attributes = set()
+        own_methods = set()
+
+        for feature in class_node.features:
+            if isinstance(feature, AST.Attribute):
+                if feature.name == 'self':
+                    error('\'self\' cannot be the name of an attribute.', feature)
+                elif feature.name in own_attributes:
+                    error(f'Attribute {feature.name} is multiply defined in class {name}.', feature)
+                elif feature.name in layout_names:
+                    error(f'Attribute {feature.name} is an attribute of an inherited class.', feature)
+                else:
+                    if not type_exists(feature.attribute_type):
+                        error(f'Class {feature.attribute_type} of attribute {feature.name} is '
+                              f'undefined.', feature)
+                    info = AttributeInfo(feature.name, name, feature.attribute_type, len(layout))
+                    layout.append(info)
+                    layout_names[feature.name] = info
+                    own_attributes.add(feature.name)
+
+            elif isinstance(feature, AST.Method):
+                if feature.name in own_methods:
+                    error(f'Method {feature.name} is multiply defined in class {name}.', feature)
+                    continue
+                own_methods.add(feature.name)
+
+                formal_names = []
+                formal_types = []
+                for formal in feature.formal_parameters:
+                    if formal.name == 'self':
+                        error('\'self\' cannot be the name of a formal parameter.', formal)
+                    elif formal.name in formal_names:
+                        error(f'Formal parameter {formal.name} is multiply defined.', formal)
+                    if formal.parameter_type == SELF_TYPE:
+                        error(f'Formal parameter {formal.name} cannot have type SELF_TYPE.', formal)
+                    elif not type_exists(formal.parameter_type):
+                        error(f'Class {formal.parameter_type} of formal parameter {formal.name} is '
+                              f'undefined.', formal)
+                    formal_names.append(formal.name)
+                    formal_types.append(formal.parameter_type)
+                if not type_exists(feature.return_type):
+                    error(f'Undefined return type {feature.return_type} in method {feature.name}.',
+                          feature)
+
+                inherited = table_names.get(feature.name)
+                if inherited is not None:
+                    if len(inherited.formal_types) != len(formal_types):
+                        error(f'Incompatible number of formal parameters in redefined method '
+                              f'{feature.name}.', feature)
+                        continue
+                    mismatch = [(old, new) for old, new in zip(inherited.formal_types, formal_types)
+                                if old != new]
+                    if mismatch:
+                        error(f'In redefined method {feature.name}, parameter type {mismatch[0][1]} '
+                              f'is different from original type {mismatch[0][0]}.', feature)
+                        continue
+                    if inherited.return_type != feature.return_type:
+                        error(f'In redefined method {feature.name}, return type '
+                              f'{feature.return_type} is different from original return type '
+                              f'{inherited.return_type}.', feature)
+                        continue
+                    slot = inherited.slot
+                else:
+                    slot = len(table)
+                    table.append(None)
+
+                info = MethodInfo(feature.name, name, tuple(formal_names), tuple(formal_types),
+                                  feature.return_type, slot)
+                table[slot] = info
+                table_names[feature.name] = info
+
+        layouts.append(tuple(layout))
+        tables.append(tuple(table))
+
+    environment = ClassEnvironment(names, [ids[parents[name]] if parents[name] is not None else -1
+                                           for name in names], layouts, tables)
+
+    main = nodes.get('Main')
+    if main is None:
+        diagnostics.append(node_diagnostic('semantic', 'Class Main is not defined.', program, lines))
+    else:
+        info = environment.lookup_method('Main', 'main')
+        if info is None:
+            error('No \'main\' method in class Main.', main)
+        elif info.formal_types:
+            error('\'main\' method in class Main should have no arguments.', main)
+
+    classes = [nodes[name] for name in BUILTIN_CLASSES]
+    classes += [node for node in program.classes if nodes.get(node.name) is node]
+    return environment, classes, diagnostics
+
+
+# Operations of the work stack of TypeChecker.check_expression().
+_VISIT, _EXIT, _BIND, _UNBIND = range(4)
+
+_ARITHMETIC = {AST.Addition: '+', AST.Subtraction: '-', AST.Multiplication: '*', AST.Division: '/'}
+_COMPARISON = {AST.LessThan: '<', AST.LessThanOrEqual: '<='}
+
+
+class TypeChecker:
+    '''
+    TypeChecker infers the static type of every expression of the classes of a program and
+    checks them against the typing rules of the Cool manual.
+
+    ...
+
+    Expressions are checked with an explicit work stack, so deeply nested programs do not hit the
+    recursion limit: visiting a node schedules its children, and the node itself is typed once
+    the types of its children are on the value stack. Variables introduced by let, case branches
+    and formal parameters are bound and unbound by work items of their own, around the
+    expressions they scope. Every ill-typed expression is reported, and given the type Object so
+    that the check goes on.
+
+    Attributes
+    ----------
+    environment : ClassEnvironment
+        The classes of the program.
+    types : dict
+        The static type of every expression checked so far (nodes are keys).
+    diagnostics : list
+        The errors found so far.
+
+    Methods
+    -------
+    check_class(class_node)
+        Checks the attribute initializers and method bodies of a class.
+    check_expression(expression, class_name, scope)
+        Checks an expression and returns its type.
+    conforms(child, ancestor, class_name)
+        Conformance, SELF_TYPE included.
+    lub(first, second, class_name)
+        The least upper bound, SELF_TYPE included.
+    '''
+
+    def __init__(self, environment, lines = None):
+        '''
+        Parameters
+        ----------
+        environment : ClassEnvironment
+            The classes of the program.
+        lines : spans.LineIndex, optional
+            The line index of the source, to give diagnostics line numbers.
+        '''
+        self.environment = environment
+        self.types = {}
+        self.diagnostics = []
+        self._lines = lines
+        self._handlers = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                handler = getattr(self, '_exit_' + kind.__name__, None)
+                if handler is not None:
+                    self._handlers[kind] = handler
+
+    def error(self, message, node):
+        self.diagnostics.append(node_diagnostic('semantic', message, node, self._lines))
+
+    def type_exists(self, type_name):
+        return type_name == SELF_TYPE or type_name in self.environment
+
+    def conforms(self, child, ancestor, class_name):
+        if ancestor == SELF_TYPE:
+            return child == SELF_TYPE
+        if child == SELF_TYPE:
+            child = class_name
+        if child not in self.environment or ancestor not in self.environment:
+            # Undefined types have been reported already.
+            return True
+        return self.environment.conforms(child, ancestor)
+
+    def lub(self, first, second, class_name):
+        if first == second:
+            return first
+        first = class_name if first == SELF_TYPE else first
+        second = class_name if second == SELF_TYPE else second
+        if first not in self.environment or second not in self.environment:
+            return 'Object'
+        return self.environment.lub(first, second)
+
+    def check_class(self, class_node):
+        name = class_node.name
+        for feature in class_node.features:
+            if isinstance(feature, AST.Attribute):
+                if feature.expression is None:
+                    continue
+                expression_type = self.check_expression(feature.expression, name)
+                if not self.conforms(expression_type, feature.attribute_type, name):
+                    self.error(f'Inferred type {expression_type} of initialization of attribute '
+                               f'{feature.name} does not conform to declared type '
+                               f'{feature.attribute_type}.', feature)
+
+            elif isinstance(feature, AST.Method):
+                if feature.body is None:
+                    continue
+                scope = {}
+                for formal in feature.formal_parameters:
+                    if formal.name != 'self' and formal.name not in scope:
+                        formal_type = formal.parameter_type
+                        scope[formal.name] = [formal_type if formal_type in self.environment else 'Object']
+                body_type = self.check_expression(feature.body, name, scope)
+                if self.type_exists(feature.return_type) and \
+                        not self.conforms(body_type, feature.return_type, name):
+                    self.error(f'Inferred return type {body_type} of method {feature.name} does not '
+                               f'conform to declared return type {feature.return_type}.', feature)
+
+    def check_expression(self, expression, class_name, scope = None):
+        '''
+        Returns the static type of an expression of class class_name, recording the types of all
+        its subexpressions. scope maps the names of the variables in scope (besides the attributes
+        of the class) to a list whose last item is their type.
+        '''
+        self._class_name = class_name
+        self._scope = scope if scope is not None else {}
+        types = self.types
+        handlers = self._handlers
+        values = []
+        work = [(_VISIT, expression)]
+
+        while work:
+            operation, item = work.pop()
+
+            if operation == _VISIT:
+                kind = item.__class__
+                if kind is AST.Integer:
+                    values.append('Int')
+                    types[item] = 'Int'
+                elif kind is AST.Object or kind is AST.Self or kind is AST.NewObject or \
+                        kind is AST.String or kind is AST.Boolean:
+                    item_type = handlers[kind](item, ())
+                    values.append(item_type)
+                    types[item] = item_type
+                else:
+                    work.append((_EXIT, item))
+                    self._schedule(item, work)
+
+            elif operation == _EXIT:
+                count = self._child_count(item)
+                if count:
+                    children = values[-count:]
+                    del values[-count:]
+                else:
+                    children = ()
+                handler = handlers.get(item.__class__)
+                if handler is None:
+                    self.error(f'Unexpected node {item.class_name} in an expression.', item)
+                    item_type = 'Object'
+                else:
+                    item_type = handler(item, children)
+                values.append(item_type)
+                types[item] = item_type
+
+            elif operation == _BIND:
+                name, bound_type = item
+                self._scope.setdefault(name, []).append(bound_type)
+
+            else:
+                bindings = self._scope[item]
+                bindings.pop()
+                if not bindings:
+                    del self._scope[item]
+
+        return values[-1]
+
+    def _schedule(self, node, work):
+        '''Pushes the work items of the children of node (the first child is popped first).'''
+        kind = node.__class__
+        if kind is AST.Let:
+            declared = node.return_type if self.type_exists(node.return_type) else 'Object'
+            work.append((_UNBIND, node.instance))
+            work.append((_VISIT, node.body))
+            work.append((_BIND, (node.instance, declared)))
+            if node.expression is not None:
+                work.append((_VISIT, node.expression))
+        elif kind is AST.Case:
+            for name, action_type, body in reversed([case_branch(action) for action in node.actions]):
+                bound = action_type if action_type in self.environment else 'Object'
+                work.append((_UNBIND, name))
+                work.append((_VISIT, body))
+                work.append((_BIND, (name, bound)))
+            work.append((_VISIT, node.expression))
+        elif kind is AST.DynamicDispatch or kind is AST.StaticDispatch:
+            for argument in reversed(node.arguments):
+                work.append((_VISIT, argument))
+            work.append((_VISIT, node.instance))
+        elif kind is AST.Block:
+            for expression in reversed(node.expression_list):
+                work.append((_VISIT, expression))
+        elif kind is AST.If:
+            work.append((_VISIT, node.else_body))
+            work.append((_VISIT, node.then_body))
+            work.append((_VISIT, node.predicate))
+        elif kind is AST.WhileLoop:
+            work.append((_VISIT, node.body))
+            work.append((_VISIT, node.predicate))
+        elif kind is AST.Assignment or kind is AST.IsVoid:
+            work.append((_VISIT, node.expression))
+        elif kind is AST.IntegerComplement:
+            work.append((_VISIT, node.integer_expression))
+        elif kind is AST.BooleanComplement:
+            work.append((_VISIT, node.boolean_expression))
+        elif hasattr(node, 'first'):
+            work.append((_VISIT, node.second))
+            work.append((_VISIT, node.first))
+
+    def _child_count(self, node):
+        kind = node.__class__
+        if kind is AST.Let:
+            return 1 if node.expression is None else 2
+        if kind is AST.Case:
+            return 1 + len(node.actions)
+        if kind is AST.DynamicDispatch or kind is AST.StaticDispatch:
+            return 1 + len(node.arguments)
+        if kind is AST.Block:
+            return len(node.expression_list)
+        if kind is AST.If:
+            return 3
+        if kind is AST.WhileLoop or hasattr(node, 'first'):
+            return 2
+        if kind in (AST.Assignment, AST.IsVoid, AST.IntegerComplement, AST.BooleanComplement):
+            return 1
+        return 0
+
+    def _lookup_variable(self, name):
+        bindings = self._scope.get(name)
+        if bindings:
+            return bindings[-1]
+        if self._class_name in self.environment:
+            info = self.environment.lookup_attribute(self._class_name, name)
+            if info is not None:
+                return info.type if self.type_exists(info.type) else 'Object'
+        return None
+
+    def _exit_Object(self, node, children):
+        variable_type = self._lookup_variable(node.name)
+        if variable_type is None:
+            self.error(f'Undeclared identifier {node.name}.', node)
+            return 'Object'
+        return variable_type
+
+    def _exit_Self(self, node, children):
+        return SELF_TYPE
+
+    def _exit_String(self, node, children):
+        return 'String'
+
+    def _exit_Boolean(self, node, children):
+        return 'Bool'
+
+    def _exit_NewObject(self, node, children):
+        if not self.type_exists(node.type):
+            self.error(f'\'new\' used with undefined class {node.type}.', node)
+            return 'Object'
+        return node.type
+
+    def _exit_IsVoid(self, node, children):
+        return 'Bool'
+
+    def _exit_Assignment(self, node, children):
+        name = node.instance.name
+        expression_type = children[0]
+        if name == 'self':
+            self.error('Cannot assign to \'self\'.', node)
+            return expression_type
+        variable_type = self._lookup_variable(name)
+        if variable_type is None:
+            self.error(f'Assignment to undeclared variable {name}.', node)
+            return expression_type
+        self.types[node.instance] = variable_type
+        if not self.conforms(expression_type, variable_type, self._class_name):
+            self.error(f'Type {expression_type} of assigned expression does not conform to declared '
+                       f'type {variable_type} of identifier {name}.', node)
+        return expression_type
+
+    def _exit_Block(self, node, children):
+        return children[-1] if children else 'Object'
+
+    def _check_arguments(self, node, info, argument_types):
+        if len(argument_types) != len(info.formal_types):
+            self.error(f'Method {node.method} called with wrong number of arguments.', node)
+            return
+        for formal_name, formal_type, argument_type in zip(info.formal_names, info.formal_types,
+                                                           argument_types):
+            if not self.conforms(argument_type, formal_type, self._class_name):
+                self.error(f'In call of method {node.method}, type {argument_type} of parameter '
+                           f'{formal_name} does not conform to declared type {formal_type}.', node)
+
+    def _exit_DynamicDispatch(self, node, children):
+        instance_type = children[0]
+        lookup_type = self._class_name if instance_type == SELF_TYPE else instance_type
+        if lookup_type not in self.environment:
+            return 'Object'
+        info = self.environment.lookup_method(lookup_type, node.method)
+        if info is None:
+            self.error(f'Dispatch to undefined method {node.method}.', node)
+            return 'Object'
+        self._check_arguments(node, info, children[1:])
+        if info.return_type == SELF_TYPE:
+            return instance_type
+        return info.return_type if info.return_type in self.environment else 'Object'
+
+    def _exit_StaticDispatch(self, node, children):
+        instance_type = children[0]
+        dispatch_type = node.dispatch_type
+        if dispatch_type == SELF_TYPE:
+            self.error('Static dispatch to SELF_TYPE.', node)
+            return 'Object'
+        if dispatch_type not in self.environment:
+            self.error(f'Static dispatch to undefined class {dispatch_type}.', node)
+            return 'Object'
+        if not self.conforms(instance_type, dispatch_type, self._class_name):
+            self.error(f'Expression type {instance_type} does not conform to declared static '
+                       f'dispatch type {dispatch_type}.', node)
+        info = self.environment.lookup_method(dispatch_type, node.method)
+        if info is None:
+            self.error(f'Static dispatch to undefined method {node.method}.', node)
+            return 'Object'
+        self._check_arguments(node, info, children[1:])
+        if info.return_type == SELF_TYPE:
+            return instance_type
+        return info.return_type if info.return_type in self.environment else 'Object'
+
+    def _exit_Let(self, node, children):
+        if node.instance == 'self':
+            self.error('\'self\' cannot be bound in a \'let\' expression.', node)
+        if not self.type_exists(node.return_type):
+            self.error(f'Class {node.return_type} of let-bound identifier {node.instance} is '
+                       f'undefined.', node)
+        elif node.expression is not None and \
+                not self.conforms(children[0], node.return_type, self._class_name):
+            self.error(f'Inferred type {children[0]} of initialization of {node.instance} does not '
+                       f'conform to identifier\'s declared type {node.return_type}.', node)
+        return children[-1]
+
+    def _exit_If(self, node, children):
+        if children[0] != 'Bool':
+            self.error('Predicate of \'if\' does not have type Bool.', node)
+        return self.lub(children[1], children[2], self._class_name)
+
+    def _exit_WhileLoop(self, node, children):
+        if children[0] != 'Bool':
+            self.error('Loop condition does not have type Bool.', node)
+        return 'Object'
+
+    def _exit_Case(self, node, children):
+        seen = set()
+        for name, action_type, _ in (case_branch(action) for action in node.actions):
+            if name == 'self':
+                self.error('\'self\' bound in \'case\'.', node)
+            if action_type == SELF_TYPE:
+                self.error(f'Identifier {name} declared with type SELF_TYPE in case branch.', node)
+            elif action_type not in self.environment:
+                self.error(f'Class {action_type} of case branch is undefined.', node)
+            if action_type in seen:
+                self.error(f'Duplicate branch {action_type} in case statement.', node)
+            seen.add(action_type)
+
+        result = children[1]
+        for branch_type in children[2:]:
+            result = self.lub(result, branch_type, self._class_name)
+        return result
+
+    def _exit_IntegerComplement(self, node, children):
+        if children[0] != 'Int':
+            self.error(f'Argument of \'~\' has type {children[0]} instead of Int.', node)
+        return 'Int'
+
+    def _exit_BooleanComplement(self, node, children):
+        if children[0] != 'Bool':
+            self.error(f'Argument of \'not\' has type {children[0]} instead of Bool.', node)
+        return 'Bool'
+
+    def _arithmetic(self, node, children):
+        if children[0] != 'Int' or children[1] != 'Int':
+            self.error(f'non-Int arguments: {children[0]} {_ARITHMETIC[node.__class__]} '
+                       f'{children[1]}', node)
+        return 'Int'
+
+    def _comparison(self, node, children):
+        if children[0] != 'Int' or children[1] != 'Int':
+            self.error(f'non-Int arguments: {children[0]} {_COMPARISON[node.__class__]} '
+                       f'{children[1]}', node)
+        return 'Bool'
+
+    _exit_Addition = _exit_Subtraction = _exit_Multiplication = _exit_Division = _arithmetic
+    _exit_LessThan = _exit_LessThanOrEqual = _comparison
+
+    def _exit_Equal(self, node, children):
+        first, second = children
+        if (first in BASIC_CLASSES or second in BASIC_CLASSES) and first != second:
+            self.error('Illegal comparison with a basic type.', node)
+        return 'Bool'
+
+
+def case_branch(action):
+    '''Returns the (name, type, body) of a case branch (a tuple, or an AST.Action).'''
+    if isinstance(action, AST.Action):
+        return action.name, action.action_type, action.body
+    return action
+
+
+# The state of a worker process of analyze(workers = ...), set by _init_checker_worker(): the
+# classes to check and a TypeChecker on the ClassEnvironment of the program.
+_worker_classes = None
+_worker_checker = None
+
+
+def _init_checker_worker(environment, classes, lines):
+    global _worker_classes, _worker_checker
+    _worker_classes = classes
+    _worker_checker = TypeChecker(environment, lines)
+
+
+def _check_in_worker(first, last):
+    '''
+    Checks the classes first ... last - 1. Returns their diagnostics and, for every class, the
+    types of its nodes in the order of helpers.iter_nodes() (None for nodes without a type):
+    the caller has its own copies of the nodes, so they cannot be dictionary keys.
+    '''
+    checker = _worker_checker
+    checker.types = {}
+    checker.diagnostics = []
+    types = []
+    for class_node in _worker_classes[first:last]:
+        checker.check_class(class_node)
+        types.append([checker.types.get(node) for node in iter_nodes(class_node)])
+    return checker.diagnostics, types
+
+
+def _check_in_parallel(environment, classes, lines, workers):
+    '''Checks the classes on a pool of worker processes, like TypeChecker.check_class() on every
+    class in order. Returns the types and diagnostics.'''
+    from concurrent.futures import ProcessPoolExecutor
+
+    # A few chunks per worker balance the load; the chunks are contiguous and merged in order, so
+    # the diagnostics come out in the order of a serial check.
+    size = max(1, -(-len(classes) // (4 * workers)))
+    bounds = [(first, min(first + size, len(classes))) for first in range(0, len(classes), size)]
+    types = {}
+    diagnostics = []
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_checker_worker,
+                             initargs = (environment, classes, lines)) as executor:
+        results = executor.map(_check_in_worker, *zip(*bounds))
+        for (first, last), (chunk_diagnostics, chunk_types) in zip(bounds, results):
+            diagnostics.extend(chunk_diagnostics)
+            for class_node, class_types in zip(classes[first:last], chunk_types):
+                for node, node_type in zip(iter_nodes(class_node), class_types):
+                    if node_type is not None:
+                        types[node] = node_type
+    return types, diagnostics
+
+
+def analyze(program, source_code = None, workers = None) -> SemanticResult:
+    '''
+    Checks a parsed program: builds its ClassEnvironment (see build_environment()) then type
+    checks every class of the program.
+
+    Once the environment is built, the classes can be checked independently: with workers, they
+    are checked on a pool of worker processes that receive the environment and the classes once,
+    at startup, and the results are merged in class order, so the diagnostics and types are the
+    same as those of a serial check. This pays off on programs with thousands of classes.
+
+    Parameters
+    ----------
+    program : AST.Program
+        The program.
+    source_code : str, optional
+        The source of the program, to give diagnostics line numbers.
+    workers : int, optional
+        The number of worker processes checking the classes. Defaults to checking them in this
+        process.
+
+    Returns
+    -------
+    SemanticResult
+        The program, its environment, the static types of its expressions and the diagnostics
+        (empty if the program is correct).
+    '''
+    lines = LineIndex(source_code) if source_code is not None else None
+    environment, classes, diagnostics = build_environment(program, lines)
+
+    if workers is not None and workers > 1:
+        types, class_diagnostics = _check_in_parallel(environment, classes, lines, workers)
+        return SemanticResult(program, environment, types, diagnostics + class_diagnostics)
+
+    checker = TypeChecker(environment, lines)
+    for class_node in classes:
+        checker.check_class(class_node)
+
+    return SemanticResult(program, environment, checker.types, diagnostics + checker.diagnostics)
+
+
+if __name__ == '__main__':
+    import sys
+
+    from parser import CoolPyParser
+
+    if len(sys.argv) < 2 or not str(sys.argv[1]).endswith('.cl'):
+        print('Provide the path to the Cool program source file.')
+        print('Usage: python semant.py <file_name.cl>')
+        exit()
+
+    with open(sys.argv[1], 'r') as file:
+        source_code = file.read()
+
+    parser = CoolPyParser(build_parser = True)
+    program = parser.parse(source_code)
+    for error in parser.error_list:
+        print(error)
+    if program is None or parser.error_list:
+        exit(1)
+
+    result = analyze(program, source_code)
+    for diagnostic in result.diagnostics:
+        print(diagnostic)
+    if result.diagnostics:
+        exit(1)
+    print(f'{sys.argv[1]}: {len(program.classes)} classes, no semantic errors.')
@@ -0,0 +1,191 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from helpers import iter_nodes
+
+
+class LineIndex:
+    '''
+    LineIndex converts source offsets to line and column numbers and back.
+
+    ...
+
+    The offsets at which the lines of the source start are computed once, so every conversion is a
+    binary search (offset to line) or an array lookup (line to offset). Lines and columns are
+    numbered from 1, like the line numbers of the lexer; offsets count characters from 0.
+
+    Attributes
+    ----------
+    line_starts : array('q')
+        Offset of the first character of every line.
+    length : int
+        Length of the source.
+
+    Methods
+    -------
+    line_of(offset)
+        The line containing an offset.
+    line_col(offset)
+        The (line, column) pair of an offset.
+    offset(line, column)
+        The offset of a (line, column) pair.
+    line_span(line)
+        The (start, end) offsets of a line, end excluded (the newline belongs to the line).
+    '''
+
+    def __init__(self, source_code: str):
+        line_starts = array('q', [0])
+        find = source_code.find
+        position = find('\n')
+        while position != -1:
+            line_starts.append(position + 1)
+            position = find('\n', position + 1)
+
+        self.line_starts = line_starts
+        self.length = len(source_code)
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def line_of(self, offset):
+        return bisect_right(self.line_starts, offset)
+
+    def line_col(self, offset):
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def offset(self, line, column = 1):
+        if not 1 <= line <= len(self.line_starts):
+            raise ValueError(f'Line {line} is out of range (1-{len(self.line_starts)}).')
+        return self.line_starts[line - 1] + column - 1
+
+    def line_span(self, line):
+        start = self.offset(line)
+        end = self.line_starts[line] if line < len(self.line_starts) else self.length
+        return start, end
+
+
+class SpanIndex:
+    '''
+    SpanIndex answers position queries over a parsed program without walking the tree.
+
+    ...
+
+    It is built once from the start and end offsets the parser records on every node. The nodes
+    are kept sorted by start offset, and the source is cut into segments, each one labelled with
+    the innermost node covering it, so that:
+
+        node_at(offset)         the innermost node containing an offset,
+        nodes_in_range(a, b)    the nodes starting in [a, b),
+        nodes_on_line(line)     the nodes starting on a line,
+
+    are all binary searches, O(log n) plus the size of the answer. enclosing(offset) then follows
+    the recorded parent links, O(depth).
+
+    Attributes
+    ----------
+    lines : LineIndex
+        The line table of the source.
+    nodes : list
+        The located nodes, sorted by start offset (outer nodes before the inner nodes sharing
+        their start).
+    starts : array('q')
+        The start offsets of nodes.
+
+    Methods
+    -------
+    node_at(offset)
+        The innermost node whose span contains offset, or None.
+    node_at_line_col(line, column)
+        Same as node_at(), for a line and a column.
+    enclosing(offset)
+        The nodes whose span contains offset, from the innermost to the outermost.
+    nodes_in_range(start, end)
+        The nodes starting in [start, end), in source order.
+    nodes_on_line(line)
+        The nodes starting on a line, in source order.
+    line_col(node)
+        The (line, column) of the start of a node.
+    '''
+
+    def __init__(self, program, source_code: str):
+        '''
+        Parameters
+        ----------
+        program : AST.Program
+            A program returned by CoolPyParser.parse(). Nodes without a span are left out.
+        source_code : str
+            The source it was parsed from.
+        '''
+        self.lines = LineIndex(source_code)
+
+        # Preorder, then a stable sort: a node comes before the nodes it contains.
+        nodes = [node for node in iter_nodes(program) if node.start is not None]
+        nodes.sort(key = lambda node: (node.start, -node.end))
+        self.nodes = nodes
+        self.starts = array('q', (node.start for node in nodes))
+
+        # Sweep the nodes with the stack of the open ones; every time the innermost open node
+        # changes, a segment starts. Segment i is [bounds[i], bounds[i + 1]) and owners[i] is the
+        # index of the innermost node covering it (-1 between top-level nodes). The sweep also
+        # records the index of the parent of every node (-1 for the outermost ones).
+        bounds = array('q')
+        owners = array('i')
+        parents = array('i', [-1]) * len(nodes)
+
+        def cut(position, owner):
+            if bounds and bounds[-1] == position:
+                owners[-1] = owner
+            else:
+                bounds.append(position)
+                owners.append(owner)
+
+        stack = []
+        for i, node in enumerate(nodes):
+            while stack and nodes[stack[-1]].end <= node.start:
+                closed = stack.pop()
+                cut(nodes[closed].end, stack[-1] if stack else -1)
+            if stack:
+                parents[i] = stack[-1]
+            cut(node.start, i)
+            stack.append(i)
+        while stack:
+            closed = stack.pop()
+            cut(nodes[closed].end, stack[-1] if stack else -1)
+
+        self._bounds = bounds
+        self._owners = owners
+        self._parents = parents
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _index_at(self, offset):
+        segment = bisect_right(self._bounds, offset) - 1
+        return self._owners[segment] if segment >= 0 else -1
+
+    def node_at(self, offset):
+        i = self._index_at(offset)
+        return self.nodes[i] if i >= 0 else None
+
+    def node_at_line_col(self, line, column):
+        return self.node_at(self.lines.offset(line, column))
+
+    def enclosing(self, offset):
+        chain = []
+        i = self._index_at(offset)
+        while i >= 0:
+            chain.append(self.nodes[i])
+            i = self._parents[i]
+        return chain
+
+    def nodes_in_range(self, start, end):
+        first = bisect_left(self.starts, start)
+        last = bisect_left(self.starts, end)
+        return self.nodes[first:last]
+
+    def nodes_on_line(self, line):
+        return self.nodes_in_range(*self.lines.line_span(line))
+
+    def line_col(self, node):
+        return self.lines.line_col(node.start)
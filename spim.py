@@ -0,0 +1,470 @@
+import re
+import struct
+import sys
+
+from runtime import Runtime
+
+
+# Memory map of SPIM: the text segment, the data segment (followed by the heap grown with sbrk)
+# and the stack, growing down from STACK_TOP.
+TEXT_BASE = 0x00400000
+DATA_BASE = 0x10010000
+STACK_TOP = 0x7ffffffc
+DEFAULT_STACK_SIZE = 64 * 1024 * 1024
+
+REGISTERS = {name: number for number, name in enumerate(
+    ['zero', 'at', 'v0', 'v1', 'a0', 'a1', 'a2', 'a3', 't0', 't1', 't2', 't3', 't4', 't5', 't6', 't7',
+     's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7', 't8', 't9', 'k0', 'k1', 'gp', 'sp', 'fp', 'ra'])}
+REGISTERS.update({str(number): number for number in range(32)})
+
+# The instructions of the simulator (SPIM pseudo-instructions included), with the kinds of their
+# operands: r a register, i an immediate, a an address (label or immediate), m a memory operand
+# (offset(register) or label), l a text label, x a register or an immediate.
+INSTRUCTIONS = {
+    'add': 'rrr', 'addu': 'rrr', 'sub': 'rrr', 'subu': 'rrr', 'mul': 'rrr', 'div': 'rrr', 'rem': 'rrr',
+    'and': 'rrr', 'or': 'rrr', 'xor': 'rrr', 'nor': 'rrr', 'slt': 'rrr', 'sltu': 'rrr', 'seq': 'rrr',
+    'sllv': 'rrr', 'srlv': 'rrr',
+    'addi': 'rri', 'addiu': 'rri', 'andi': 'rri', 'ori': 'rri', 'xori': 'rri', 'slti': 'rri',
+    'sll': 'rri', 'srl': 'rri', 'sra': 'rri',
+    'neg': 'rr', 'negu': 'rr', 'not': 'rr', 'move': 'rr',
+    'li': 'ri', 'la': 'ra', 'lui': 'ri',
+    'lw': 'rm', 'sw': 'rm', 'lb': 'rm', 'lbu': 'rm', 'sb': 'rm',
+    'b': 'l', 'j': 'l', 'jal': 'l', 'jr': 'r', 'jalr': 'r',
+    'beq': 'rxl', 'bne': 'rxl', 'blt': 'rxl', 'ble': 'rxl', 'bgt': 'rxl', 'bge': 'rxl',
+    'beqz': 'rl', 'bnez': 'rl', 'bltz': 'rl', 'blez': 'rl', 'bgtz': 'rl', 'bgez': 'rl',
+    'syscall': '', 'nop': '',
+}
+OPCODES = {name: number for number, name in enumerate(INSTRUCTIONS)}
+# _ADD, _LW...: the opcode of every instruction. The simulator tests ranges of opcodes, so the
+# order of INSTRUCTIONS groups the instructions by operand kinds.
+globals().update({'_' + name.upper(): number for name, number in OPCODES.items()})
+
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s,]+')
+_MEMORY = re.compile(r'^(-?\w*)\((\$\w+)\)$')
+_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"', '0': '\0', 'r': '\r'}
+_WORD = struct.Struct('<i')
+
+
+def _wrap(value):
+    return ((value + 0x80000000) & 0xffffffff) - 0x80000000
+
+
+def _unescape(literal):
+    out = []
+    characters = iter(literal[1:-1])
+    for character in characters:
+        if character == '\\':
+            escaped = next(characters)
+            out.append(_ESCAPES.get(escaped, escaped))
+        else:
+            out.append(character)
+    return ''.join(out)
+
+
+class Executable:
+    '''
+    An assembled program: the decoded instructions of the text segment, the initial data segment
+    and the addresses of the labels.
+
+    Attributes
+    ----------
+    text : list
+        The instructions, as tuples (opcode, operand...) with registers as numbers, labels
+        resolved to addresses (data) or instruction numbers (branches) and memory operands as
+        (offset, base register) pairs.
+    source : list
+        The source line of every instruction, for error messages.
+    data : bytearray
+        The data segment.
+    labels : dict
+        The address of every label.
+    '''
+
+    def __init__(self, text, source, data, labels):
+        self.text = text
+        self.source = source
+        self.data = data
+        self.labels = labels
+
+
+def assemble(source_code: str) -> Executable:
+    '''
+    Assembles a program in the subset of the SPIM assembly language listed in INSTRUCTIONS, with
+    the directives .data, .text, .globl, .align, .word, .byte, .ascii, .asciiz and .space.
+    Raises an Exception on errors.
+    '''
+    lines = []
+    for number, line in enumerate(source_code.splitlines(), start = 1):
+        # Comments start with # outside of string literals.
+        tokens = []
+        for match in _TOKEN.finditer(line):
+            token = match.group()
+            if token.startswith('#'):
+                break
+            tokens.append(token)
+        while tokens and tokens[0].endswith(':'):
+            lines.append((number, [tokens.pop(0)]))
+        if tokens:
+            lines.append((number, tokens))
+
+    # First pass: addresses of the labels and contents of the data segment.
+    labels = {}
+    data = bytearray()
+    words = []
+    text = []
+    segment = 'text'
+    for number, tokens in lines:
+        head = tokens[0]
+        if head.endswith(':'):
+            labels[head[:-1]] = TEXT_BASE + 4 * len(text) if segment == 'text' else DATA_BASE + len(data)
+        elif head == '.data':
+            segment = 'data'
+        elif head == '.text':
+            segment = 'text'
+        elif head in ('.globl', '.ent', '.end'):
+            pass
+        elif head == '.align':
+            alignment = 1 << int(tokens[1])
+            data.extend(bytes(-len(data) % alignment))
+        elif head == '.space':
+            data.extend(bytes(int(tokens[1], 0)))
+        elif head in ('.ascii', '.asciiz'):
+            data.extend(_unescape(tokens[1]).encode('utf-8'))
+            if head == '.asciiz':
+                data.append(0)
+        elif head == '.byte':
+            data.extend(int(value, 0) & 0xff for value in tokens[1:])
+        elif head == '.word':
+            # Labels are resolved once all are known.
+            for value in tokens[1:]:
+                words.append((len(data), value, number))
+                data.extend(bytes(4))
+        elif segment == 'text':
+            text.append((number, tokens))
+        else:
+            raise Exception(f'Line {number}: instruction {head} outside of the text segment.')
+
+    for offset, value, number in words:
+        _WORD.pack_into(data, offset, _wrap(_value(value, labels, number)))
+
+    # Second pass: decoding of the instructions.
+    instructions = []
+    source = []
+    for number, tokens in text:
+        name = tokens[0]
+        kinds = INSTRUCTIONS.get(name)
+        if kinds is None:
+            raise Exception(f'Line {number}: unknown instruction {name}.')
+        if len(tokens) - 1 != len(kinds):
+            raise Exception(f'Line {number}: {name} takes {len(kinds)} operands.')
+        operands = []
+        for kind, token in zip(kinds, tokens[1:]):
+            if kind == 'r':
+                operands.append(_register(token, number))
+            elif kind == 'i' or kind == 'a':
+                operands.append(_value(token, labels, number))
+            elif kind == 'x':
+                operands.append(('r', _register(token, number)) if token.startswith('$')
+                                else ('i', _value(token, labels, number)))
+            elif kind == 'l':
+                if token not in labels:
+                    raise Exception(f'Line {number}: unknown label {token}.')
+                operands.append((labels[token] - TEXT_BASE) >> 2)
+            else:
+                match = _MEMORY.match(token)
+                if match:
+                    operands.append((int(match.group(1) or '0', 0), _register(match.group(2), number)))
+                else:
+                    operands.append((_value(token, labels, number), 0))
+        instructions.append((OPCODES[name], *operands))
+        source.append(number)
+    return Executable(instructions, source, data, labels)
+
+
+def _register(token, number):
+    if not token.startswith('$') or token[1:] not in REGISTERS:
+        raise Exception(f'Line {number}: invalid register {token}.')
+    return REGISTERS[token[1:]]
+
+
+def _value(token, labels, number):
+    if token in labels:
+        return labels[token]
+    try:
+        return int(token, 0)
+    except ValueError:
+        raise Exception(f'Line {number}: unknown label or invalid number {token}.') from None
+
+
+class Simulator:
+    '''
+    Simulator runs an Executable, one instruction at a time.
+
+    ...
+
+    The memory is the data segment (extended by sbrk) and a stack of a fixed size; accesses
+    outside of them or misaligned words stop the simulation with an Exception naming the
+    instruction. The system calls are those of SPIM for printing and reading integers and
+    strings, sbrk and exit; integers are read like the other engines do (runtime.Runtime).
+
+    Attributes
+    ----------
+    registers : list
+        The 32 general registers.
+    executed : int
+        The number of instructions executed.
+
+    Methods
+    -------
+    run(entry = 'main', limit = None)
+        Runs from a label until exit (or a jump to address 0) and returns the exit status.
+    '''
+
+    def __init__(self, executable, stdin = None, stdout = None, stack_size = DEFAULT_STACK_SIZE):
+        self.executable = executable
+        self.stdin = stdin if stdin is not None else sys.stdin
+        self.stdout = stdout if stdout is not None else sys.stdout
+        self.data = bytearray(executable.data)
+        self.stack = bytearray(stack_size)
+        self.stack_base = STACK_TOP + 4 - stack_size
+        self.registers = [0] * 32
+        self.registers[REGISTERS['sp']] = STACK_TOP
+        self.executed = 0
+
+    def _locate(self, address, size, pc):
+        if address >= self.stack_base:
+            memory = self.stack
+            index = address - self.stack_base
+        else:
+            memory = self.data
+            index = address - DATA_BASE
+        if index < 0 or index + size > len(memory) or address & (size - 1):
+            raise Exception(f'Invalid memory access at {address:#010x} by the instruction of line '
+                            f'{self.executable.source[pc]}.')
+        return memory, index
+
+    def _string_at(self, address, pc):
+        memory, index = self._locate(address, 1, pc)
+        end = memory.index(0, index)
+        return memory[index:end].decode('utf-8', 'replace')
+
+    def _syscall(self, pc):
+        registers = self.registers
+        service = registers[2]
+        argument = registers[4]
+        if service == 1:
+            self.stdout.write(str(argument))
+        elif service == 4:
+            self.stdout.write(self._string_at(argument, pc))
+        elif service == 11:
+            self.stdout.write(chr(argument & 0xff))
+        elif service == 5:
+            registers[2] = Runtime(self.stdin, self.stdout).in_int(None)
+        elif service == 8:
+            # Like SPIM: at most length - 1 characters of the line, newline included.
+            length = registers[5]
+            line = self.stdin.readline().encode('utf-8')[:max(length - 1, 0)]
+            memory, index = self._locate(argument, 1, pc)
+            self._locate(argument + max(length, 1) - 1, 1, pc)
+            memory[index:index + len(line)] = line
+            memory[index + len(line)] = 0
+        elif service == 9:
+            registers[2] = DATA_BASE + len(self.data)
+            self.data.extend(bytes((argument + 3) & ~3))
+        elif service == 10:
+            return 0
+        elif service == 17:
+            return argument
+        else:
+            raise Exception(f'Unsupported system call {service} at line {self.executable.source[pc]}.')
+        return None
+
+    def run(self, entry = 'main', limit = None):
+        text = self.executable.text
+        registers = self.registers
+        locate = self._locate
+        unpack = _WORD.unpack_from
+        pack = _WORD.pack_into
+        pc = (self.executable.labels[entry] - TEXT_BASE) >> 2
+        # Returning from the entry point ends the program.
+        registers[31] = TEXT_BASE + 4 * len(text)
+        executed = 0
+        try:
+            while True:
+                if pc >= len(text):
+                    return 0
+                if limit is not None and executed >= limit:
+                    raise Exception(f'Instruction limit ({limit}) reached.')
+                instruction = text[pc]
+                op = instruction[0]
+                executed += 1
+                pc += 1
+                if op == _LW:
+                    offset, base = instruction[2]
+                    memory, index = locate(registers[base] + offset, 4, pc - 1)
+                    if instruction[1]:
+                        registers[instruction[1]] = unpack(memory, index)[0]
+                elif op == _SW:
+                    offset, base = instruction[2]
+                    memory, index = locate(registers[base] + offset, 4, pc - 1)
+                    pack(memory, index, registers[instruction[1]])
+                elif op == _ADDIU or op == _ADDI:
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(registers[instruction[2]] + instruction[3])
+                elif op == _MOVE:
+                    if instruction[1]:
+                        registers[instruction[1]] = registers[instruction[2]]
+                elif op == _LA or op == _LI:
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(instruction[2])
+                elif op == _JAL:
+                    registers[31] = TEXT_BASE + 4 * pc
+                    pc = instruction[1]
+                elif op == _JR:
+                    pc = (registers[instruction[1]] - TEXT_BASE) >> 2
+                elif op == _JALR:
+                    target = registers[instruction[1]]
+                    registers[31] = TEXT_BASE + 4 * pc
+                    pc = (target - TEXT_BASE) >> 2
+                elif op == _B or op == _J:
+                    pc = instruction[1]
+                elif op == _BEQZ:
+                    if registers[instruction[1]] == 0:
+                        pc = instruction[2]
+                elif op == _BNEZ:
+                    if registers[instruction[1]] != 0:
+                        pc = instruction[2]
+                elif op <= _SRLV:
+                    first = registers[instruction[2]]
+                    second = registers[instruction[3]]
+                    if op == _ADD or op == _ADDU:
+                        value = first + second
+                    elif op == _SUB or op == _SUBU:
+                        value = first - second
+                    elif op == _MUL:
+                        value = first * second
+                    elif op == _DIV or op == _REM:
+                        if second == 0:
+                            raise Exception(f'Division by zero at line {self.executable.source[pc - 1]}.')
+                        quotient = abs(first) // abs(second)
+                        if (first < 0) != (second < 0):
+                            quotient = -quotient
+                        value = quotient if op == _DIV else first - quotient * second
+                    elif op == _AND:
+                        value = first & second
+                    elif op == _OR:
+                        value = first | second
+                    elif op == _XOR:
+                        value = first ^ second
+                    elif op == _NOR:
+                        value = ~(first | second)
+                    elif op == _SLT:
+                        value = int(first < second)
+                    elif op == _SLTU:
+                        value = int((first & 0xffffffff) < (second & 0xffffffff))
+                    elif op == _SEQ:
+                        value = int(first == second)
+                    elif op == _SLLV:
+                        value = first << (second & 31)
+                    else:
+                        value = (first & 0xffffffff) >> (second & 31)
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(value)
+                elif op <= _SRA:
+                    first = registers[instruction[2]]
+                    immediate = instruction[3]
+                    if op == _ANDI:
+                        value = first & immediate
+                    elif op == _ORI:
+                        value = first | immediate
+                    elif op == _XORI:
+                        value = first ^ immediate
+                    elif op == _SLTI:
+                        value = int(first < immediate)
+                    elif op == _SLL:
+                        value = first << immediate
+                    elif op == _SRL:
+                        value = (first & 0xffffffff) >> immediate
+                    else:
+                        value = first >> immediate
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(value)
+                elif op <= _MOVE:
+                    value = registers[instruction[2]]
+                    value = -value if op == _NEG or op == _NEGU else ~value
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(value)
+                elif op == _LUI:
+                    if instruction[1]:
+                        registers[instruction[1]] = _wrap(instruction[2] << 16)
+                elif op == _LB or op == _LBU:
+                    offset, base = instruction[2]
+                    memory, index = locate(registers[base] + offset, 1, pc - 1)
+                    value = memory[index]
+                    if op == _LB and value > 127:
+                        value -= 256
+                    if instruction[1]:
+                        registers[instruction[1]] = value
+                elif op == _SB:
+                    offset, base = instruction[2]
+                    memory, index = locate(registers[base] + offset, 1, pc - 1)
+                    memory[index] = registers[instruction[1]] & 0xff
+                elif op <= _BGE:
+                    first = registers[instruction[1]]
+                    kind, second = instruction[2]
+                    if kind == 'r':
+                        second = registers[second]
+                    if op == _BEQ:
+                        taken = first == second
+                    elif op == _BNE:
+                        taken = first != second
+                    elif op == _BLT:
+                        taken = first < second
+                    elif op == _BLE:
+                        taken = first <= second
+                    elif op == _BGT:
+                        taken = first > second
+                    else:
+                        taken = first >= second
+                    if taken:
+                        pc = instruction[3]
+                elif op <= _BGEZ:
+                    value = registers[instruction[1]]
+                    if op == _BLTZ:
+                        taken = value < 0
+                    elif op == _BLEZ:
+                        taken = value <= 0
+                    elif op == _BGTZ:
+                        taken = value > 0
+                    else:
+                        taken = value >= 0
+                    if taken:
+                        pc = instruction[2]
+                elif op == _SYSCALL:
+                    status = self._syscall(pc - 1)
+                    if status is not None:
+                        return status
+                # nop
+        finally:
+            self.executed += executed
+            self.stdout.flush()
+
+
+def run_assembly(source_code, stdin = None, stdout = None, limit = None):
+    '''Assembles and runs a program. Returns the exit status and the number of instructions
+    executed.'''
+    simulator = Simulator(assemble(source_code), stdin, stdout)
+    status = simulator.run(limit = limit)
+    return status, simulator.executed
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python spim.py <file_name.s> [--stats]')
+        exit()
+
+    with open(sys.argv[1], 'r') as file:
+        status, executed = run_assembly(file.read())
+    if '--stats' in sys.argv[2:]:
+        print(f'\n{executed} instructions executed', file = sys.stderr)
+    exit(status)
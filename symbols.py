@@ -0,0 +1,49 @@
+import sys
+
+
+class SymbolTable:
+    '''
+    SymbolTable interns the identifiers, type names and literals of one compilation.
+
+    ...
+
+    intern() returns one canonical object per distinct value, so the AST nodes of a program share
+    their names and literals, and the later passes can compare names by identity. Strings are
+    also interned with sys.intern(): a name read from the source is then the very object the
+    string constants of the compiler ('Object', 'SELF_TYPE', 'main'...) refer to, whatever the
+    table it went through. The lexer starts a new table for every input (see CoolPyLexer.reset()),
+    and the parser interns the names it adds to the AST (the implicit parent Object...) in it.
+
+    Attributes
+    ----------
+    values : list
+        The distinct values, in order of first occurrence.
+
+    Methods
+    -------
+    intern(value)
+        Returns the canonical object equal to value.
+    '''
+
+    def __init__(self):
+        self.values = []
+        # Keyed by type as well, so that True and 1 (which compare equal) stay distinct.
+        self._canonical = {}
+
+    def intern(self, value):
+        '''Returns the canonical object equal to value (of the same type), recording value if it is new.'''
+        key = (value.__class__, value)
+        canonical = self._canonical.get(key)
+        if canonical is None:
+            canonical = self._canonical[key] = sys.intern(value) if value.__class__ is str else value
+            self.values.append(canonical)
+        return canonical
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return (value.__class__, value) in self._canonical
+
+    def __iter__(self):
+        return iter(self.values)
@@ -0,0 +1,183 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+from ply import lex
+from ply import yacc
+
+
+# Environment variable that overrides the default table cache directory.
+CACHE_DIR_ENV = 'COOLPY_CACHE_DIR'
+
+
+def default_cache_dir():
+    '''Returns the directory used for cached tables when none is given explicitly.
+
+    The COOLPY_CACHE_DIR environment variable takes precedence, followed by
+    $XDG_CACHE_HOME/coolpy and ~/.cache/coolpy.
+    '''
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        return cache_dir
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'coolpy')
+
+
+def _rules_in_order(module, prefix):
+    '''Returns the (name, rule) pairs of a lexer or parser class in definition order.'''
+    rules = []
+    for klass in reversed(type(module).__mro__):
+        for name, rule in vars(klass).items():
+            if name.startswith(prefix):
+                rules.append((name, rule))
+    return rules
+
+
+def lexer_signature(lexer):
+    '''Returns a hex digest identifying the lexer tables generated for a CoolPyLexer.
+
+    The digest covers the token list, the reserved keywords, the lexer states and the regular
+    expression of every t_ rule, so any change to the lexer specification yields a new key.
+    '''
+    digest = hashlib.sha256()
+    digest.update(repr((lex.__version__, lex.__tabversion__)).encode())
+    digest.update(repr(sorted(lexer.tokens)).encode())
+    digest.update(repr(sorted(lexer.reserved.items())).encode())
+    digest.update(repr(lexer.states).encode())
+    for name, rule in _rules_in_order(lexer, 't_'):
+        pattern = rule.__doc__ if callable(rule) else rule
+        digest.update(repr((name, pattern)).encode())
+    return digest.hexdigest()
+
+
+def parser_signature(parser):
+    '''Returns a hex digest identifying the LALR tables generated for a CoolPyParser.
+
+    The digest covers the grammar docstrings of every p_ rule (in definition order), the
+    precedence table and the token list.
+    '''
+    digest = hashlib.sha256()
+    digest.update(repr((yacc.__version__, yacc.__tabversion__)).encode())
+    digest.update(repr(sorted(parser.tokens)).encode())
+    digest.update(repr(parser.precedence).encode())
+    for name, rule in _rules_in_order(parser, 'p_'):
+        digest.update(repr((name, ' '.join((rule.__doc__ or '').split()))).encode())
+    return digest.hexdigest()
+
+
+class TableCache:
+    '''
+    TableCache keeps the generated PLY lexer and parser tables in a persistent directory, keyed
+    by a hash of the lexer/grammar specification.
+
+    ...
+
+    Tables are stored as Python modules named coolpy_lextab_<key>.py and
+    coolpy_yacctab_<key>.py. A changed grammar produces a new key, so stale tables are never
+    loaded. New tables are generated in a private temporary directory and moved into place with
+    os.replace(), so concurrent workers never observe a partially written table. Loaded table
+    modules are memoized per process, so building many parsers only reads them once.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory holding the cached table modules.
+
+    Methods
+    -------
+    build_lexer(module, **kwargs)
+        Builds a PLY lexer for module, loading or storing its tables in the cache.
+    build_parser(module, **kwargs)
+        Builds a PLY LRParser for module, loading or storing its tables in the cache.
+    clear()
+        Removes every cached table module from the cache directory.
+    '''
+
+    # Table modules loaded by this process, keyed by their path.
+    _loaded = {}
+
+    def __init__(self, cache_dir = None):
+        '''
+        Parameters
+        ----------
+        cache_dir : str, optional
+            The directory holding the cached table modules. Defaults to default_cache_dir().
+        '''
+        self.cache_dir = cache_dir if cache_dir else default_cache_dir()
+
+    def table_path(self, kind, key):
+        return os.path.join(self.cache_dir, f'coolpy_{kind}_{key[:32]}.py')
+
+    def build_lexer(self, module, **kwargs):
+        '''Builds a PLY lexer for module with lex.lex(), using the cached tables if present.'''
+        path = self.table_path('lextab', lexer_signature(module))
+        tables = self._load(path)
+        if tables is not None:
+            return lex.lex(module = module, lextab = tables, optimize = True, **kwargs)
+
+        def generate(outputdir, name):
+            return lex.lex(module = module, lextab = name, optimize = True, outputdir = outputdir, **kwargs)
+
+        return self._generate(path, generate)
+
+    def build_parser(self, module, **kwargs):
+        '''Builds a PLY LRParser for module with yacc.yacc(), using the cached tables if present.'''
+        path = self.table_path('yacctab', parser_signature(module))
+        tables = self._load(path)
+        if tables is not None:
+            return yacc.yacc(module = module, tabmodule = tables, optimize = True, write_tables = False,
+                             debug = False, **kwargs)
+
+        def generate(outputdir, name):
+            return yacc.yacc(module = module, tabmodule = name, optimize = True, write_tables = True,
+                             debug = False, outputdir = outputdir, **kwargs)
+
+        return self._generate(path, generate)
+
+    def clear(self):
+        '''Removes every cached table module from the cache directory.'''
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('coolpy_') and name.endswith('.py'):
+                path = os.path.join(self.cache_dir, name)
+                TableCache._loaded.pop(path, None)
+                os.remove(path)
+
+    def _load(self, path):
+        '''Returns the table module stored at path, or None if it is missing or unreadable.'''
+        tables = TableCache._loaded.get(path)
+        if tables is not None:
+            return tables
+        if not os.path.exists(path):
+            return None
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            spec = importlib.util.spec_from_file_location(name, path)
+            tables = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(tables)
+        except Exception:
+            # A table module from an interrupted or foreign writer; regenerate it.
+            return None
+
+        TableCache._loaded[path] = tables
+        return tables
+
+    def _generate(self, path, generate):
+        '''Generates tables into a temporary directory and atomically moves them to path.'''
+        os.makedirs(self.cache_dir, exist_ok = True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        workdir = tempfile.mkdtemp(prefix = '.build-', dir = self.cache_dir)
+        try:
+            result = generate(workdir, name)
+            generated = os.path.join(workdir, name + '.py')
+            if os.path.exists(generated):
+                os.replace(generated, path)
+        finally:
+            shutil.rmtree(workdir, ignore_errors = True)
+            sys.modules.pop(name, None)
+        return result
@@ -0,0 +1,144 @@
+import sys
+from array import array
+
+from fast_lexer import Token
+
+
+class TokenBuffer:
+    '''
+    TokenBuffer stores a token stream in columns instead of one object per token.
+
+    ...
+
+    Token i is described by kinds[i] (an index into kind_names), starts[i] and ends[i] (character
+    offsets of the token in the source), lines[i] (its line number) and value_ids[i] (an index
+    into values). values is an interned side table: every distinct identifier, type name, string
+    literal, integer, boolean and operator text is stored once, however often it occurs.
+
+    Token objects are only created on demand, one at a time, by __getitem__, __iter__ and
+    tokenfunc(); the latter feeds CoolPyParser.parse() directly from the buffer.
+
+    Attributes
+    ----------
+    kind_names : tuple
+        The token type names; kinds[i] indexes into it.
+    kinds : array('B')
+        Kind code of every token.
+    starts : array('q')
+        Offset of the first character of every token.
+    ends : array('q')
+        Offset just past the last character of every token.
+    lines : array('i')
+        Line number of every token.
+    value_ids : array('i')
+        Index of the value of every token in values.
+    values : list
+        The distinct token values.
+
+    Methods
+    -------
+    append(type, value, lineno, start, end)
+        Appends a token to the buffer.
+    type(i), value(i)
+        The type name and value of token i.
+    tokenfunc()
+        Returns a function yielding the tokens one by one (None at the end), for yacc.
+    nbytes()
+        The memory used by the columns and the side table.
+    as_numpy()
+        The columns as NumPy arrays sharing the buffer memory (requires NumPy).
+    '''
+
+    def __init__(self, kind_names):
+        '''
+        Parameters
+        ----------
+        kind_names : iterable of str
+            The token type names of the lexer (at most 256).
+        '''
+        self.kind_names = tuple(kind_names)
+        self._kind_codes = {name: code for code, name in enumerate(self.kind_names)}
+
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.lines = array('i')
+        self.value_ids = array('i')
+        self.values = []
+        self._value_ids = {}
+
+    def append(self, type, value, lineno, start, end):
+        '''Appends a token to the buffer, interning its value.'''
+        # Keyed by type as well, so that True and 1 (which compare equal) stay distinct.
+        key = (value.__class__, value)
+        value_id = self._value_ids.get(key)
+        if value_id is None:
+            value_id = self._value_ids[key] = len(self.values)
+            self.values.append(value)
+
+        self.kinds.append(self._kind_codes[type])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(lineno)
+        self.value_ids.append(value_id)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def type(self, i):
+        return self.kind_names[self.kinds[i]]
+
+    def value(self, i):
+        return self.values[self.value_ids[i]]
+
+    def __getitem__(self, i):
+        return Token(self.kind_names[self.kinds[i]], self.values[self.value_ids[i]], self.lines[i],
+                     self.starts[i], self.ends[i])
+
+    def __iter__(self):
+        for i in range(len(self.kinds)):
+            yield self[i]
+
+    def tokenfunc(self):
+        '''Returns a function returning the next token of the buffer (None at the end).
+
+        The parser keeps a token object only while it sits on the LR stack, so at most a
+        stack's worth of tokens exists at any time. Pass it as CoolPyParser.parse(tokenfunc = ...).
+        '''
+        kind_names = self.kind_names
+        values = self.values
+        columns = zip(self.kinds, self.value_ids, self.lines, self.starts, self.ends)
+
+        def next_token():
+            row = next(columns, None)
+            if row is None:
+                return None
+            kind, value_id, lineno, start, end = row
+            return Token(kind_names[kind], values[value_id], lineno, start, end)
+
+        return next_token
+
+    def nbytes(self):
+        '''Returns the memory used by the columns and the value table, in bytes.'''
+        columns = (self.kinds, self.starts, self.ends, self.lines, self.value_ids)
+        size = sum(column.buffer_info()[1] * column.itemsize for column in columns)
+        size += sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+        return size
+
+    def as_numpy(self):
+        '''Returns the columns as a dict of NumPy arrays sharing the memory of the buffer.
+
+        The arrays become invalid if tokens are appended afterwards. Requires NumPy.
+        '''
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('TokenBuffer.as_numpy() requires NumPy to be installed.') from None
+
+        return {
+            'kinds': numpy.frombuffer(self.kinds, dtype = numpy.uint8),
+            'starts': numpy.frombuffer(self.starts, dtype = numpy.int64),
+            'ends': numpy.frombuffer(self.ends, dtype = numpy.int64),
+            'lines': numpy.frombuffer(self.lines, dtype = numpy.int32),
+            'value_ids': numpy.frombuffer(self.value_ids, dtype = numpy.int32),
+        }
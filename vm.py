@@ -0,0 +1,1030 @@
+import marshal
+import sys
+from array import array
+from collections import namedtuple
+
+import ast as AST
+from runtime import CoolAbort
+from runtime import CoolRuntimeError
+from runtime import Runtime
+from runtime import Span
+from runtime import default_value
+from runtime import divide
+from runtime import run_with_stack
+from runtime import wrap_int
+from semant import BASIC_CLASSES
+from semant import SELF_TYPE
+from semant import analyze
+from semant import builtin_classes
+from semant import case_branch
+
+
+# Opcodes. An instruction is an opcode followed by its operands, all 32-bit integers: registers of
+# the frame (register 0 holds self, the next ones the formal parameters), attribute slots, class
+# numbers, constant pool indexes, immediate integers and jump targets (instruction offsets).
+MOVE = 0                # dst src
+LOAD_INT = 1            # dst value
+LOAD_CONSTANT = 2       # dst constant
+LOAD_VOID = 3           # dst
+GET_ATTRIBUTE = 4       # dst slot                   dst <- self.slot
+SET_ATTRIBUTE = 5       # slot src
+NEW = 6                 # dst class
+NEW_SELF_TYPE = 7       # dst                        a new object of the class of self
+ADD = 8                 # dst first second
+ADD_INT = 9             # dst first value
+SUBTRACT = 10           # dst first second
+MULTIPLY = 11           # dst first second
+DIVIDE = 12             # dst first second
+NEGATE = 13             # dst src
+LESS = 14               # dst first second
+LESS_EQUAL = 15         # dst first second
+EQUAL = 16              # dst first second
+NOT = 17                # dst src
+IS_VOID = 18            # dst src
+JUMP = 19               # target
+JUMP_IF_FALSE = 20      # src target
+JUMP_IF_NOT_LESS = 21   # first second target
+JUMP_IF_NOT_LESS_EQUAL = 22  # first second target
+DISPATCH = 23           # dst receiver method_slot name count arguments...
+CALL = 24               # dst receiver function name count arguments...   (static dispatch)
+CASE = 25               # src case targets...       jumps to the branch for the class of src
+RETURN = 26             # src
+
+OPCODE_NAMES = ['MOVE', 'LOAD_INT', 'LOAD_CONSTANT', 'LOAD_VOID', 'GET_ATTRIBUTE', 'SET_ATTRIBUTE', 'NEW',
+                'NEW_SELF_TYPE', 'ADD', 'ADD_INT', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'NEGATE', 'LESS',
+                'LESS_EQUAL', 'EQUAL', 'NOT', 'IS_VOID', 'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_NOT_LESS',
+                'JUMP_IF_NOT_LESS_EQUAL', 'DISPATCH', 'CALL', 'CASE', 'RETURN']
+
+# Number of operands of the fixed-length instructions.
+OPERANDS = {
+    MOVE: 2, LOAD_INT: 2, LOAD_CONSTANT: 2, LOAD_VOID: 1, GET_ATTRIBUTE: 2, SET_ATTRIBUTE: 2,
+    NEW: 2, NEW_SELF_TYPE: 1, ADD: 3, ADD_INT: 3, SUBTRACT: 3, MULTIPLY: 3, DIVIDE: 3, NEGATE: 2,
+    LESS: 3, LESS_EQUAL: 3, EQUAL: 3, NOT: 2, IS_VOID: 2, JUMP: 1, JUMP_IF_FALSE: 2,
+    JUMP_IF_NOT_LESS: 3, JUMP_IF_NOT_LESS_EQUAL: 3, RETURN: 1,
+}
+
+# Layout of serialized programs: MAGIC, then a marshalled tuple of plain values (see
+# BytecodeProgram.dumps()), independent of the Python version.
+MAGIC = b'COOLVM\x00\x01'
+
+# The span of instructions the compiler recorded none for.
+_NO_SPAN = (None, None)
+
+
+class VMFunction:
+    '''
+    The bytecode of a method or of the attribute initializers of a class, or a builtin method
+    (then code is empty and builtin is the name of the Runtime method implementing it).
+
+    Attributes
+    ----------
+    name, owner : str
+        The method and the class defining it (name is '<init>' for initializers).
+    code : array
+        The instructions, an array('i').
+    registers : int
+        The frame size.
+    parameters : int
+        The number of formal parameters.
+    spans : dict
+        The (start, end) source span of the instructions that can fail, by offset.
+    builtin : str
+        The name of the Runtime method of a builtin, or None.
+    '''
+    __slots__ = ('name', 'owner', 'code', 'registers', 'parameters', 'spans', 'builtin')
+
+    def __init__(self, name, owner, code, registers, parameters, spans, builtin = None):
+        self.name = name
+        self.owner = owner
+        self.code = code
+        self.registers = registers
+        self.parameters = parameters
+        self.spans = spans
+        self.builtin = builtin
+
+    def __repr__(self):
+        return f'VMFunction({self.owner}.{self.name})'
+
+
+# A class: the number of its parent (-1 for Object), its dispatch table (function numbers by method
+# slot), the initial values of its attribute slots, the initializer functions to run on new
+# objects (ancestors first) and the numbers of its ancestors (itself first).
+VMClass = namedtuple('VMClass', ['name', 'parent', 'vtable', 'defaults', 'initializers', 'ancestors'])
+
+
+class BytecodeProgram:
+    '''
+    BytecodeProgram is a Cool program compiled to register bytecode, self-contained and
+    serializable.
+
+    ...
+
+    Attributes
+    ----------
+    constants : list
+        The constant pool (strings and booleans).
+    functions : list
+        The VMFunction of every method and initializer.
+    classes : list
+        The VMClass of every class, numbered as in the semant.ClassEnvironment.
+    cases : list
+        The branch classes (tuples of class numbers) of every case expression.
+    main : int
+        The number of the class Main (Main.main() is the method named main of its dispatch table).
+
+    Methods
+    -------
+    dumps()
+        Returns the program as bytes.
+    loads(data)
+        Reads a program returned by dumps() (static method).
+    save(path), load(path)
+        The same, with files.
+    run(stdin, stdout)
+        Runs Main.main() and returns its value.
+    '''
+
+    def __init__(self, constants, functions, classes, cases, main):
+        self.constants = constants
+        self.functions = functions
+        self.classes = classes
+        self.cases = cases
+        self.main = main
+
+    def dumps(self):
+        functions = []
+        for function in self.functions:
+            code = function.code
+            if sys.byteorder == 'big':
+                code = array('i', code)
+                code.byteswap()
+            spans = tuple((offset, start, end) for offset, (start, end) in function.spans.items())
+            functions.append((function.name, function.owner, code.tobytes(), function.registers,
+                              function.parameters, spans, function.builtin))
+        return MAGIC + marshal.dumps((tuple(self.constants), tuple(functions),
+                                      tuple(tuple(vm_class) for vm_class in self.classes),
+                                      tuple(self.cases), self.main))
+
+    @staticmethod
+    def loads(data):
+        if not data.startswith(MAGIC):
+            raise ValueError('Not a Cool bytecode program (or one of another version).')
+        constants, functions, classes, cases, main = marshal.loads(data[len(MAGIC):])
+        loaded = []
+        for name, owner, code_bytes, registers, parameters, spans, builtin in functions:
+            code = array('i')
+            code.frombytes(code_bytes)
+            if sys.byteorder == 'big':
+                code.byteswap()
+            loaded.append(VMFunction(name, owner, code, registers, parameters,
+                                     {offset: (start, end) for offset, start, end in spans}, builtin))
+        return BytecodeProgram(list(constants), loaded, [VMClass(*vm_class) for vm_class in classes],
+                               list(cases), main)
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.dumps())
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            return BytecodeProgram.loads(file.read())
+
+    def run(self, stdin = None, stdout = None):
+        '''Runs (new Main).main() on a thread with a large stack and returns its value. Abort
+        stops the program and returns None; run-time errors raise CoolRuntimeError.'''
+        return VirtualMachine(self, stdin, stdout).run()
+
+
+class BytecodeCompiler:
+    '''
+    BytecodeCompiler compiles a type-checked program to a BytecodeProgram.
+
+    ...
+
+    Every expression is compiled into a destination register. Let and case variables get a
+    register of the frame for their scope, temporaries are allocated above them and freed when
+    the expression using them is compiled (so frames stay small), and variables that are not
+    assigned later are read in place instead of being copied. Attributes are accessed by slot,
+    methods by dispatch table slot, both resolved from the semant.ClassEnvironment. Comparisons
+    in if and while predicates jump directly, and additions of literals use immediates.
+
+    The compiler is iterative, like the other passes: a work stack holds the steps still to run
+    (compiling a subexpression, emitting an instruction, placing a label, releasing registers).
+
+    Methods
+    -------
+    compile()
+        Returns the BytecodeProgram.
+    '''
+
+    def __init__(self, program, environment, types):
+        '''
+        Parameters
+        ----------
+        program : AST.Program
+            The program, free of semantic errors.
+        environment : semant.ClassEnvironment
+            Its classes.
+        types : dict
+            The static type of every expression (semant.SemanticResult.types).
+        '''
+        self.program = program
+        self.environment = environment
+        self.types = types
+        self.constants = []
+        self._constant_numbers = {}
+        self._function_numbers = {}
+        self.functions = []
+        self.cases = []
+        self._handlers = {}
+        for kind in vars(AST).values():
+            if isinstance(kind, type) and issubclass(kind, AST.AST):
+                handler = getattr(self, '_compile_' + kind.__name__, None)
+                if handler is not None:
+                    self._handlers[kind] = handler
+
+    def compile(self) -> BytecodeProgram:
+        environment = self.environment
+        nodes = {node.name: node for node in builtin_classes()}
+        nodes.update((node.name, node) for node in self.program.classes)
+
+        # Functions are numbered first, for the static dispatches.
+        function_numbers = self._function_numbers = {}
+        initializer_numbers = {}
+        for class_name in environment.names:
+            for feature in nodes[class_name].features:
+                if isinstance(feature, AST.Method):
+                    function_numbers[class_name, feature.name] = len(function_numbers) + len(initializer_numbers)
+            if any(isinstance(feature, AST.Attribute) and feature.expression is not None
+                   for feature in nodes[class_name].features):
+                initializer_numbers[class_name] = len(function_numbers) + len(initializer_numbers)
+
+        for class_name in environment.names:
+            initialized = []
+            for feature in nodes[class_name].features:
+                if isinstance(feature, AST.Method):
+                    if feature.body is None:
+                        self.functions.append(VMFunction(str(feature.name), str(class_name), array('i'),
+                                                         1 + len(feature.formal_parameters),
+                                                         len(feature.formal_parameters), {},
+                                                         Runtime.BUILTINS[class_name, feature.name]))
+                    else:
+                        formals = [formal.name for formal in feature.formal_parameters]
+                        self.functions.append(self._compile_function(feature.name, class_name, formals,
+                                                                     [feature.body]))
+                elif isinstance(feature, AST.Attribute) and feature.expression is not None:
+                    initialized.append(feature)
+            if initialized:
+                slots = [environment.lookup_attribute(class_name, feature.name).slot for feature in initialized]
+                self.functions.append(self._compile_function('<init>', class_name, [],
+                                                             [feature.expression for feature in initialized],
+                                                             slots))
+
+        classes = []
+        for class_name in environment.names:
+            parent = environment.parent(class_name)
+            ancestors = environment.ancestors(class_name)
+            classes.append(VMClass(
+                str(class_name),
+                environment.class_id(parent) if parent is not None else -1,
+                tuple(function_numbers[info.owner, info.name] for info in environment.dispatch_table(class_name)),
+                tuple(default_value(info.type) for info in environment.attributes(class_name)),
+                tuple(initializer_numbers[ancestor] for ancestor in reversed(ancestors)
+                      if ancestor in initializer_numbers),
+                tuple(environment.class_id(ancestor) for ancestor in ancestors)))
+
+        return BytecodeProgram(self.constants, self.functions, classes, self.cases,
+                               environment.class_id('Main'))
+
+    def _constant(self, value):
+        if isinstance(value, str):
+            # marshal (see BytecodeProgram.dumps()) only takes exact str objects.
+            value = str(value)
+        key = (value.__class__, value)
+        number = self._constant_numbers.get(key)
+        if number is None:
+            number = self._constant_numbers[key] = len(self.constants)
+            self.constants.append(value)
+        return number
+
+    def _compile_function(self, name, class_name, formals, expressions, slots = None):
+        '''
+        Compiles expressions of class class_name in order into a function returning the value of
+        the last one, or, with slots, storing every value in its attribute slot of self.
+        '''
+        self._class_name = class_name
+        self._code = array('i')
+        self._spans = {}
+        self._fixups = []
+        self._scope = {}
+        for i, formal in enumerate(formals):
+            self._scope.setdefault(formal, []).append(1 + i)
+        self._next_register = self._registers = 1 + len(formals)
+        self._scratch = set()
+
+        for i, expression in enumerate(expressions):
+            self._assignments = _assigned_variables(expression)
+            result = self._allocate()
+            self._run([(self._visit, (expression, result))])
+            if slots is not None:
+                self._emit(SET_ATTRIBUTE, slots[i], result)
+            elif i == len(expressions) - 1:
+                self._emit(RETURN, result)
+            self._release(1)
+        if slots is not None:
+            self._emit(RETURN, 0)
+
+        for offset, label in self._fixups:
+            self._code[offset] = label[0]
+        return VMFunction(str(name), str(class_name), self._code, self._registers, len(formals), self._spans)
+
+    def _run(self, steps):
+        work = list(reversed(steps))
+        while work:
+            step, arguments = work.pop()
+            steps = step(*arguments)
+            if steps:
+                work.extend(reversed(steps))
+
+    def _visit(self, node, destination):
+        return self._handlers[node.__class__](node, destination)
+
+    def _allocate(self, scratch = False):
+        register = self._next_register
+        self._next_register += 1
+        self._registers = max(self._registers, self._next_register)
+        if scratch:
+            self._scratch.add(register)
+        return register
+
+    def _release(self, count):
+        for _ in range(count):
+            self._next_register -= 1
+            self._scratch.discard(self._next_register)
+
+    def _emit(self, *instruction):
+        self._code.extend(instruction)
+
+    def _emit_located(self, node, *instruction):
+        self._spans[len(self._code)] = (node.start, node.end)
+        self._code.extend(instruction)
+
+    def _emit_jump(self, label, *instruction):
+        '''Emits an instruction whose last operand is the offset of a label, once placed.'''
+        self._code.extend(instruction)
+        self._code.append(-1)
+        self._fixups.append((len(self._code) - 1, label))
+
+    def _place(self, label):
+        label[0] = len(self._code)
+
+    def _bind(self, name, register):
+        self._scope.setdefault(name, []).append(register)
+
+    def _unbind(self, name):
+        self._scope[name].pop()
+
+    def _local(self, name):
+        registers = self._scope.get(name)
+        return registers[-1] if registers else None
+
+    def _operands(self, expressions):
+        '''
+        Returns the registers holding the values of expressions (evaluated in order), the steps
+        computing them and the number of temporaries allocated. Self and local variables that no
+        later expression assigns are used in place.
+        '''
+        registers = []
+        steps = []
+        allocated = 0
+        for i, expression in enumerate(expressions):
+            register = None
+            if expression.__class__ is AST.Self:
+                register = 0
+            elif expression.__class__ is AST.Object:
+                local = self._local(expression.name)
+                if local is not None and not any(expression.name in self._assignments.get(later, ())
+                                                 for later in expressions[i + 1:]):
+                    register = local
+            if register is None:
+                register = self._allocate()
+                allocated += 1
+                steps.append((self._visit, (expression, register)))
+            registers.append(register)
+        return registers, steps, allocated
+
+    def _compile_Integer(self, node, destination):
+        if -2147483648 <= node.content <= 2147483647:
+            self._emit(LOAD_INT, destination, node.content)
+        else:
+            self._emit(LOAD_CONSTANT, destination, self._constant(node.content))
+
+    def _compile_String(self, node, destination):
+        self._emit(LOAD_CONSTANT, destination, self._constant(node.content))
+
+    def _compile_Boolean(self, node, destination):
+        self._emit(LOAD_CONSTANT, destination, self._constant(bool(node.content)))
+
+    def _compile_Self(self, node, destination):
+        self._emit(MOVE, destination, 0)
+
+    def _compile_Object(self, node, destination):
+        local = self._local(node.name)
+        if local is not None:
+            self._emit(MOVE, destination, local)
+        else:
+            self._emit(GET_ATTRIBUTE, destination, self._attribute_slot(node.name))
+
+    def _attribute_slot(self, name):
+        return self.environment.lookup_attribute(self._class_name, name).slot
+
+    def _compile_Assignment(self, node, destination):
+        name = node.instance.name
+        local = self._local(name)
+        if local is not None:
+            # Computed in place; the value is copied only if it is used.
+            steps = [(self._visit, (node.expression, local))]
+            if destination not in self._scratch:
+                steps.append((self._emit, (MOVE, destination, local)))
+            return steps
+        return [(self._visit, (node.expression, destination)),
+                (self._emit, (SET_ATTRIBUTE, self._attribute_slot(name), destination))]
+
+    def _compile_NewObject(self, node, destination):
+        if node.type == SELF_TYPE:
+            self._emit(NEW_SELF_TYPE, destination)
+        elif node.type == 'Int':
+            self._emit(LOAD_INT, destination, 0)
+        elif node.type in BASIC_CLASSES:
+            self._emit(LOAD_CONSTANT, destination, self._constant(default_value(node.type)))
+        else:
+            self._emit(NEW, destination, self.environment.class_id(node.type))
+
+    def _compile_IsVoid(self, node, destination):
+        return self._unary(node.expression, destination, IS_VOID)
+
+    def _compile_IntegerComplement(self, node, destination):
+        return self._unary(node.integer_expression, destination, NEGATE)
+
+    def _compile_BooleanComplement(self, node, destination):
+        return self._unary(node.boolean_expression, destination, NOT)
+
+    def _unary(self, expression, destination, opcode):
+        (register,), steps, allocated = self._operands([expression])
+        return steps + [(self._emit, (opcode, destination, register)), (self._release, (allocated,))]
+
+    def _binary(self, node, destination, opcode):
+        (first, second), steps, allocated = self._operands([node.first, node.second])
+        emit = self._emit_located if opcode == DIVIDE else self._emit
+        arguments = (node, opcode, destination, first, second) if opcode == DIVIDE else \
+            (opcode, destination, first, second)
+        return steps + [(emit, arguments), (self._release, (allocated,))]
+
+    def _compile_Addition(self, node, destination):
+        if node.second.__class__ is AST.Integer and node.second.content <= 2147483647:
+            (first,), steps, allocated = self._operands([node.first])
+            return steps + [(self._emit, (ADD_INT, destination, first, node.second.content)),
+                            (self._release, (allocated,))]
+        return self._binary(node, destination, ADD)
+
+    def _compile_Subtraction(self, node, destination):
+        if node.second.__class__ is AST.Integer and node.second.content < 2 ** 31:
+            (first,), steps, allocated = self._operands([node.first])
+            return steps + [(self._emit, (ADD_INT, destination, first, -node.second.content)),
+                            (self._release, (allocated,))]
+        return self._binary(node, destination, SUBTRACT)
+
+    def _compile_Multiplication(self, node, destination):
+        return self._binary(node, destination, MULTIPLY)
+
+    def _compile_Division(self, node, destination):
+        return self._binary(node, destination, DIVIDE)
+
+    def _compile_LessThan(self, node, destination):
+        return self._binary(node, destination, LESS)
+
+    def _compile_LessThanOrEqual(self, node, destination):
+        return self._binary(node, destination, LESS_EQUAL)
+
+    def _compile_Equal(self, node, destination):
+        return self._binary(node, destination, EQUAL)
+
+    def _compile_Block(self, node, destination):
+        steps = []
+        expressions = node.expression_list
+        if len(expressions) > 1:
+            scratch = self._allocate(scratch = True)
+            steps.extend((self._visit, (expression, scratch)) for expression in expressions[:-1])
+        steps.append((self._visit, (expressions[-1], destination)))
+        if len(expressions) > 1:
+            steps.append((self._release, (1,)))
+        return steps
+
+    def _compile_dispatch(self, node, destination, opcode, target):
+        # The arguments are evaluated before the receiver.
+        registers, steps, allocated = self._operands(list(node.arguments) + [node.instance])
+        receiver = registers.pop()
+        steps.append((self._emit_located, (node, opcode, destination, receiver, target,
+                                           self._constant(node.method), len(registers), *registers)))
+        steps.append((self._release, (allocated,)))
+        return steps
+
+    def _compile_DynamicDispatch(self, node, destination):
+        class_name = self.types.get(node.instance, self._class_name)
+        if class_name == SELF_TYPE:
+            class_name = self._class_name
+        slot = self.environment.lookup_method(class_name, node.method).slot
+        return self._compile_dispatch(node, destination, DISPATCH, slot)
+
+    def _compile_StaticDispatch(self, node, destination):
+        info = self.environment.lookup_method(node.dispatch_type, node.method)
+        return self._compile_dispatch(node, destination, CALL, self._function_numbers[info.owner, info.name])
+
+    def _compile_Let(self, node, destination):
+        register = self._allocate()
+        steps = []
+        if node.expression is not None:
+            steps.append((self._visit, (node.expression, register)))
+        elif node.return_type == 'Int':
+            steps.append((self._emit, (LOAD_INT, register, 0)))
+        elif node.return_type in BASIC_CLASSES:
+            steps.append((self._emit, (LOAD_CONSTANT, register, self._constant(default_value(node.return_type)))))
+        else:
+            steps.append((self._emit, (LOAD_VOID, register)))
+        steps += [(self._bind, (node.instance, register)),
+                  (self._visit, (node.body, destination)),
+                  (self._unbind, (node.instance,)),
+                  (self._release, (1,))]
+        return steps
+
+    def _branch_if_false(self, predicate, label):
+        '''The steps jumping to label when predicate is false.'''
+        kind = predicate.__class__
+        if kind is AST.Boolean:
+            return [] if predicate.content else [(self._emit_jump, (label, JUMP))]
+        if kind is AST.LessThan or kind is AST.LessThanOrEqual:
+            (first, second), steps, allocated = self._operands([predicate.first, predicate.second])
+            opcode = JUMP_IF_NOT_LESS if kind is AST.LessThan else JUMP_IF_NOT_LESS_EQUAL
+            return steps + [(self._emit_jump, (label, opcode, first, second)), (self._release, (allocated,))]
+        (register,), steps, allocated = self._operands([predicate])
+        return steps + [(self._emit_jump, (label, JUMP_IF_FALSE, register)), (self._release, (allocated,))]
+
+    def _compile_If(self, node, destination):
+        otherwise = [None]
+        end = [None]
+        return [(self._run, (self._branch_if_false(node.predicate, otherwise),)),
+                (self._visit, (node.then_body, destination)),
+                (self._emit_jump, (end, JUMP)),
+                (self._place, (otherwise,)),
+                (self._visit, (node.else_body, destination)),
+                (self._place, (end,))]
+
+    def _compile_WhileLoop(self, node, destination):
+        start = [None]
+        end = [None]
+        body = self._allocate(scratch = True)
+        return [(self._place, (start,)),
+                (self._run, (self._branch_if_false(node.predicate, end),)),
+                (self._visit, (node.body, body)),
+                (self._emit_jump, (start, JUMP)),
+                (self._place, (end,)),
+                (self._emit, (LOAD_VOID, destination)),
+                (self._release, (1,))]
+
+    def _compile_Case(self, node, destination):
+        # The value register is also the register of the variable of every branch.
+        value = self._allocate()
+        branches = [case_branch(action) for action in node.actions]
+        labels = [[None] for _ in branches]
+        end = [None]
+        case = len(self.cases)
+        self.cases.append(tuple(self.environment.class_id(branch_type) for _, branch_type, _ in branches))
+        steps = [(self._visit, (node.expression, value)),
+                 (self._emit_located, (node, CASE, value, case, *([-1] * len(branches))))]
+        steps.append((self._case_targets, (labels,)))
+        for (name, _, body), label in zip(branches, labels):
+            steps += [(self._place, (label,)),
+                      (self._bind, (name, value)),
+                      (self._visit, (body, destination)),
+                      (self._unbind, (name,)),
+                      (self._emit_jump, (end, JUMP))]
+        steps += [(self._place, (end,)), (self._release, (1,))]
+        return steps
+
+    def _case_targets(self, labels):
+        '''Registers the targets of the CASE instruction just emitted for patching.'''
+        first = len(self._code) - len(labels)
+        for i, label in enumerate(labels):
+            self._fixups.append((first + i, label))
+
+
+def _assigned_variables(expression):
+    '''Returns the names assigned in every subexpression of an expression that assigns any
+    (a dictionary from node to frozenset), computed bottom-up with an explicit stack.'''
+    assigned = {}
+    work = [(expression, False)]
+    while work:
+        node, ready = work.pop()
+        children = _children(node)
+        if not ready:
+            work.append((node, True))
+            work.extend((child, False) for child in children)
+            continue
+        names = set()
+        for child in children:
+            names.update(assigned.get(child, ()))
+        if node.__class__ is AST.Assignment:
+            names.add(node.instance.name)
+        if names:
+            assigned[node] = frozenset(names)
+    return assigned
+
+
+def _children(node):
+    kind = node.__class__
+    if kind is AST.Let:
+        return [node.body] if node.expression is None else [node.expression, node.body]
+    if kind is AST.Case:
+        return [node.expression] + [case_branch(action)[2] for action in node.actions]
+    if kind is AST.DynamicDispatch or kind is AST.StaticDispatch:
+        return [node.instance] + list(node.arguments)
+    if kind is AST.Block:
+        return list(node.expression_list)
+    if kind is AST.If:
+        return [node.predicate, node.then_body, node.else_body]
+    if kind is AST.WhileLoop:
+        return [node.predicate, node.body]
+    if kind is AST.Assignment or kind is AST.IsVoid:
+        return [node.expression]
+    if kind is AST.IntegerComplement:
+        return [node.integer_expression]
+    if kind is AST.BooleanComplement:
+        return [node.boolean_expression]
+    if hasattr(node, 'first'):
+        return [node.first, node.second]
+    return []
+
+
+class VMObject:
+    '''An object of the virtual machine: its class (a LoadedClass) and its attribute slots.'''
+    __slots__ = ('cls', 'fields')
+
+    def __init__(self, cls, fields):
+        self.cls = cls
+        self.fields = fields
+
+    def __repr__(self):
+        return f'<{self.cls.name} object>'
+
+
+# The run-time forms of functions and classes. The loader decodes the code of every function once
+# into instructions: a list of (opcode, a, b, c, d) tuples, the operands in order (None when
+# absent), jump targets turned into instruction numbers, and for DISPATCH and CALL, d is the pair
+# (method name constant, argument registers). offsets are the code offsets of the instructions,
+# for the spans of errors. builtin is a bound Runtime method.
+LoadedFunction = namedtuple('LoadedFunction', ['instructions', 'offsets', 'registers', 'builtin', 'function'])
+LoadedClass = namedtuple('LoadedClass', ['name', 'number', 'vtable', 'defaults', 'initializers', 'ancestors'])
+
+
+def instruction_size(code, offset, cases):
+    '''The number of integers of the instruction at an offset of code, opcode included.'''
+    op = code[offset]
+    if op == DISPATCH or op == CALL:
+        return 6 + code[offset + 5]
+    if op == CASE:
+        return 3 + len(cases[code[offset + 2]])
+    return 1 + OPERANDS[op]
+
+
+def decode(function, cases):
+    '''Returns the instructions and the offsets of a function (see LoadedFunction).'''
+    code = function.code
+    instructions = []
+    offsets = []
+    numbers = {}
+    offset = 0
+    while offset < len(code):
+        op = code[offset]
+        size = instruction_size(code, offset, cases)
+        operands = code[offset + 1:offset + size]
+        if op == DISPATCH or op == CALL:
+            instruction = [op, operands[0], operands[1], operands[2], (operands[3], tuple(operands[5:]))]
+        elif op == CASE:
+            instruction = [op, operands[0], operands[1], tuple(operands[2:]), None]
+        else:
+            instruction = [op] + list(operands) + [None] * (4 - len(operands))
+        numbers[offset] = len(instructions)
+        instructions.append(instruction)
+        offsets.append(offset)
+        offset += size
+
+    for instruction in instructions:
+        op = instruction[0]
+        if op == JUMP:
+            instruction[1] = numbers[instruction[1]]
+        elif op == JUMP_IF_FALSE:
+            instruction[2] = numbers[instruction[2]]
+        elif op == JUMP_IF_NOT_LESS or op == JUMP_IF_NOT_LESS_EQUAL:
+            instruction[3] = numbers[instruction[3]]
+        elif op == CASE:
+            instruction[3] = tuple(numbers[target] for target in instruction[3])
+    return [tuple(instruction) for instruction in instructions], offsets
+
+
+class VirtualMachine(Runtime):
+    '''
+    VirtualMachine executes a BytecodeProgram.
+
+    ...
+
+    The code of every function is decoded once, when the machine is created (see decode()), and
+    every call runs the dispatch loop of execute() on a new frame (a list of registers); method
+    calls of the program are Python calls of execute(). Case expressions remember the branch
+    selected for each class they have seen.
+
+    Methods
+    -------
+    run()
+        Runs Main.main() and returns its value.
+    new(loaded_class)
+        Creates and initializes an object.
+    execute(function, registers)
+        Runs a function on a frame and returns its value.
+    '''
+
+    def __init__(self, program, stdin = None, stdout = None):
+        super().__init__(stdin, stdout)
+        self.program = program
+        self.constants = program.constants
+        self.functions = []
+        for function in program.functions:
+            instructions, offsets = decode(function, program.cases)
+            builtin = getattr(self, function.builtin) if function.builtin else None
+            self.functions.append(LoadedFunction(instructions, offsets, function.registers, builtin, function))
+        self.classes = []
+        for number, vm_class in enumerate(program.classes):
+            self.classes.append(LoadedClass(vm_class.name, number,
+                                            tuple(self.functions[i] for i in vm_class.vtable),
+                                            list(vm_class.defaults),
+                                            tuple(self.functions[i] for i in vm_class.initializers),
+                                            vm_class.ancestors))
+        names = {loaded.name: loaded for loaded in self.classes}
+        self._basic_classes = {int: names['Int'], str: names['String'], bool: names['Bool']}
+        self._case_tables = [{} for _ in program.cases]
+
+    def class_name_of(self, value):
+        if value.__class__ is VMObject:
+            return value.cls.name
+        return self._basic_classes[value.__class__].name
+
+    def copy_object(self, value):
+        return VMObject(value.cls, list(value.fields))
+
+    def run(self):
+        return run_with_stack(self._run)
+
+    def _run(self):
+        try:
+            main = self.new(self.classes[self.program.main])
+            function = next(function for function in main.cls.vtable if function.function.name == 'main')
+            registers = [None] * function.registers
+            registers[0] = main
+            return self.execute(function, registers)
+        except CoolAbort:
+            return None
+        finally:
+            self.stdout.flush()
+
+    def new(self, loaded_class):
+        instance = VMObject(loaded_class, list(loaded_class.defaults))
+        for initializer in loaded_class.initializers:
+            registers = [None] * initializer.registers
+            registers[0] = instance
+            self.execute(initializer, registers)
+        return instance
+
+    def _span(self, function, pc):
+        return Span(*function.function.spans.get(function.offsets[pc], _NO_SPAN))
+
+    def _select(self, case, value):
+        '''The branch of a case for the class of value.'''
+        loaded_class = value.cls if value.__class__ is VMObject else self._basic_classes[value.__class__]
+        table = self._case_tables[case]
+        branch = table.get(loaded_class.number)
+        if branch is None:
+            branch_classes = self.program.cases[case]
+            for ancestor in loaded_class.ancestors:
+                if ancestor in branch_classes:
+                    branch = table[loaded_class.number] = branch_classes.index(ancestor)
+                    break
+        return branch
+
+    def execute(self, function, registers):
+        code = function.instructions
+        constants = self.constants
+        fields = registers[0].fields if registers[0].__class__ is VMObject else None
+        pc = 0
+        # The most frequent instructions are tested first.
+        while True:
+            op, a, b, c, d = code[pc]
+            pc += 1
+            if op == GET_ATTRIBUTE:
+                registers[a] = fields[b]
+            elif op == MOVE:
+                registers[a] = registers[b]
+            elif op == ADD_INT:
+                value = registers[b] + c
+                registers[a] = value if -2147483648 <= value <= 2147483647 else wrap_int(value)
+            elif op == JUMP_IF_NOT_LESS:
+                if registers[a] >= registers[b]:
+                    pc = c
+            elif op == JUMP:
+                pc = a
+            elif op == SET_ATTRIBUTE:
+                fields[a] = registers[b]
+            elif op == LOAD_INT:
+                registers[a] = b
+            elif op == DISPATCH or op == CALL:
+                receiver = registers[b]
+                if receiver is None:
+                    raise CoolRuntimeError(f'Dispatch to void (method {constants[d[0]]}).',
+                                           self._span(function, pc - 1))
+                if op == DISPATCH:
+                    cls = receiver.cls if receiver.__class__ is VMObject else self._basic_classes[receiver.__class__]
+                    callee = cls.vtable[c]
+                else:
+                    callee = self.functions[c]
+                if callee.builtin is not None:
+                    try:
+                        registers[a] = callee.builtin(receiver, *[registers[register] for register in d[1]])
+                    except CoolRuntimeError as error:
+                        if error.node is None:
+                            error.node = self._span(function, pc - 1)
+                        raise
+                else:
+                    frame = [None] * callee.registers
+                    frame[0] = receiver
+                    i = 1
+                    for register in d[1]:
+                        frame[i] = registers[register]
+                        i += 1
+                    registers[a] = self.execute(callee, frame)
+            elif op == ADD:
+                value = registers[b] + registers[c]
+                registers[a] = value if -2147483648 <= value <= 2147483647 else wrap_int(value)
+            elif op == SUBTRACT:
+                value = registers[b] - registers[c]
+                registers[a] = value if -2147483648 <= value <= 2147483647 else wrap_int(value)
+            elif op == MULTIPLY:
+                value = registers[b] * registers[c]
+                registers[a] = value if -2147483648 <= value <= 2147483647 else wrap_int(value)
+            elif op == JUMP_IF_FALSE:
+                if not registers[a]:
+                    pc = b
+            elif op == JUMP_IF_NOT_LESS_EQUAL:
+                if registers[a] > registers[b]:
+                    pc = c
+            elif op == LOAD_CONSTANT:
+                registers[a] = constants[b]
+            elif op == EQUAL:
+                first = registers[b]
+                second = registers[c]
+                registers[a] = first is second or (
+                    first.__class__ is second.__class__ and first.__class__ is not VMObject and first == second)
+            elif op == DIVIDE:
+                first = registers[b]
+                second = registers[c]
+                if second > 0 and first >= 0:
+                    registers[a] = first // second
+                elif second == 0:
+                    raise CoolRuntimeError('Division by zero.', self._span(function, pc - 1))
+                else:
+                    registers[a] = divide(first, second)
+            elif op == LESS:
+                registers[a] = registers[b] < registers[c]
+            elif op == LESS_EQUAL:
+                registers[a] = registers[b] <= registers[c]
+            elif op == RETURN:
+                return registers[a]
+            elif op == NEW:
+                registers[a] = self.new(self.classes[b])
+            elif op == NEW_SELF_TYPE:
+                receiver = registers[0]
+                if receiver.__class__ is VMObject:
+                    registers[a] = self.new(receiver.cls)
+                else:
+                    registers[a] = default_value(self.class_name_of(receiver))
+            elif op == CASE:
+                value = registers[a]
+                if value is None:
+                    raise CoolRuntimeError('Match on void in case statement.', self._span(function, pc - 1))
+                branch = self._select(b, value)
+                if branch is None:
+                    raise CoolRuntimeError(f'No match in case statement for class {self.class_name_of(value)}.',
+                                           self._span(function, pc - 1))
+                pc = c[branch]
+            elif op == NEGATE:
+                registers[a] = wrap_int(-registers[b])
+            elif op == NOT:
+                registers[a] = not registers[b]
+            elif op == IS_VOID:
+                registers[a] = registers[b] is None
+            elif op == LOAD_VOID:
+                registers[a] = None
+            else:
+                raise Exception(f'Invalid opcode {op} in {function.function}.')
+
+
+def compile_program(program, environment = None, types = None) -> BytecodeProgram:
+    '''
+    Compiles a parsed program to bytecode. The program is analyzed if environment or types is
+    omitted, and an Exception is raised if it has semantic errors.
+    '''
+    if environment is None or types is None:
+        result = analyze(program)
+        if result.diagnostics:
+            raise Exception('The program has semantic errors:\n' +
+                            '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+        environment, types = result.environment, result.types
+    return BytecodeCompiler(program, environment, types).compile()
+
+
+def compile_source(source_code: str) -> BytecodeProgram:
+    '''Parses, checks and compiles a Cool program. Raises an Exception listing the errors if it
+    has syntax or semantic errors.'''
+    from parser import CoolPyParser
+
+    parser = CoolPyParser(build_parser = True)
+    program = parser.parse(source_code)
+    if program is None or parser.error_list:
+        raise Exception('The program has syntax errors:\n' + '\n'.join(map(str, parser.error_list)))
+    result = analyze(program, source_code)
+    if result.diagnostics:
+        raise Exception('The program has semantic errors:\n' +
+                        '\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    return compile_program(program, result.environment, result.types)
+
+
+def disassemble(program: BytecodeProgram) -> str:
+    '''Returns a listing of the functions of a program, one instruction per line.'''
+    out = []
+    for number, function in enumerate(program.functions):
+        if function.builtin is not None:
+            continue
+        out.append(f'{number}: {function.owner}.{function.name} '
+                   f'({function.parameters} parameters, {function.registers} registers)')
+        code = function.code
+        pc = 0
+        while pc < len(code):
+            op = code[pc]
+            size = instruction_size(code, pc, program.cases)
+            operands = ' '.join(str(operand) for operand in code[pc + 1:pc + size])
+            comment = ''
+            if op == LOAD_CONSTANT:
+                comment = f'  ; {program.constants[code[pc + 2]]!r}'
+            elif op == DISPATCH or op == CALL:
+                comment = f'  ; {program.constants[code[pc + 4]]}'
+            elif op == NEW:
+                comment = f'  ; {program.classes[code[pc + 2]].name}'
+            out.append(f'    {pc:>5}  {OPCODE_NAMES[op]:<22} {operands}{comment}')
+            pc += size
+    return '\n'.join(out)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from spans import LineIndex
+
+    arguments = argparse.ArgumentParser(description = 'Compile a Cool program to bytecode and run it.')
+    arguments.add_argument('path', help = 'a .cl file, or a bytecode file written with --output')
+    arguments.add_argument('-o', '--output', help = 'write the bytecode to this file instead of running it')
+    arguments.add_argument('--disassemble', action = 'store_true', help = 'print the bytecode instead of running it')
+    options = arguments.parse_args()
+
+    source_code = None
+    try:
+        with open(options.path, 'rb') as file:
+            data = file.read()
+        if data.startswith(MAGIC):
+            program = BytecodeProgram.loads(data)
+        else:
+            source_code = data.decode()
+            program = compile_source(source_code)
+    except Exception as error:
+        print(error, file = sys.stderr)
+        exit(1)
+
+    if options.output:
+        program.save(options.output)
+    elif options.disassemble:
+        print(disassemble(program))
+    else:
+        try:
+            program.run()
+        except CoolRuntimeError as error:
+            sys.stdout.flush()
+            print(error.diagnostic(LineIndex(source_code) if source_code is not None else None),
+                  file = sys.stderr)
+            exit(1)